@@ -0,0 +1,64 @@
+"""
+change_detector_bench.py
+
+Benchmark for src/change_detector.py. Fingerprints a synthetic report of
+[rows] contracts, saves it, then diffs a second day where a few percent of
+the rows changed, timing each step and the size of the fingerprint file.
+
+Usage:
+    python -m benchmarks.change_detector_bench [rows] [percent changed]
+"""
+
+from src.change_detector import ChangeDetector, load_fingerprints
+from src.report_reader import ReportRow
+from decimal import Decimal
+import os
+import random
+import sys
+import tempfile
+import time
+
+
+def synthetic_report(count, changed_percent=0.0, seed=42):
+    rng = random.Random(seed)
+    changed = random.Random(seed + 1)
+    for i in range(count):
+        due = Decimal(rng.randint(0, 2000000)) / 100
+        if changed.random() * 100 < changed_percent:
+            due += 1
+        yield ReportRow('MWF' + str(100000 + i), {
+            'Contract No': 'MWF' + str(100000 + i),
+            'Insured': 'Insured ' + str(i),
+            'Amount Due': due,
+            'Agent': 'Agent ' + str(i % 500),
+        }, i + 1)
+
+
+def timed(label, func):
+    start = time.perf_counter()
+    result = func()
+    print('%-28s %8.3fs' % (label, time.perf_counter() - start))
+    return result
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    percent = float(sys.argv[2]) if len(sys.argv) > 2 else 3.0
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'report.fp')
+
+        detector = ChangeDetector(path)
+        changed = timed('day 1 diff (all new)', lambda: sum(1 for _ in detector.changed_rows(synthetic_report(count))))
+        detector.accept_all()
+        timed('save', detector.save)
+        print('%-28s %8d bytes for %d contracts' % ('fingerprint file', os.path.getsize(path), count))
+
+        timed('load', lambda: load_fingerprints(path))
+        detector = ChangeDetector(path)
+        changed = timed('day 2 diff', lambda: sum(1 for _ in detector.changed_rows(synthetic_report(count, percent))))
+        print('%-28s %8d of %d (%s)' % ('to re-scrape', changed, count, detector.counts))
+
+
+if __name__ == '__main__':
+    main()
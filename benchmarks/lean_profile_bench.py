@@ -0,0 +1,74 @@
+"""
+lean_profile_bench.py
+
+Compares the default chrome profile against the lean one (driver_factory
+with lean=True). Loads the same pages with each profile and reports pages/sec
+and the resident memory of the whole browser (chromedriver + every chrome
+process it started).
+
+Usage:
+    python -m benchmarks.lean_profile_bench [rounds] [url ...]
+
+Needs psutil for the memory numbers.
+"""
+
+from src.third_eye_nav import driver_factory, LOGIN_PAGE
+import shutil
+import sys
+import tempfile
+import time
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+def browser_rss_mb(driver):
+    # sum the resident memory of chromedriver and all of its children
+    if psutil is None:
+        return float('nan')
+    try:
+        root = psutil.Process(driver.service.process.pid)
+        processes = [root] + root.children(recursive=True)
+    except (psutil.Error, AttributeError):
+        return float('nan')
+    total = 0
+    for process in processes:
+        try:
+            total += process.memory_info().rss
+        except psutil.Error:
+            pass
+    return total / (1024 * 1024)
+
+
+def bench(name, urls, rounds, lean):
+    profile_dir = tempfile.mkdtemp()
+    driver = driver_factory('headless', lean=lean, profile_dir=profile_dir)
+    try:
+        # warm up (and fill the lean profile's cache)
+        for url in urls:
+            driver.get(url)
+
+        start = time.perf_counter()
+        for _ in range(rounds):
+            for url in urls:
+                driver.get(url)
+        elapsed = time.perf_counter() - start
+        pages = rounds * len(urls)
+        print('%-8s %5d pages %7.2fs %7.2f pages/s  browser rss %7.1f MB' %
+              (name, pages, elapsed, pages / elapsed, browser_rss_mb(driver)))
+    finally:
+        driver.quit()
+        shutil.rmtree(profile_dir, ignore_errors=True)
+
+
+def main():
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    urls = sys.argv[2:] or [LOGIN_PAGE]
+    bench('default', urls, rounds, lean=False)
+    bench('lean', urls, rounds, lean=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+"""
+mock_bench.py
+
+Repeatable end to end benchmark against the local mock server
+(src/mock_server.py), so optimizations can be measured without touching the
+real Third Eye site. Reports
+
+- get_info accounts/sec (HTTP backend, selenium field by field, single pass
+  and pipelined over several tabs)
+- memos/sec (selenium)
+- report download time (plain HTTP and through selenium)
+
+The selenium runs need Chrome and are skipped with --http-only.
+
+Usage:
+    python -m benchmarks.mock_bench [--accounts 50] [--latency 0.05] [--http-only]
+"""
+
+from src.mock_server import MockThirdEyeServer
+from src.http_nav import ThirdEyeHttpNav
+from src.definitions import INFO_FIELDS
+import argparse
+import requests
+import shutil
+import tempfile
+import time
+
+ALL_FIELDS = [True] * len(INFO_FIELDS)
+
+
+def rate(label, count, seconds, unit):
+    print('%-32s %6d in %7.2fs  %8.2f %s/sec' % (label, count, seconds, count / seconds if seconds else 0.0, unit))
+
+
+def bench_get_info(nav, contracts, label, **kwargs):
+    start = time.perf_counter()
+    for contract in contracts:
+        nav.get_info(contract, ALL_FIELDS, **kwargs)
+    rate(label, len(contracts), time.perf_counter() - start, 'accounts')
+
+
+def bench_http(server, contracts):
+    nav = ThirdEyeHttpNav('bench', 'bench', base_url=server.base_url)
+    if not nav.login():
+        print("HTTP login to the mock server failed")
+        return
+    bench_get_info(nav, contracts, 'get_info (http)')
+    nav.close_driver()
+
+    session = requests.Session()
+    session.post(server.base_url + 'ControllerServlet?action=login', data={'LoginId': 'bench', 'LoginPassword': 'bench'})
+    start = time.perf_counter()
+    response = session.get(server.base_url + 'ControllerServlet',
+                           params={'action': 'report', 'availableReportList': 'Collection Report'})
+    print('%-32s %6d bytes in %7.2fs' % ('report download (http)', len(response.content), time.perf_counter() - start))
+
+
+def bench_selenium(server, contracts, memos):
+    # imported here so --http-only works without selenium installed
+    from src.third_eye_nav import ThirdEyeNav
+
+    download_dir = tempfile.mkdtemp()
+    nav = ThirdEyeNav('headless', 'bench', 'bench', download_dir=download_dir, base_url=server.base_url)
+    try:
+        if not nav.login():
+            print("Selenium login to the mock server failed")
+            return
+        bench_get_info(nav, contracts, 'get_info (selenium)')
+        bench_get_info(nav, contracts, 'get_info (selenium, single pass)', single_pass=True)
+
+        start = time.perf_counter()
+        count = sum(1 for _ in nav.get_info_pipelined(contracts, ALL_FIELDS))
+        rate('get_info_pipelined (selenium)', count, time.perf_counter() - start, 'accounts')
+        nav.close_tabs()
+
+        start = time.perf_counter()
+        written = 0
+        for contract in contracts[:memos]:
+            if nav.memo_account(contract, 'Benchmark', 'mock_bench memo'):
+                written += 1
+        rate('memo_account (selenium)', written, time.perf_counter() - start, 'memos')
+
+        start = time.perf_counter()
+        result = nav.download_report('Collection Report', '01/01/2025', '01/31/2025')
+        if result is None:
+            print("Report download failed")
+        else:
+            print('%-32s %6d bytes in %7.2fs' % ('report download (selenium)', result.size, time.perf_counter() - start))
+    finally:
+        nav.close_driver()
+        shutil.rmtree(download_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark ThirdEyeNav against the local mock server')
+    parser.add_argument('--accounts', type=int, default=50, help='accounts to scrape')
+    parser.add_argument('--memos', type=int, default=10, help='memos to write')
+    parser.add_argument('--latency', type=float, default=0.05, help='seconds added to every request')
+    parser.add_argument('--report-rows', type=int, default=5000)
+    parser.add_argument('--http-only', action='store_true', help='skip the selenium runs')
+    args = parser.parse_args()
+
+    with MockThirdEyeServer(latency=args.latency, accounts=max(args.accounts, 1),
+                            report_rows=args.report_rows) as server:
+        print('mock server at %s, %.3fs latency' % (server.base_url, args.latency))
+        contracts = server.contracts()[:args.accounts]
+        bench_http(server, contracts)
+        if not args.http_only:
+            bench_selenium(server, contracts, args.memos)
+        print('%d requests served' % server.requests)
+
+
+if __name__ == '__main__':
+    main()
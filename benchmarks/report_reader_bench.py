@@ -0,0 +1,83 @@
+"""
+report_reader_bench.py
+
+Benchmark for src/report_reader.py. Writes a synthetic Late Payment style
+report (csv and html table flavours) and times streaming it back as typed
+rows. Peak memory should stay flat no matter how many rows are generated.
+
+Usage:
+    python -m benchmarks.report_reader_bench [rows]
+"""
+
+from src.report_reader import read_report
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+
+HEADER = ['Contract No', 'Insured', 'Due Date', 'Amount Due', 'Late Fee', 'Agent']
+
+
+def synthetic_rows(count):
+    rng = random.Random(42)
+    for i in range(count):
+        yield [
+            'MWF' + str(100000 + i),
+            'Insured ' + str(i),
+            '%02d/%02d/2025' % (rng.randint(1, 12), rng.randint(1, 28)),
+            '$%s.%02d' % ('{:,}'.format(rng.randint(0, 20000)), rng.randint(0, 99)),
+            '%d.%02d' % (rng.randint(0, 50), rng.randint(0, 99)),
+            'Agent ' + str(i % 500),
+        ]
+
+
+def write_csv(path, count):
+    with open(path, 'w') as f:
+        f.write('Late Payment Calls\n\n')
+        f.write(','.join(HEADER) + '\n')
+        for row in synthetic_rows(count):
+            f.write(','.join('"' + cell + '"' for cell in row) + '\n')
+
+
+def write_html(path, count):
+    with open(path, 'w') as f:
+        f.write('<html><body><table><tr>' + ''.join('<th>' + h + '</th>' for h in HEADER) + '</tr>\n')
+        for row in synthetic_rows(count):
+            f.write('<tr>' + ''.join('<td>' + cell + '</td>' for cell in row) + '</tr>\n')
+        f.write('</table></body></html>\n')
+
+
+def max_rss_mb():
+    # ru_maxrss is in kilobytes on linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def bench(name, path):
+    start = time.perf_counter()
+    count = 0
+    total = 0
+    for row in read_report(path):
+        count += 1
+        total += row.fields['Amount Due']
+    elapsed = time.perf_counter() - start
+    size_mb = os.path.getsize(path) / (1024 * 1024)
+    print('%-5s %9d rows %7.1f MB file %7.2fs %10.0f rows/s  peak rss %6.1f MB' %
+          (name, count, size_mb, elapsed, count / elapsed, max_rss_mb()))
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, 'late_payment.csv')
+        html_path = os.path.join(tmp, 'late_payment.xls')
+        write_csv(csv_path, count)
+        write_html(html_path, count)
+        print('baseline peak rss %.1f MB' % max_rss_mb())
+        bench('csv', csv_path)
+        bench('html', html_path)
+
+
+if __name__ == '__main__':
+    main()
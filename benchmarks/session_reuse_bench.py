@@ -0,0 +1,53 @@
+"""
+session_reuse_bench.py
+
+Measures startup-to-first-query latency of a new ThirdEyeNav with and
+without reusing a saved session (see src/session_store.py). The first run
+does a full login and saves the cookies, the following runs restore them.
+
+Usage:
+    THIRD_EYE_USERNAME=... THIRD_EYE_PASSWORD=... \\
+        python -m benchmarks.session_reuse_bench <account number> [runs]
+"""
+
+from src.third_eye_nav import ThirdEyeNav
+from src.session_store import SessionStore, load_key
+import os
+import shutil
+import sys
+import tempfile
+
+
+def first_query(account, store):
+    nav = ThirdEyeNav('headless', os.environ.get('THIRD_EYE_USERNAME', ''),
+                      os.environ.get('THIRD_EYE_PASSWORD', ''), session_store=store)
+    try:
+        if not nav.login() or not nav.search_account(account):
+            print("login or search failed")
+            return None, False
+        return nav.stats['startup_to_first_query'], nav.stats['sessions_restored'] > 0
+    finally:
+        nav.close_driver()
+
+
+def main():
+    if len(sys.argv) < 2:
+        print(__doc__)
+        return
+    account = sys.argv[1]
+    runs = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+
+    tmp = tempfile.mkdtemp()
+    try:
+        store = SessionStore(os.path.join(tmp, 'session.bin'), key=load_key(os.path.join(tmp, 'session.key')))
+        for label, use_store in (('full login', None), ('reused session', store)):
+            for _ in range(runs):
+                seconds, restored = first_query(account, use_store)
+                if seconds is not None:
+                    print('%-15s %6.2fs startup to first query (restored=%s)' % (label, seconds, restored))
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
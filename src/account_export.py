@@ -0,0 +1,205 @@
+"""
+account_export.py
+
+Typed account records and a columnar writer for them. get_info hands back
+the fields as displayed ('$1,234.56', '03/15/2025', '(555)123-4567'); this
+module parses them once, at scrape time, so downstream analysis can load a
+whole portfolio as typed columns instead of re-parsing strings per row.
+
+- ACCOUNT_SCHEMA lists every column and its type
+- account_record(contract, info) turns one get_info result into a typed record
+- AccountBatchWriter buffers records and writes them to a Parquet (or Arrow
+  IPC) file one row group at a time
+
+Dependencies:
+- pyarrow (only for AccountBatchWriter)
+"""
+
+from datetime import date, datetime, timezone
+from decimal import Decimal, InvalidOperation
+from src.report_reader import convert
+import re
+
+# column name -> type. 'decimal' is dollars and cents, 'phone' is a string
+# normalised to (xxx) xxx-xxxx
+ACCOUNT_SCHEMA = [
+    ('contract', 'string'),
+    ('insured', 'string'),
+    ('phone', 'phone'),
+    ('agent', 'string'),
+    ('loangroup', 'string'),
+    ('nextpaymentdate', 'date'),
+    ('defaultdate', 'date'),
+    ('canceldate', 'date'),
+    ('payamt', 'decimal'),
+    ('latepayamt', 'decimal'),
+    ('nextpaydate', 'decimal'), # the next payment amount, despite the name
+    ('due', 'decimal'),
+    ('agentphone', 'phone'),
+    ('address', 'string'),
+    ('scraped_at', 'timestamp'),
+]
+
+# rows per Parquet row group / Arrow record batch
+ROW_GROUP_SIZE = 10000
+
+# decimal precision of the money columns
+DECIMAL_PRECISION = 12
+DECIMAL_SCALE = 2
+
+PHONE_DIGITS_RE = re.compile(r'\d')
+
+
+def parse_decimal(text):
+    '''
+    Description:
+        '$1,234.56' -> Decimal('1234.56'), '(12.00)' -> Decimal('-12.00').
+        Blank or unparseable values give None
+    '''
+    value = convert(text)
+    if isinstance(value, Decimal):
+        return value.quantize(Decimal(1).scaleb(-DECIMAL_SCALE))
+    if isinstance(value, str) and value:
+        try:
+            return Decimal(value).quantize(Decimal(1).scaleb(-DECIMAL_SCALE))
+        except InvalidOperation:
+            return None
+    return None
+
+
+def parse_date(text):
+    '''
+    Description:
+        '03/15/2025' (or any format report_reader knows) -> date. Blank or
+        unparseable values give None
+    '''
+    value = convert(text)
+    return value if isinstance(value, date) else None
+
+
+def normalize_phone(text):
+    '''
+    Description:
+        First ten digits formatted as (xxx) xxx-xxxx, with a leading 1
+        dropped. get_info cuts phone numbers to 13 characters, so anything
+        with fewer than ten digits left gives None
+    '''
+    if not text:
+        return None
+    digits = ''.join(PHONE_DIGITS_RE.findall(text))
+    if len(digits) == 11 and digits[0] == '1':
+        digits = digits[1:]
+    if len(digits) < 10:
+        return None
+    return '(%s) %s-%s' % (digits[:3], digits[3:6], digits[6:10])
+
+
+PARSERS = {
+    'string': lambda text: text.strip() if isinstance(text, str) and text.strip() else None,
+    'date': parse_date,
+    'decimal': parse_decimal,
+    'phone': normalize_phone,
+}
+
+
+def account_record(contract, info, scraped_at=None):
+    '''
+    Description:
+        Parses one get_info result into a typed record with every column of
+        ACCOUNT_SCHEMA. Fields that weren't scraped (or couldn't be parsed)
+        are None
+    Input:
+        [contract]   - the contract number
+        [info]       - dictionary returned by get_info
+        [scraped_at] - Optional. datetime of the scrape, defaults to now (UTC)
+    '''
+    record = {'contract': contract,
+              'scraped_at': scraped_at or datetime.now(timezone.utc)}
+    info = info if isinstance(info, dict) else {}
+    for name, kind in ACCOUNT_SCHEMA:
+        if name in record:
+            continue
+        record[name] = PARSERS[kind](info.get(name))
+    return record
+
+
+def arrow_schema():
+    '''
+    Description:
+        ACCOUNT_SCHEMA as a pyarrow schema
+    '''
+    import pyarrow as pa # optional, only needed for columnar output
+    types = {
+        'string': pa.string(),
+        'phone': pa.string(),
+        'date': pa.date32(),
+        'decimal': pa.decimal128(DECIMAL_PRECISION, DECIMAL_SCALE),
+        'timestamp': pa.timestamp('us', tz='UTC'),
+    }
+    return pa.schema([pa.field(name, types[kind]) for name, kind in ACCOUNT_SCHEMA])
+
+
+class AccountBatchWriter:
+    '''
+    Description:
+        Collects typed account records and writes them out [row_group_size]
+        at a time, so memory stays bounded however many accounts are scraped.
+        Use as a context manager or call close() to write the last group.
+
+    Input:
+        [path]           - output file. '.arrow' / '.feather' writes an Arrow
+                           IPC file, anything else Parquet
+        [row_group_size] - Optional. Records per row group
+        [compression]    - Optional. Parquet compression codec
+    '''
+    def __init__(self, path, row_group_size=ROW_GROUP_SIZE, compression='zstd'):
+        import pyarrow as pa # optional, only needed for columnar output
+        self._pa = pa
+        self.path = path
+        self.row_group_size = row_group_size
+        self.schema = arrow_schema()
+        self.rows = 0
+        self._buffer = []
+        if path.lower().endswith(('.arrow', '.feather')):
+            self._writer = pa.ipc.new_file(path, self.schema)
+        else:
+            import pyarrow.parquet as pq
+            self._writer = pq.ParquetWriter(path, self.schema, compression=compression)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def write(self, record):
+        '''
+        Description:
+            Adds one record (see account_record)
+        '''
+        self._buffer.append(record)
+        if len(self._buffer) >= self.row_group_size:
+            self.flush()
+
+    def write_info(self, contract, info, scraped_at=None):
+        '''
+        Description:
+            Parses and adds one get_info result
+        '''
+        self.write(account_record(contract, info, scraped_at))
+
+    def flush(self):
+        if not self._buffer:
+            return
+        columns = {name: [record.get(name) for record in self._buffer] for name, _ in ACCOUNT_SCHEMA}
+        batch = self._pa.RecordBatch.from_pydict(columns, schema=self.schema)
+        self._writer.write_batch(batch)
+        self.rows += len(self._buffer)
+        self._buffer = []
+
+    def close(self):
+        if self._writer is None:
+            return
+        self.flush()
+        self._writer.close()
+        self._writer = None
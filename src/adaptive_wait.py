@@ -0,0 +1,248 @@
+"""
+adaptive_wait.py
+
+Element waits that learn how long each element takes to show up, used by
+ThirdEyeNav in place of the fixed WebDriverWait(driver, error_wait_time).
+
+Presence checks run in the browser: a MutationObserver resolves the moment
+the element is added to the page instead of WebDriverWait's 0.5s polling.
+Every successful wait is recorded per locator, and once a locator has enough
+samples its timeout shrinks to a multiple of its slowest recent latency.
+Every wait that times out doubles the locator's timeout (up to the default)
+and every success halves it back, so a page that got slower isn't stuck
+behind a timeout learned while it was fast. Optional elements (fields that are simply not on some accounts, like the
+cancellation date of an account in good standing) give up after a short
+timeout and come back as None instead of costing the full error_wait_time.
+
+If the browser can't run the script (e.g. the page navigated away while
+waiting) the wait falls back to a WebDriverWait with a fast poll.
+"""
+
+from collections import deque
+from selenium.common.exceptions import TimeoutException
+from selenium.common.exceptions import WebDriverException
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.ui import WebDriverWait
+import time
+
+# latencies kept per locator
+SAMPLE_SIZE = 200
+
+# samples needed before a locator gets its own timeout
+MIN_SAMPLES = 10
+
+# learned timeout = TIMEOUT_FACTOR * p99 latency, never below MIN_TIMEOUT
+TIMEOUT_FACTOR = 3
+MIN_TIMEOUT = 2.0
+
+# optional elements: timeout before anything was learned, and the floor after
+OPTIONAL_TIMEOUT = 1.0
+MIN_OPTIONAL_TIMEOUT = 0.25
+
+# a timed out wait multiplies the locator's timeout by this, a success divides
+# it back down to the learned value
+BACKOFF_FACTOR = 2
+MAX_BACKOFF = 64
+
+# poll interval of the WebDriverWait fallback = p50 / 4, clamped to this range
+MIN_POLL = 0.02
+MAX_POLL = 0.25
+
+# extra seconds given to the driver's script timeout over the wait timeout
+SCRIPT_TIMEOUT_MARGIN = 5
+
+# javascript waiting for an element. Takes selenium's locator strategy, the
+# locator and a timeout in seconds. Resolves with the element or null
+PRESENCE_SCRIPT = """
+var by = arguments[0], value = arguments[1], timeout = arguments[2];
+var done = arguments[arguments.length - 1];
+var find = function() {
+    if (by === 'id') return document.getElementById(value);
+    if (by === 'name') return document.getElementsByName(value)[0] || null;
+    if (by === 'css selector') return document.querySelector(value);
+    return document.evaluate(value, document, null,
+        XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+};
+var node = find();
+if (node) { done(node); return; }
+var timer;
+var observer = new MutationObserver(function() {
+    var node = find();
+    if (node) { observer.disconnect(); clearTimeout(timer); done(node); }
+});
+observer.observe(document, {childList: true, subtree: true, attributes: true});
+timer = setTimeout(function() { observer.disconnect(); done(null); }, timeout * 1000);
+"""
+
+# strategies PRESENCE_SCRIPT understands (the values of selenium's By)
+SCRIPT_STRATEGIES = ('id', 'name', 'css selector', 'xpath')
+
+
+def percentile(samples, fraction):
+    '''
+    Description:
+        Nearest rank percentile of [samples], e.g. fraction=0.99 for p99
+    '''
+    ordered = sorted(samples)
+    if not ordered:
+        return None
+    index = min(len(ordered) - 1, max(0, int(round(fraction * len(ordered))) - 1))
+    return ordered[index]
+
+
+class AdaptiveWait:
+    '''
+    Description:
+        Waits for elements with per locator timeouts learned from earlier
+        waits. One per ThirdEyeNav; what it learned survives attach() to a
+        new driver.
+
+    Input:
+        [driver]     - selenium web driver
+        [timeout]    - seconds to wait for a locator nothing is known about
+        [instrument] - Optional. Instrumentation receiving a 'wait' span per wait
+    '''
+    def __init__(self, driver, timeout, instrument=None):
+        self.timeout = timeout
+        self.instrument = instrument
+        self.samples = {}   # key -> deque of seconds
+        self.misses = {}    # key -> optional waits that found nothing
+        self.backoff = {}   # key -> multiplier from recent timed out waits
+        self.attach(driver)
+
+    def attach(self, driver):
+        # the script has to be allowed to run as long as the longest wait
+        self.driver = driver
+        try:
+            driver.set_script_timeout(self.timeout + SCRIPT_TIMEOUT_MARGIN)
+        except WebDriverException:
+            pass
+
+    def timeout_for(self, key, optional=False):
+        '''
+        Description:
+            Seconds to wait for [key]: the default until enough samples were
+            seen, then TIMEOUT_FACTOR times the p99 latency, stretched by the
+            backoff of recent timeouts. Required elements can grow back to
+            the default timeout. Optional elements miss on every account that
+            doesn't have them, so their misses only grow the timeout back to
+            OPTIONAL_TIMEOUT
+        '''
+        samples = self.samples.get(key)
+        if not samples or len(samples) < MIN_SAMPLES:
+            learned = OPTIONAL_TIMEOUT if optional else self.timeout
+        else:
+            learned = TIMEOUT_FACTOR * percentile(samples, 0.99)
+            learned = max(MIN_OPTIONAL_TIMEOUT if optional else MIN_TIMEOUT, learned)
+        learned = min(self.timeout, learned)
+        grown = learned * self.backoff.get(key, 1)
+        if optional:
+            return min(self.timeout, grown, max(learned, OPTIONAL_TIMEOUT))
+        return min(self.timeout, grown)
+
+    def poll_for(self, key):
+        samples = self.samples.get(key)
+        if not samples:
+            return MIN_POLL * 5
+        return min(MAX_POLL, max(MIN_POLL, percentile(samples, 0.5) / 4))
+
+    def record(self, key, seconds):
+        samples = self.samples.get(key)
+        if samples is None:
+            samples = self.samples[key] = deque(maxlen=SAMPLE_SIZE)
+        samples.append(seconds)
+        if key in self.backoff:
+            factor = self.backoff[key] / BACKOFF_FACTOR
+            if factor <= 1:
+                del self.backoff[key]
+            else:
+                self.backoff[key] = factor
+
+    def record_timeout(self, key, optional=False):
+        '''
+        Description:
+            Notes a wait for [key] that found nothing, so the next one waits
+            longer
+        '''
+        self.backoff[key] = min(MAX_BACKOFF, self.backoff.get(key, 1) * BACKOFF_FACTOR)
+        if optional:
+            self.misses[key] = self.misses.get(key, 0) + 1
+
+    def until_present(self, key, by, value, optional=False):
+        '''
+        Description:
+            Waits for the element located by ([by], [value]).
+        Input:
+            [key]      - name the latency is learned under (field name, element id...)
+            [by]       - selenium By strategy
+            [value]    - the locator
+            [optional] - Optional. The element is legitimately missing on some
+                pages. Give up early and return None instead of raising
+        Output:
+            The WebElement. Raises TimeoutException when a required element
+            never shows up
+        '''
+        timeout = self.timeout_for(key, optional)
+        if self.instrument is not None and self.instrument.hooks:
+            with self.instrument.span('wait', locator=key, timeout=round(timeout, 3)) as span:
+                elem = self._wait(key, by, value, timeout, optional)
+                if elem is None:
+                    span.fail('missing')
+                return elem
+        return self._wait(key, by, value, timeout, optional)
+
+    def _wait(self, key, by, value, timeout, optional):
+        start = time.monotonic()
+        deadline = start + timeout
+        elem = None
+        while elem is None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                if by in SCRIPT_STRATEGIES:
+                    elem = self.driver.execute_async_script(PRESENCE_SCRIPT, by, value, remaining)
+                    if elem is None:
+                        break # the observer ran out of time
+                else:
+                    elem = self._poll(key, by, value, remaining)
+            except TimeoutException:
+                break
+            except WebDriverException:
+                # page unloaded under the script. Poll the rest of the time
+                try:
+                    elem = self._poll(key, by, value, deadline - time.monotonic())
+                except TimeoutException:
+                    break
+
+        if elem is not None:
+            self.record(key, time.monotonic() - start)
+            return elem
+        self.record_timeout(key, optional)
+        if optional:
+            return None
+        raise TimeoutException("Timed out after %.2fs waiting for %s" % (timeout, key))
+
+    def _poll(self, key, by, value, timeout):
+        if timeout <= 0:
+            raise TimeoutException()
+        wait = WebDriverWait(self.driver, timeout, poll_frequency=self.poll_for(key))
+        return wait.until(EC.presence_of_element_located((by, value)))
+
+    def stats(self):
+        '''
+        Description:
+            Learned numbers per locator: samples, p50, p99, timeout and misses
+        '''
+        out = {}
+        for key in set(self.samples) | set(self.misses) | set(self.backoff):
+            samples = self.samples.get(key, ())
+            out[key] = {
+                'samples': len(samples),
+                'p50': percentile(samples, 0.5),
+                'p99': percentile(samples, 0.99),
+                'timeout': self.timeout_for(key, optional=key in self.misses),
+                'misses': self.misses.get(key, 0),
+                'backoff': self.backoff.get(key, 1),
+            }
+        return out
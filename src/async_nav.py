@@ -0,0 +1,203 @@
+"""
+async_nav.py
+
+asyncio facade over ThirdEyeNav. Selenium calls block for seconds at a time,
+so every call is run on a worker thread that owns one ThirdEyeNav session and
+the event loop stays free while the browser works.
+
+Dependencies:
+- Selenium
+- Chrome Web Browser executbale on your system
+"""
+
+from src.third_eye_nav import ThirdEyeNav, lean_profile_dir
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import contextlib
+import functools
+
+# default number of sessions (and so browsers) used by gather_info
+CONCURRENCY = 4
+
+
+class AsyncThirdEyeNav:
+    '''
+    Description:
+        Awaitable versions of the ThirdEyeNav methods. Holds [concurrency]
+        sessions, each pinned to its own thread since a selenium driver must
+        not be used from two threads at once. Single calls borrow whichever
+        session is free; gather_info spreads a batch across all of them.
+
+        Use it as an async context manager or call open() / close().
+
+    Input:
+        [headless]    - passed to ThirdEyeNav ('headless' or 'head')
+        [username]    - Username for Third Eye account
+        [password]    - Password for Third Eye account
+        [concurrency] - number of sessions, and the most calls in flight
+        [nav_factory] - Optional. Callable returning a new session. Defaults to
+                        ThirdEyeNav(headless, username, password)
+        [lean]        - Optional. Use the lean chrome profile for the default
+                        sessions. Each session gets its own profile directory
+    '''
+    def __init__(self, headless, username, password, concurrency=CONCURRENCY, nav_factory=None, lean=False):
+        if concurrency < 1:
+            raise ValueError('concurrency must be at least 1')
+        self.headless = headless
+        self.username = username
+        self.password = password
+        self.concurrency = concurrency
+        self.nav_factory = nav_factory
+        self.lean = lean
+        self.navs = []
+        self._executors = {}
+        self._idle = None
+        self._semaphore = None
+        # concurrent first calls must not each start a set of browsers
+        self._open_lock = asyncio.Lock()
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    def _new_nav(self, slot):
+        if self.nav_factory is not None:
+            return self.nav_factory()
+        # chrome locks its profile, so sessions can't share one
+        return ThirdEyeNav(self.headless, self.username, self.password,
+                           lean=self.lean, profile_dir=lean_profile_dir(slot))
+
+    async def open(self):
+        '''
+        Description:
+            Starts every session in parallel. Chrome is launched on the thread
+            that will own the session for the rest of its life.
+        '''
+        async with self._open_lock:
+            if self.navs:
+                return
+            loop = asyncio.get_running_loop()
+            executors = [ThreadPoolExecutor(max_workers=1) for _ in range(self.concurrency)]
+            results = await asyncio.gather(*[loop.run_in_executor(ex, self._new_nav, slot)
+                                             for slot, ex in enumerate(executors)],
+                                           return_exceptions=True)
+
+            errors = [r for r in results if isinstance(r, BaseException)]
+            if errors:
+                # release the sessions that did start before giving up
+                for nav, executor in zip(results, executors):
+                    if not isinstance(nav, BaseException):
+                        try:
+                            await loop.run_in_executor(executor, nav.close_driver)
+                        except Exception:
+                            pass
+                    executor.shutdown(wait=False)
+                raise errors[0]
+
+            self._idle = asyncio.Queue()
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+            for nav, executor in zip(results, executors):
+                self.navs.append(nav)
+                self._executors[id(nav)] = executor
+                self._idle.put_nowait(nav)
+
+    async def close(self):
+        '''
+        Description:
+            Releases every browser and worker thread
+        '''
+        loop = asyncio.get_running_loop()
+        for nav in self.navs:
+            executor = self._executors.pop(id(nav))
+            await loop.run_in_executor(executor, nav.close_driver)
+            executor.shutdown(wait=False)
+        self.navs = []
+
+    def _run(self, nav, method, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        call = functools.partial(getattr(nav, method), *args, **kwargs)
+        return loop.run_in_executor(self._executors[id(nav)], call)
+
+    @contextlib.asynccontextmanager
+    async def _borrow(self):
+        # the semaphore bounds calls in flight, the queue hands out a free session
+        async with self._semaphore:
+            nav = await self._idle.get()
+            try:
+                yield nav
+            finally:
+                self._idle.put_nowait(nav)
+
+    async def _call(self, method, *args, **kwargs):
+        await self.open()
+        async with self._borrow() as nav:
+            return await self._run(nav, method, *args, **kwargs)
+
+    async def login(self):
+        '''
+        Description:
+            Logs in every session at the same time
+        Output:
+            True if every session logged in. Otherwise, false
+        '''
+        await self.open()
+        results = await asyncio.gather(*[self._run(nav, 'login') for nav in self.navs])
+        return all(results)
+
+    async def navigate_to(self, dest):
+        return await self._call('navigate_to', dest)
+
+    async def search_account(self, account_number):
+        return await self._call('search_account', account_number)
+
+    async def get_info(self, contract, desired_info, single_pass=False):
+        return await self._call('get_info', contract, desired_info, single_pass=single_pass)
+
+    async def download_report(self, report, l_date=None, r_date=None, **kwargs):
+        return await self._call('download_report', report, l_date, r_date, **kwargs)
+
+    async def gather_info(self, contracts, desired_info, single_pass=False):
+        '''
+        Description:
+            Scrapes a batch of contracts across every session. Results are
+            yielded as soon as each contract finishes, so one slow account does
+            not hold up the others. At most [concurrency] contracts are in
+            flight at once.
+        Input:
+            [contracts]    - iterable of contract numbers
+            [desired_info] - same bool list as ThirdEyeNav.get_info
+        Output:
+            An async iterator of (contract, info) tuples in completion order.
+            info is whatever get_info returned (or the exception it raised)
+        '''
+        await self.open()
+        contracts = iter(contracts)
+        pending = set()
+
+        async def _one(contract):
+            try:
+                return contract, await self.get_info(contract, desired_info, single_pass)
+            except Exception as e:
+                return contract, e
+
+        def _fill():
+            while len(pending) < self.concurrency:
+                contract = next(contracts, None)
+                if contract is None:
+                    return
+                pending.add(asyncio.ensure_future(_one(contract)))
+
+        _fill()
+        try:
+            while pending:
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    pending.discard(task)
+                    yield task.result()
+                _fill()
+        finally:
+            for task in pending:
+                task.cancel()
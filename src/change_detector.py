@@ -0,0 +1,210 @@
+"""
+change_detector.py
+
+Finds the contracts whose report rows changed since the last run, so the
+daily Collection Report / Late Payment Calls pass only re-scrapes (or
+re-memos) those instead of every account in the report.
+
+Every contract gets a 64 bit fingerprint of its rows. The fingerprints of
+the previous run are kept in a small binary file: 16 bytes per contract
+(hash of the contract number, fingerprint), so 100k contracts is 1.6MB and
+loads in a few milliseconds.
+
+    detector = ChangeDetector('~/.third_eye/collection_report.fp')
+    rows = detector.changed_rows(read_report(path))
+    for contract, ok in memo_rows(nav, rows, 'Reminder call', today):
+        if ok:
+            detector.accept(contract)
+    detector.save()
+
+Only accepted contracts are remembered, so one that failed is picked up
+again by the next run.
+"""
+
+from array import array
+from hashlib import blake2b
+import os
+import sys
+
+# default directory for the fingerprint files
+STORE_DIR = os.path.join(os.path.expanduser('~'), '.third_eye', 'fingerprints')
+
+# file layout: MAGIC, then (contract hash, fingerprint) pairs as unsigned 64 bit ints
+MAGIC = b'TEFP0001'
+
+MASK = (1 << 64) - 1
+
+
+def _hash64(text):
+    return int.from_bytes(blake2b(text.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def contract_key(contract):
+    '''
+    Description:
+        64 bit key of a contract number. The MWF prefix and case are ignored
+    '''
+    contract = contract.strip().upper()
+    if contract.startswith('MWF'):
+        contract = contract[3:]
+    return _hash64(contract)
+
+
+def row_fingerprint(row, ignore=()):
+    '''
+    Description:
+        64 bit fingerprint of one ReportRow's fields. Column order and the
+        row's position in the report don't matter; columns in [ignore] (e.g.
+        a days late counter that changes every day) are left out
+    '''
+    parts = ['%s\x1f%s' % (name, row.fields[name]) for name in sorted(row.fields) if name not in ignore]
+    return _hash64('\x1e'.join(parts))
+
+
+class ChangeDetector:
+    '''
+    Description:
+        Compares report rows against the fingerprints saved by the previous
+        run.
+
+    Input:
+        [path]   - fingerprint file. Missing means every contract is new
+        [ignore] - Optional. Column headers left out of the fingerprints
+    '''
+    def __init__(self, path, ignore=()):
+        self.path = os.path.expanduser(path)
+        self.ignore = frozenset(ignore)
+        self.previous = load_fingerprints(self.path)
+        self.current = {}
+        self.accepted = {}
+        self.counts = {'new': 0, 'changed': 0, 'unchanged': 0, 'removed': 0}
+
+    def fingerprints(self, rows):
+        '''
+        Description:
+            Fingerprints every contract in [rows]. A contract on several rows
+            gets the combination of all of them (order doesn't matter).
+        Output:
+            Dictionary of contract key -> (fingerprint, first ReportRow)
+        '''
+        current = {}
+        for row in rows:
+            if not row.contract:
+                continue
+            key = contract_key(row.contract)
+            fingerprint = row_fingerprint(row, self.ignore)
+            seen = current.get(key)
+            if seen is None:
+                current[key] = (fingerprint, row)
+            else:
+                current[key] = ((seen[0] + fingerprint) & MASK, seen[1])
+        return current
+
+    def changed_rows(self, rows):
+        '''
+        Description:
+            Reads all of [rows] then yields the first row of every contract
+            that is new or whose rows changed since the last saved run.
+            Unchanged contracts are skipped.
+        Output:
+            A generator of ReportRow, one per new or changed contract
+        '''
+        self.current = self.fingerprints(rows)
+        counts = {'new': 0, 'changed': 0, 'unchanged': 0, 'removed': 0}
+        changed = []
+        for key, (fingerprint, row) in self.current.items():
+            old = self.previous.get(key)
+            if old is None:
+                counts['new'] += 1
+            elif old != fingerprint:
+                counts['changed'] += 1
+            else:
+                counts['unchanged'] += 1
+                continue
+            changed.append(row)
+        counts['removed'] = sum(1 for key in self.previous if key not in self.current)
+        self.counts = counts
+        return iter(changed)
+
+    def accept(self, contract):
+        '''
+        Description:
+            Marks [contract] as handled, so its current rows are remembered
+            by save(). Contracts that aren't accepted keep their old
+            fingerprint and come up again next run
+        '''
+        key = contract_key(contract)
+        if key in self.current:
+            self.accepted[key] = self.current[key][0]
+
+    def accept_all(self):
+        for key, (fingerprint, _) in self.current.items():
+            self.accepted[key] = fingerprint
+
+    def save(self):
+        '''
+        Description:
+            Writes the fingerprints for the next run: the accepted contracts
+            with their new fingerprint, the rest of the current report with
+            their previous one. Contracts that left the report are dropped
+        '''
+        merged = {}
+        for key in self.current:
+            if key in self.accepted:
+                merged[key] = self.accepted[key]
+            elif key in self.previous:
+                merged[key] = self.previous[key]
+        save_fingerprints(self.path, merged)
+        self.previous = merged
+        self.accepted = {}
+
+
+def load_fingerprints(path):
+    '''
+    Description:
+        Reads a fingerprint file
+    Output:
+        Dictionary of contract key -> fingerprint. Empty if the file is
+        missing or not a fingerprint file
+    '''
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except FileNotFoundError:
+        return {}
+    if not data.startswith(MAGIC):
+        print("Ignoring unrecognised fingerprint file " + path)
+        return {}
+    values = array('Q')
+    values.frombytes(data[len(MAGIC):len(MAGIC) + (len(data) - len(MAGIC)) // 16 * 16])
+    if sys.byteorder != 'little':
+        values.byteswap()
+    return dict(zip(values[0::2], values[1::2]))
+
+
+def save_fingerprints(path, fingerprints):
+    '''
+    Description:
+        Writes a fingerprint file. Goes through a temporary file so a crash
+        can't leave half of one behind
+    '''
+    values = array('Q')
+    for key, fingerprint in fingerprints.items():
+        values.append(key)
+        values.append(fingerprint)
+    if sys.byteorder != 'little':
+        values.byteswap()
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    temp = path + '.tmp'
+    with open(temp, 'wb') as f:
+        f.write(MAGIC)
+        f.write(values.tobytes())
+    os.replace(temp, path)
+
+
+def store_path(report, directory=STORE_DIR):
+    '''
+    Description:
+        Default fingerprint file for a report, e.g. 'Collection Report'
+    '''
+    return os.path.join(directory, report.lower().replace(' ', '_') + '.fp')
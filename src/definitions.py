@@ -0,0 +1,83 @@
+"""
+definitions.py
+
+Constants shared by the Third Eye navigation backends: page URL's and the
+locations of the fields scraped from an account page.
+"""
+
+# URL's
+BASE_URL = "https://gaac.thirdeyesys.ca/insight/"
+LOGIN_PAGE = BASE_URL
+SEARCH_PAGE = BASE_URL + "ControllerServlet?action=425&guid=1734391617932"
+ACCOUNTING_REPORTS_PAGE = BASE_URL + "ControllerServlet?action=293&guid=1733370000893"
+MANAGEMENT_REPORTS_PAGE = BASE_URL + "ControllerServlet?action=295&guid=1734375935562"
+
+# pages that can be reached with a plain GET
+PAGE_URLS = {
+    'Login Page': LOGIN_PAGE,
+    'Search Page': SEARCH_PAGE,
+    'Accounting Reports Page': ACCOUNTING_REPORTS_PAGE,
+    'Management Reports Page': MANAGEMENT_REPORTS_PAGE,
+}
+
+
+def page_urls(base_url=None):
+    '''
+    Description:
+        PAGE_URLS rebased onto another server, e.g. the local mock server
+        (src/mock_server.py). Returns PAGE_URLS itself when base_url is None
+    '''
+    if base_url is None:
+        return PAGE_URLS
+    if not base_url.endswith('/'):
+        base_url += '/'
+    return {name: base_url + url[len(BASE_URL):] for name, url in PAGE_URLS.items()}
+
+# account summary panel shared by every field on an account page
+ACCOUNT_PANEL = "/html/body/form[2]/div/table[2]/tbody/tr/td/table/tbody/tr[3]/td[2]/table/tbody/tr[2]/td[2]"
+
+# if this element resolves after a search then the contract was found
+ACCOUNT_FOUND = ACCOUNT_PANEL + "/span[1]/div[1]/table/tbody/tr[1]/td[1]"
+
+# table of notices mailed to the insured (notices tab)
+NOTICES_TABLE = ACCOUNT_PANEL + "/span[7]/table[1]"
+
+# fields scraped by get_info in the same order as the desired_info bool list
+# (dictionary key, xpath, max characters kept)
+INFO_FIELDS = [
+    ('insured',         ACCOUNT_PANEL + "/span[1]/div[1]/table/tbody/tr[2]/td[3]", None),
+    ('phone',           ACCOUNT_PANEL + "/span[1]/div[1]/table/tbody/tr[3]/td[3]/span", 13),
+    ('agent',           ACCOUNT_PANEL + "/span[1]/div[3]/table/tbody/tr[1]/td[3]", None),
+    ('loangroup',       ACCOUNT_PANEL + "/span[1]/div[3]/table/tbody/tr[3]/td[3]", None),
+    ('nextpaymentdate', ACCOUNT_PANEL + "/span[1]/div[7]/div[2]/table/tbody/tr[2]/td[2]", None),
+    ('defaultdate',     ACCOUNT_PANEL + "/span[1]/div[7]/div[2]/table/tbody/tr[3]/td[2]", None),
+    ('canceldate',      ACCOUNT_PANEL + "/span[1]/div[7]/div[2]/table/tbody/tr[4]/td[2]", None),
+    ('payamt',          ACCOUNT_PANEL + "/span[1]/div[7]/div[2]/table/tbody/tr[6]/td[2]/b/span[1]", None),
+    ('latepayamt',      ACCOUNT_PANEL + "/span[1]/div[7]/div[2]/table/tbody/tr[7]/td[2]", None),
+    ('nextpaydate',     ACCOUNT_PANEL + "/span[1]/div[7]/div[2]/table/tbody/tr[9]/td[2]", None),
+    ('due',             ACCOUNT_PANEL + "/span[1]/div[7]/div[2]/table/tbody/tr[10]/td[2]", None),
+    ('agentphone',      ACCOUNT_PANEL + "/span[1]/div[3]/table/tbody/tr[2]/td[3]", 14),
+    ('address',         ACCOUNT_PANEL + "/span[2]/table[1]/tbody/tr[3]/td[2]", None),
+]
+
+# fields that are legitimately missing on some accounts (e.g. no cancellation
+# date while the account is in good standing). Waits for them give up early
+OPTIONAL_FIELDS = {'defaultdate', 'canceldate'}
+
+
+def info_keys(desired_info):
+    '''
+    Description:
+        Names of the fields get_info should scrape, in INFO_FIELDS order.
+        [desired_info] is either the original bool list (one bool per entry in
+        INFO_FIELDS) or an iterable of field names like ['insured', 'due'].
+        Unknown names raise a ValueError
+    '''
+    desired_info = list(desired_info)
+    keys = [key for key, _, _ in INFO_FIELDS]
+    if all(isinstance(item, bool) for item in desired_info):
+        return [key for key, want in zip(keys, desired_info) if want is True]
+    unknown = set(desired_info) - set(keys)
+    if unknown:
+        raise ValueError('Unknown field(s): ' + ', '.join(sorted(map(str, unknown))))
+    return [key for key in keys if key in desired_info]
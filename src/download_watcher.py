@@ -0,0 +1,126 @@
+"""
+download_watcher.py
+
+Helpers for detecting when chrome has finished writing a download. Chrome
+saves to '<name>.crdownload' and renames the file once it is complete, so a
+new file without a partial suffix (and with a stable size) is a finished
+download.
+"""
+
+from collections import namedtuple
+from datetime import date
+import os
+import re
+import time
+
+# seconds to wait for a report before giving up. Large Check Registers can
+# take minutes to generate
+DOWNLOAD_TIMEOUT = 300
+
+# seconds between directory scans
+POLL_INTERVAL = 0.2
+
+# suffixes used by browsers for files that are still being written
+PARTIAL_SUFFIXES = ('.crdownload', '.part', '.tmp')
+
+DownloadResult = namedtuple('DownloadResult', ['path', 'size', 'elapsed'])
+
+
+def snapshot(directory):
+    '''
+    Description:
+        Names of the files currently in [directory]. Taken right before the
+        download is triggered so the new file can be told apart.
+    '''
+    try:
+        return set(os.listdir(directory))
+    except FileNotFoundError:
+        return set()
+
+
+def is_partial(name):
+    return name.endswith(PARTIAL_SUFFIXES) or name.startswith('.com.google.Chrome')
+
+
+def wait_for_download(directory, before, timeout=DOWNLOAD_TIMEOUT, poll_interval=POLL_INTERVAL):
+    '''
+    Description:
+        Polls [directory] until a file that was not in [before] is fully
+        written. Returns as soon as it is, so small reports don't sit out a
+        fixed sleep and large ones aren't cut off.
+    Input:
+        [directory]     - the browser's download directory
+        [before]        - result of snapshot() taken before the download started
+        [timeout]       - seconds to wait before giving up
+        [poll_interval] - seconds between scans
+    Output:
+        A DownloadResult(path, size, elapsed) or None on timeout
+    '''
+    start = time.monotonic()
+    last_sizes = {}
+    while True:
+        elapsed = time.monotonic() - start
+        added = snapshot(directory) - before
+        new = [name for name in added if not is_partial(name)]
+        # chrome can show the final name before it is done writing, so an
+        # empty file only counts once no partial file is left (empty report)
+        writing = len(new) < len(added)
+        for name in sorted(new):
+            path = os.path.join(directory, name)
+            try:
+                size = os.path.getsize(path)
+            except OSError:
+                continue # renamed or removed between the scan and now
+            # the size must hold still for one poll before the file is trusted
+            if (size > 0 or not writing) and last_sizes.get(name) == size:
+                return DownloadResult(path, size, time.monotonic() - start)
+            last_sizes[name] = size
+
+        if elapsed >= timeout:
+            return None
+        time.sleep(poll_interval)
+
+
+def report_filename(report, l_date=None, r_date=None, extension='', day=None):
+    '''
+    Description:
+        File name for a downloaded report, e.g.
+        'Late Payment 01-01-2025 to 01-31-2025.xls'. Reports without a date
+        range get the day they were downloaded ([day], today by default), e.g.
+        'Collection Report 03-15-2025.xls'
+    '''
+    name = report
+    if l_date or r_date:
+        name += ' ' + (l_date or '') + ' to ' + (r_date or '')
+    else:
+        name += ' ' + (day or date.today()).strftime('%m/%d/%Y')
+    name = re.sub(r'[\\/:*?"<>|]', '-', name)
+    return name + extension
+
+
+def rename_download(result, name):
+    '''
+    Description:
+        Moves a finished download to [name] in the same directory. An older
+        file with that name is kept: the download gets a number instead,
+        e.g. 'Collection Report 03-15-2025 (2).xls'
+    Output:
+        A DownloadResult pointing at the new path
+    '''
+    directory = os.path.dirname(result.path)
+    stem, extension = os.path.splitext(name)
+    number = 1
+    while True:
+        path = os.path.join(directory, name if number == 1 else '%s (%d)%s' % (stem, number, extension))
+        try:
+            # claim the name first so two sessions can't pick the same one
+            os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            break
+        except FileExistsError:
+            number += 1
+    try:
+        os.replace(result.path, path)
+    except OSError:
+        os.remove(path)
+        raise
+    return result._replace(path=path)
@@ -0,0 +1,320 @@
+"""
+http_nav.py
+
+Browserless backend for the read only parts of ThirdEyeNav (search_account,
+get_info and search_for_mail). Logs in through the LOGIN_PAGE form and then
+drives the ControllerServlet actions directly over a pooled, keep-alive HTTP
+session. Pages are parsed locally with the same field map get_info uses, so
+no chrome instance is needed.
+
+Pages that only exist through javascript (the memo screen, the collection
+tab) and report downloads still need the selenium backend.
+
+Dependencies:
+- requests
+- lxml
+"""
+
+from src.definitions import page_urls
+from src.definitions import ACCOUNT_FOUND, NOTICES_TABLE, INFO_FIELDS, info_keys
+from urllib.parse import urljoin
+from requests.adapters import HTTPAdapter
+import lxml.html
+import requests
+
+# time in seconds to wait for the server to answer a request
+REQUEST_TIMEOUT = 10
+
+# keep-alive connections kept open per host
+POOL_MAXSIZE = 10
+
+
+class ThirdEyeHttpNav:
+    '''
+    Description:
+        Same interface as ThirdEyeNav for searching and scraping accounts but
+        backed by a requests.Session instead of a chrome web driver.
+
+    Input:
+        [username]     - Username for Third Eye account
+        [password]     - Password for Third Eye account
+        [pool_maxsize] - Optional. Number of keep-alive connections to reuse
+        [session]      - Optional. An existing requests.Session to share
+        [base_url]     - Optional. Point at another server instead of BASE_URL
+    '''
+    def __init__(self, username, password, pool_maxsize=POOL_MAXSIZE, session=None, base_url=None):
+        self.page_urls = page_urls(base_url)
+        self.username = username
+        self.password = password
+        self.is_logged_in = False
+        self.current_page = None
+        self.current_account = None
+        self.page = None # parsed html of the current page
+        self.session = session if session is not None else new_session(pool_maxsize)
+
+    def close_driver(self):
+        # release pooled connections. Named after the selenium backend
+        if self.session is not None:
+            self.session.close()
+            self.session = None
+        self.is_logged_in = False
+        self.current_page = None
+        self.current_account = None
+        self.page = None
+
+    def is_alive(self):
+        return self.session is not None
+
+    def _load(self, response):
+        response.raise_for_status()
+        self.page = parse_page(response.text, response.url)
+        return self.page
+
+    def _get(self, url):
+        return self._load(self.session.get(url, timeout=REQUEST_TIMEOUT))
+
+    def _submit(self, form, values, submit_name):
+        '''
+        Description:
+            Submits an html form the way the browser would: every input in the
+            form is sent along with the clicked submit button.
+        Input:
+            [form]        - lxml form element
+            [values]      - dictionary of field values to override
+            [submit_name] - name of the button that was "clicked"
+        '''
+        data = form_values(form)
+        data.update(values)
+        button = form.xpath('.//*[@name=$name]', name=submit_name)
+        data[submit_name] = button[0].get('value', '') if button else ''
+
+        action = urljoin(form.base_url or '', form.get('action') or '')
+        if (form.get('method') or 'get').lower() == 'post':
+            response = self.session.post(action, data=data, timeout=REQUEST_TIMEOUT)
+        else:
+            response = self.session.get(action, params=data, timeout=REQUEST_TIMEOUT)
+        return self._load(response)
+
+    def login(self):
+        '''
+        Description:
+            Posts the LoginId and LoginPassword fields of the login form.
+        Output:
+            Return true if successful. Otherwise, false
+        '''
+        if self.is_logged_in is True:
+            return True
+
+        try:
+            page = self._get(self.page_urls['Login Page'])
+            form = find_form(page, 'LoginId')
+            if form is None:
+                print("Cannot find login form... Is the server up?")
+                return False
+            page = self._submit(form, {'LoginId': self.username, 'LoginPassword': self.password}, 'login')
+        except requests.RequestException as e:
+            print("Failed to login: " + str(e))
+            return False
+
+        if 'Admin Options' not in page.text_content():
+            print("Unsuccessful Login")
+            return False
+
+        self.is_logged_in = True
+        self.current_page = None
+        return True
+
+    def navigate_to(self, dest):
+        '''
+        Description:
+            Loads one of the pages in self.page_urls. Pages that are reached through
+            javascript (memo screen, collection tab) are not supported.
+        Input:
+            [dest] - The destination web page to be travelled to.
+        Output:
+            True if successful, otherwise false
+        '''
+        if dest == self.current_page:
+            return True
+        if dest not in self.page_urls:
+            print("navigate_to '" + dest + "' is not supported by the HTTP backend")
+            return False
+
+        try:
+            self._get(self.page_urls[dest])
+        except requests.RequestException:
+            print("Failed to navigate to " + dest)
+            return False
+
+        self.current_page = dest
+        return True
+
+    def search_account(self, account_number):
+        '''
+        Description:
+            Submits the contract search form and keeps the resulting account
+            page for get_info / search_for_mail.
+        In:
+            [account_number] - The account number to search for
+        Out:
+            True if the contract was found, otherwise false.
+        '''
+        self.current_account = None
+        if not account_number:
+            return False
+        if not self.navigate_to('Search Page'):
+            return False
+
+        form = find_form(self.page, 'VISIBLE_ContractNo')
+        if form is None:
+            print("Could not find search bar")
+            return False
+
+        try:
+            page = self._submit(form, {'VISIBLE_ContractNo': account_number}, 'quoteSearchContractByAll')
+        except requests.RequestException:
+            print("Could not find search bar or search failed")
+            return False
+        self.current_page = "Account " + account_number
+
+        if not page.xpath(ACCOUNT_FOUND):
+            return False
+        self.current_account = account_number
+        return True
+
+    def get_info(self, contract, desired_info, single_pass=True):
+        '''
+        Description:
+            Scrapes insured (client) info from the account page. Takes the same
+            desired_info (field names or bool list) as ThirdEyeNav.get_info.
+            The whole page is already local so every call is "single pass".
+        Output:
+            returns the desired info as a dictionary. Missing fields are None.
+            A LookupError is returned if the contract could not be found
+        '''
+        if not self.search_account(contract):
+            return LookupError('Could not find contract ' + str(contract))
+
+        keys = info_keys(desired_info)
+        map = {}
+        for key, xpath, length in INFO_FIELDS:
+            if key in keys:
+                map[key] = element_text(self.page, xpath, length)
+        return map
+
+    def search_for_mail(self):
+        '''
+        Description:
+            Reads the last notice mailed to the client. Expects to be on an
+            account page.
+        '''
+        if self.page is None or not self.page.xpath(NOTICES_TABLE):
+            print("Could not find notices table")
+            return False
+
+        lines = element_text(self.page, NOTICES_TABLE).split('\n')
+        last_sent = lines[-1]
+        index_of_date = last_sent.rfind(" ")
+        return (last_sent[:index_of_date] + ',' + last_sent[index_of_date+1:])
+
+
+def new_session(pool_maxsize=POOL_MAXSIZE):
+    '''
+    Description:
+        Creates a requests session that keeps [pool_maxsize] connections alive
+        to the Third Eye host
+    '''
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def parse_page(text, url=None):
+    '''
+    Description:
+        Parses html into an lxml tree that matches what the browser builds.
+        Browsers add a <tbody> to every table that doesn't have one and the
+        xpaths in definitions.py rely on it, so do the same here.
+    '''
+    root = lxml.html.document_fromstring(text, base_url=url)
+    for table in root.iter('table'):
+        rows = [child for child in table if child.tag == 'tr']
+        if not rows:
+            continue
+        tbody = lxml.html.Element('tbody')
+        table.insert(table.index(rows[0]), tbody)
+        for row in rows:
+            tbody.append(row)
+    return root
+
+
+def find_form(page, field_name):
+    '''
+    Description:
+        Returns the first form on the page containing a field named
+        [field_name], or None
+    '''
+    for form in page.forms:
+        if form.xpath('.//*[@name=$name]', name=field_name):
+            return form
+    return None
+
+
+def form_values(form):
+    '''
+    Description:
+        Collects the values the browser would send for a form, leaving out
+        buttons and unchecked boxes
+    '''
+    data = {}
+    for field in form.xpath('.//input | .//select | .//textarea'):
+        name = field.get('name')
+        if not name:
+            continue
+        if field.tag == 'input':
+            kind = (field.get('type') or 'text').lower()
+            if kind in ('submit', 'button', 'image', 'reset', 'file'):
+                continue
+            if kind in ('checkbox', 'radio') and field.get('checked') is None:
+                continue
+            data[name] = field.get('value', '')
+        elif field.tag == 'select':
+            options = field.xpath('.//option[@selected]') or field.xpath('.//option')
+            data[name] = options[0].get('value', options[0].text_content()) if options else ''
+        else:
+            data[name] = field.text_content()
+    return data
+
+
+def element_text(page, xpath, length=None):
+    '''
+    Description:
+        Text of the first element matching [xpath] roughly as selenium's
+        .text would report it (<br> becomes a new line, whitespace collapsed)
+    Output:
+        The text cut to [length] characters or None if nothing matched
+    '''
+    if page is None:
+        return None
+    found = page.xpath(xpath)
+    if not found:
+        return None
+    parts = []
+    _collect_text(found[0], parts, True)
+    lines = [' '.join(line.split()) for line in ''.join(parts).split('\n')]
+    text = '\n'.join(line for line in lines if line)
+    return text[:length]
+
+
+def _collect_text(node, parts, top):
+    if isinstance(node.tag, str): # skip comments and processing instructions
+        if node.tag == 'br' or (not top and node.tag in ('tr', 'div', 'p')):
+            parts.append('\n')
+        if node.text:
+            parts.append(node.text)
+        for child in node:
+            _collect_text(child, parts, False)
+    if not top and node.tail:
+        parts.append(node.tail)
@@ -0,0 +1,227 @@
+"""
+info_cache.py
+
+Persistent cache for the fields scraped by ThirdEyeNav.get_info. Values are
+kept per (contract, field) in a local SQLite file so they survive restarts,
+and every field has its own time to live: the insured's name or agent rarely
+change while the amount due changes daily.
+
+CachedThirdEyeNav sits in front of a ThirdEyeNav (or ThirdEyeHttpNav) and only
+scrapes the fields that are missing or expired. Memos written through it
+invalidate the contract.
+"""
+
+from src.definitions import OPTIONAL_FIELDS, info_keys
+import os
+import sqlite3
+import threading
+import time
+
+# default location of the cache file
+CACHE_PATH = os.path.join(os.path.expanduser('~'), '.third_eye', 'info_cache.sqlite3')
+
+HOUR = 60 * 60
+DAY = 24 * HOUR
+
+# seconds a field stays fresh. Fields not listed use DEFAULT_TTL
+DEFAULT_TTL = HOUR
+FIELD_TTLS = {
+    'insured': 7 * DAY,
+    'agent': 7 * DAY,
+    'agentphone': 7 * DAY,
+    'loangroup': 7 * DAY,
+    'phone': DAY,
+    'address': DAY,
+    'payamt': DAY,
+    'nextpaymentdate': HOUR,
+    'defaultdate': HOUR,
+    'canceldate': HOUR,
+    'latepayamt': HOUR,
+    'nextpaydate': HOUR,
+    'due': HOUR,
+}
+
+
+def cache_key(contract):
+    '''
+    Description:
+        Contract number as stored in the cache. The MWF prefix and case are
+        ignored, so 'MWF100000' (a search) and '100000' (an xls report) share
+        one entry
+    '''
+    contract = str(contract).strip().upper()
+    if contract.startswith('MWF'):
+        contract = contract[3:]
+    return contract
+
+
+class InfoCache:
+    '''
+    Description:
+        (contract, field) -> value store backed by SQLite. Safe to share
+        between the threads of a SessionPool.
+
+    Input:
+        [path]        - Optional. SQLite file. ':memory:' keeps it in RAM
+        [ttls]        - Optional. Dictionary of field -> seconds overriding FIELD_TTLS
+        [default_ttl] - Optional. TTL for fields not in ttls
+    '''
+    def __init__(self, path=CACHE_PATH, ttls=None, default_ttl=DEFAULT_TTL):
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.ttls = dict(FIELD_TTLS)
+        if ttls:
+            self.ttls.update(ttls)
+        self.default_ttl = default_ttl
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS info ('
+            ' contract TEXT NOT NULL,'
+            ' field TEXT NOT NULL,'
+            ' value TEXT,'
+            ' fetched REAL NOT NULL,'
+            ' PRIMARY KEY (contract, field))')
+        self._db.commit()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def ttl(self, field):
+        return self.ttls.get(field, self.default_ttl)
+
+    def get(self, contract, fields):
+        '''
+        Description:
+            Looks up the cached values for [fields] of [contract]. Expired
+            entries count as misses.
+        Output:
+            A dictionary with only the fields that were fresh in the cache.
+            Optional fields cached as not on the page come back as None
+        '''
+        fields = list(fields)
+        if not fields:
+            return {}
+        contract = cache_key(contract)
+        now = time.time()
+        marks = ','.join('?' * len(fields))
+        with self._lock:
+            rows = self._db.execute(
+                'SELECT field, value, fetched FROM info WHERE contract = ? AND field IN (' + marks + ')',
+                [contract] + fields).fetchall()
+            found = {}
+            for field, value, fetched in rows:
+                if now - fetched < self.ttl(field):
+                    found[field] = value
+            self.hits += len(found)
+            self.misses += len(fields) - len(found)
+        return found
+
+    def put(self, contract, values):
+        '''
+        Description:
+            Stores freshly scraped values. An optional field that was not on
+            the page (None) is stored as NULL, so accounts without e.g. a
+            cancel date aren't searched again for it. Other None values mean
+            the field couldn't be read and are not cached.
+        '''
+        contract = cache_key(contract)
+        now = time.time()
+        rows = [(contract, field, value, now) for field, value in values.items()
+                if value is not None or field in OPTIONAL_FIELDS]
+        if not rows:
+            return
+        with self._lock:
+            self._db.executemany('INSERT OR REPLACE INTO info VALUES (?, ?, ?, ?)', rows)
+            self._db.commit()
+
+    def invalidate(self, contract, fields=None):
+        '''
+        Description:
+            Drops cached values for a contract, or just [fields] of it
+        '''
+        contract = cache_key(contract)
+        with self._lock:
+            if fields is None:
+                self._db.execute('DELETE FROM info WHERE contract = ?', (contract,))
+            else:
+                fields = list(fields)
+                marks = ','.join('?' * len(fields))
+                self._db.execute('DELETE FROM info WHERE contract = ? AND field IN (' + marks + ')',
+                                 [contract] + fields)
+            self._db.commit()
+            self.invalidations += 1
+
+    def stats(self):
+        '''
+        Description:
+            Hit/miss counters. Counted per field, not per get_info call
+        '''
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'invalidations': self.invalidations,
+                'hit_ratio': self.hits / total if total else 0.0,
+            }
+
+
+class CachedThirdEyeNav:
+    '''
+    Description:
+        Wraps a ThirdEyeNav so get_info is answered from the cache where it
+        can. Anything else is passed straight through to the wrapped session.
+
+    Input:
+        [nav]   - a ThirdEyeNav (or ThirdEyeHttpNav)
+        [cache] - an InfoCache
+    '''
+    def __init__(self, nav, cache):
+        self.nav = nav
+        self.cache = cache
+
+    def __getattr__(self, name):
+        return getattr(self.nav, name)
+
+    def get_info(self, contract, desired_info, **kwargs):
+        '''
+        Description:
+            Same as ThirdEyeNav.get_info but only the fields that are missing
+            or expired are scraped. If every field is cached the account is not
+            searched at all. Errors (e.g. the LookupError for a contract that
+            could not be found) are handed back and nothing is cached.
+        Output:
+            returns the desired info as a dictionary
+        '''
+        wanted = info_keys(desired_info)
+        map = self.cache.get(contract, wanted)
+        missing = [key for key in wanted if key not in map]
+        if not missing:
+            return {key: map[key] for key in wanted}
+
+        fresh = self.nav.get_info(contract, missing, **kwargs)
+        if not isinstance(fresh, dict):
+            return fresh # scrape failed, hand back the error like get_info does
+        # only keep values read off this contract's own page
+        current = getattr(self.nav, 'current_account', contract)
+        if current is not None and cache_key(current) == cache_key(contract):
+            self.cache.put(contract, fresh)
+        map.update(fresh)
+        return {key: map[key] for key in wanted if key in map}
+
+    def memo_account(self, account_number, *args, **kwargs):
+        result = self.nav.memo_account(account_number, *args, **kwargs)
+        self.cache.invalidate(account_number)
+        return result
+
+    def memo_account_collection(self, account_number, *args, **kwargs):
+        result = self.nav.memo_account_collection(account_number, *args, **kwargs)
+        self.cache.invalidate(account_number)
+        return result
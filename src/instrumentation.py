@@ -0,0 +1,257 @@
+"""
+instrumentation.py
+
+Per step latency instrumentation for ThirdEyeNav. Every navigate_to,
+search_account, get_info field lookup, download_report phase, page load and
+WebDriverWait is timed as a span and handed to the attached hooks as a
+structured event:
+
+    {'step': 'get_info.field', 'field': 'due', 'seconds': 0.41, 'ok': True,
+     'error': None, 'span_id': 12, 'parent_id': 11, 'time': 1734391617.93}
+
+Hooks are plain callables taking the event. Two are provided:
+- JsonLinesSink writes one JSON object per line to a file
+- PrometheusSink keeps counters and latency histograms and renders them in
+  the Prometheus text format
+
+Instrumentation is off by default. While it is off, span() hands back one
+shared do-nothing object, so the cost is a method call per step.
+"""
+
+from bisect import bisect_left
+import functools
+import itertools
+import json
+import threading
+import time
+
+# histogram bucket upper bounds in seconds
+BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+class _NullSpan:
+    # returned by a disabled Instrumentation. Does nothing, as fast as possible
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def fail(self, reason=None):
+        pass
+
+    def set(self, **labels):
+        pass
+
+
+NULL_SPAN = _NullSpan()
+
+
+class Span:
+    '''
+    Description:
+        One timed step. Use as a context manager. An exception leaving the
+        block marks the span as failed; fail() does the same for the
+        'return False' style errors used throughout ThirdEyeNav.
+    '''
+    def __init__(self, instrument, step, labels):
+        self.instrument = instrument
+        self.step = step
+        self.labels = labels
+        self.ok = True
+        self.error = None
+        self.span_id = next(instrument._ids)
+        self.parent_id = None
+
+    def __enter__(self):
+        stack = self.instrument._stack()
+        self.parent_id = stack[-1].span_id if stack else None
+        stack.append(self)
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self._start
+        self.instrument._stack().pop()
+        if exc_type is not None:
+            self.ok = False
+            self.error = exc_type.__name__
+        event = {'step': self.step, 'seconds': seconds, 'ok': self.ok, 'error': self.error,
+                 'span_id': self.span_id, 'parent_id': self.parent_id, 'time': time.time()}
+        event.update(self.labels)
+        self.instrument.emit(event)
+        return False
+
+    def fail(self, reason=None):
+        self.ok = False
+        self.error = reason
+
+    def set(self, **labels):
+        self.labels.update(labels)
+
+
+class Instrumentation:
+    '''
+    Description:
+        Creates spans and sends the finished events to every hook.
+
+    Input:
+        [hooks] - Optional. Callables taking an event dictionary. Attaching a
+                  hook turns instrumentation on
+    '''
+    def __init__(self, hooks=None):
+        self.hooks = list(hooks or [])
+        self._ids = itertools.count(1)
+        self._local = threading.local()
+
+    @property
+    def enabled(self):
+        return bool(self.hooks)
+
+    def add_hook(self, hook):
+        self.hooks.append(hook)
+        return hook
+
+    def remove_hook(self, hook):
+        self.hooks.remove(hook)
+
+    def span(self, step, **labels):
+        '''
+        Description:
+            Times a step. Returns the shared NULL_SPAN when nothing is listening
+        '''
+        if not self.hooks:
+            return NULL_SPAN
+        return Span(self, step, labels)
+
+    def emit(self, event):
+        for hook in self.hooks:
+            try:
+                hook(event)
+            except Exception as e:
+                # a broken tracer must never take the scraper down with it
+                print("Instrumentation hook failed: " + str(e))
+
+    def _stack(self):
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+
+# shared instance used when ThirdEyeNav is not given one. Never add hooks to it
+DISABLED = Instrumentation()
+
+
+def timed(step, *label_args):
+    '''
+    Description:
+        Method decorator that wraps the call in a span of self.instrument.
+        [label_args] names the positional arguments recorded as labels. A
+        False return value marks the span as failed.
+    '''
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            instrument = self.instrument
+            if not instrument.hooks:
+                return method(self, *args, **kwargs)
+            labels = dict(zip(label_args, args))
+            with instrument.span(step, **labels) as span:
+                result = method(self, *args, **kwargs)
+                if result is False or result is None or isinstance(result, Exception):
+                    span.fail(type(result).__name__ if isinstance(result, Exception) else 'returned ' + str(result))
+                return result
+        return wrapper
+    return decorator
+
+
+class TimedWait:
+    '''
+    Description:
+        Wraps a WebDriverWait so time spent polling for elements shows up as
+        'wait' spans, separate from page loads and key strokes.
+    '''
+    def __init__(self, wait, instrument):
+        self._wait = wait
+        self.instrument = instrument
+
+    def until(self, method, message=''):
+        with self.instrument.span('wait'):
+            return self._wait.until(method, message)
+
+    def until_not(self, method, message=''):
+        with self.instrument.span('wait'):
+            return self._wait.until_not(method, message)
+
+
+class JsonLinesSink:
+    '''
+    Description:
+        Hook that appends every event to a JSON lines file (or any object with
+        write/flush)
+    '''
+    def __init__(self, path_or_file):
+        if hasattr(path_or_file, 'write'):
+            self._file = path_or_file
+        else:
+            self._file = open(path_or_file, 'a', encoding='utf-8')
+        self._lock = threading.Lock()
+
+    def __call__(self, event):
+        line = json.dumps(event, default=str) + '\n'
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class PrometheusSink:
+    '''
+    Description:
+        Hook that keeps Prometheus style counters and latency histograms per
+        step. render() returns them in the text exposition format.
+    '''
+    def __init__(self, buckets=BUCKETS, prefix='third_eye'):
+        self.buckets = tuple(buckets)
+        self.prefix = prefix
+        self._counts = {}     # (step, status) -> count
+        self._histograms = {} # step -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def __call__(self, event):
+        step = event['step']
+        status = 'ok' if event['ok'] else 'error'
+        seconds = event['seconds']
+        with self._lock:
+            self._counts[(step, status)] = self._counts.get((step, status), 0) + 1
+            histogram = self._histograms.get(step)
+            if histogram is None:
+                histogram = self._histograms[step] = [0] * (len(self.buckets) + 2)
+            index = bisect_left(self.buckets, seconds)
+            if index < len(self.buckets):
+                histogram[index] += 1
+            histogram[-2] += seconds
+            histogram[-1] += 1
+
+    def render(self):
+        lines = []
+        with self._lock:
+            name = self.prefix + '_steps_total'
+            lines.append('# TYPE ' + name + ' counter')
+            for (step, status), count in sorted(self._counts.items()):
+                lines.append('%s{step="%s",status="%s"} %d' % (name, step, status, count))
+
+            name = self.prefix + '_step_seconds'
+            lines.append('# TYPE ' + name + ' histogram')
+            for step, histogram in sorted(self._histograms.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, histogram):
+                    cumulative += count
+                    lines.append('%s_bucket{step="%s",le="%g"} %d' % (name, step, bound, cumulative))
+                lines.append('%s_bucket{step="%s",le="+Inf"} %d' % (name, step, histogram[-1]))
+                lines.append('%s_sum{step="%s"} %f' % (name, step, histogram[-2]))
+                lines.append('%s_count{step="%s"} %d' % (name, step, histogram[-1]))
+        return '\n'.join(lines) + '\n'
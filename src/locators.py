@@ -0,0 +1,169 @@
+"""
+locators.py
+
+Registry of every element ThirdEyeNav looks up, by name. The account page
+fields all sit under the same account panel, so instead of handing the
+browser a 60 character absolute xpath for each one, a field names the panel
+as its parent and only stores the xpath relative to it. LocatorResolver
+finds the panel once per page, keeps the handle, and runs the short relative
+lookups under it. The handle is dropped on navigation and re-resolved if the
+browser reports it as stale.
+
+Dependencies:
+- Selenium
+"""
+
+from collections import namedtuple
+from selenium.common.exceptions import NoSuchElementException
+from selenium.common.exceptions import StaleElementReferenceException
+from selenium.webdriver.common.by import By
+from src.definitions import ACCOUNT_PANEL, ACCOUNT_FOUND, NOTICES_TABLE, INFO_FIELDS, OPTIONAL_FIELDS
+
+# how to find an element
+#   [by]       - selenium By strategy
+#   [value]    - the locator, relative to the parent when there is one
+#   [parent]   - Optional. Name of the container the locator is relative to
+#   [maxlen]   - Optional. Characters of text kept by get_info
+#   [optional] - Optional. The element is legitimately missing on some pages
+Locator = namedtuple('Locator', ['by', 'value', 'parent', 'maxlen', 'optional'],
+                     defaults=(None, None, False))
+
+
+def _under_panel(xpath):
+    # absolute xpath below ACCOUNT_PANEL -> xpath relative to the panel
+    if not xpath.startswith(ACCOUNT_PANEL + '/'):
+        raise ValueError('Not under the account panel: ' + xpath)
+    return '.' + xpath[len(ACCOUNT_PANEL):]
+
+
+LOCATORS = {
+    # containers
+    'account_panel':   Locator(By.XPATH, ACCOUNT_PANEL),
+
+    # account page
+    'account_found':   Locator(By.XPATH, _under_panel(ACCOUNT_FOUND), 'account_panel'),
+    'notices_table':   Locator(By.XPATH, _under_panel(NOTICES_TABLE), 'account_panel'),
+    'insured_tab':     Locator(By.ID, 'top1'),
+    'collection_tab':  Locator(By.ID, 'top5'),
+    'notices_tab':     Locator(By.ID, 'top6'),
+
+    # search
+    'search_box':      Locator(By.NAME, 'VISIBLE_ContractNo'),
+    'search_submit':   Locator(By.NAME, 'quoteSearchContractByAll'),
+
+    # memo screen and collection memos
+    'body':            Locator(By.XPATH, '//body'),
+    'memo_functions':  Locator(By.ID, 'memoFunctions'),
+    'reminder_call':   Locator(By.CSS_SELECTOR, "input[title='Reminder Call']"),
+}
+
+# get_info fields, built from INFO_FIELDS so the two never disagree
+for _key, _xpath, _maxlen in INFO_FIELDS:
+    LOCATORS[_key] = Locator(By.XPATH, _under_panel(_xpath), 'account_panel', _maxlen, _key in OPTIONAL_FIELDS)
+
+
+def absolute(name, locators=LOCATORS):
+    '''
+    Description:
+        The full xpath of a locator with an xpath parent chain, for lookups
+        that can't start from a cached container
+    '''
+    locator = locators[name]
+    if locator.parent is None:
+        return locator.value
+    if locator.by != By.XPATH:
+        raise ValueError(name + ' is not an xpath locator')
+    return absolute(locator.parent, locators) + locator.value[1:]
+
+
+class LocatorResolver:
+    '''
+    Description:
+        Finds registry elements for one driver. Parent containers are looked
+        up once and cached until reset() is called (on every navigation).
+        A cached container that went stale is looked up again once.
+
+    Input:
+        [waiter]   - the AdaptiveWait of the driver
+        [locators] - Optional. Name -> Locator dictionary. Defaults to LOCATORS
+    '''
+    def __init__(self, waiter, locators=LOCATORS):
+        self.waiter = waiter
+        self.locators = locators
+        self.containers = {}
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+
+    def reset(self):
+        '''
+        Description:
+            Forgets the cached containers. Call after anything that loads a new page
+        '''
+        self.containers.clear()
+
+    def container(self, name):
+        '''
+        Description:
+            Cached handle of a container element, waited for the first time
+        '''
+        elem = self.containers.get(name)
+        if elem is not None:
+            self.hits += 1
+            return elem
+        self.misses += 1
+        elem = self._find(name)
+        if elem is not None:
+            self.containers[name] = elem
+        return elem
+
+    def find(self, name):
+        '''
+        Description:
+            Returns the element registered as [name]. Relative locators are
+            searched under their cached parent.
+        Output:
+            The WebElement. None for a missing optional element. Raises
+            TimeoutException when a required element never shows up
+        '''
+        try:
+            return self._find(name)
+        except StaleElementReferenceException:
+            # the page changed under the cached container. Look it up again
+            self.stale += 1
+            self.reset()
+            return self._find(name)
+
+    def _find(self, name):
+        locator = self.locators[name]
+        if locator.parent is None:
+            return self.waiter.until_present(name, locator.by, locator.value, optional=locator.optional)
+
+        parent = self.container(locator.parent)
+        if parent is not None:
+            # the panel is already there so its contents normally are too
+            found = parent.find_elements(locator.by, locator.value)
+            if found:
+                return found[0]
+            # a field the server left out of a rendered panel isn't coming
+            if locator.optional:
+                return None
+
+        # not rendered yet. Wait for it the long way
+        if locator.by != By.XPATH:
+            raise NoSuchElementException(name)
+        return self.waiter.until_present(name, By.XPATH, absolute(name, self.locators), optional=locator.optional)
+
+    def relative_paths(self, names):
+        '''
+        Description:
+            (container name, [relative xpaths]) for a batch lookup with
+            BATCH_TEXT_SCRIPT. All names must share the same parent
+        '''
+        parents = {self.locators[name].parent for name in names}
+        if len(parents) != 1 or None in parents:
+            raise ValueError('Batch lookups need locators with one common parent')
+        return parents.pop(), [self.locators[name].value for name in names]
+
+    def stats(self):
+        return {'container_hits': self.hits, 'container_misses': self.misses, 'stale': self.stale}
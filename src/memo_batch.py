@@ -0,0 +1,173 @@
+"""
+memo_batch.py
+
+Bulk memo pipeline. Runs a list of memo jobs through ThirdEyeNav while
+keeping a journal on disk, so a run that dies at account 3,000 of 5,000 can
+be restarted and carries on from where it stopped without memoing anyone
+twice.
+
+Each batch has its own id and its own journal. Restarting with the same id
+resumes that batch; a new id starts fresh, so a recurring memo (the same
+note on the same account next week) is written again.
+
+Every job is written to the journal as 'pending' before the memo is saved
+and as 'written' (or 'failed') afterwards. On restart, jobs already
+'written' are skipped. A job left 'pending' means the crash happened mid
+memo, so the memo may or may not be on the account. Those jobs are not
+retried; they are reported as 'unconfirmed' for someone to check by hand.
+"""
+
+from collections import namedtuple, OrderedDict
+import hashlib
+import json
+import os
+import time
+
+# default directory for the per batch journal files
+JOURNAL_DIR = os.path.join(os.path.expanduser('~'), '.third_eye', 'memo_journals')
+
+# job statuses
+PENDING = 'pending'          # memo about to be saved
+WRITTEN = 'written'          # memo saved by this run
+DONE = 'already_done'        # memo saved by an earlier run (journal)
+UNCONFIRMED = 'unconfirmed'  # left pending by a crash, may already be saved
+FAILED = 'failed'            # memo could not be saved
+
+# a memo job
+#   [account] - account number
+#   [subject] - memo subject
+#   [body]    - memo body for regular memos, call done date for collection memos
+MemoJob = namedtuple('MemoJob', ['account', 'subject', 'body'])
+
+# result of one job
+JobStatus = namedtuple('JobStatus', ['job', 'status', 'seconds'])
+
+
+def job_key(batch_id, job, collection=False):
+    '''
+    Description:
+        Stable identifier for a job within one batch, used to match it up in
+        the journal
+    '''
+    raw = json.dumps([batch_id, 'collection' if collection else 'memo', job.account, job.subject, job.body])
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+class MemoJournal:
+    '''
+    Description:
+        Append only JSON lines file recording the state of every job. Each
+        record is flushed and fsync'd before the memo it describes is saved.
+
+    Input:
+        [path] - journal file. Created if it doesn't exist
+    '''
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.state = self._load()
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def _load(self):
+        state = {}
+        if not os.path.exists(self.path):
+            return state
+        with open(self.path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue # half written line from a crash
+                state[record['key']] = record['status']
+        return state
+
+    def record(self, key, account, status):
+        self._file.write(json.dumps({'key': key, 'account': account, 'status': status, 'time': time.time()}) + '\n')
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self.state[key] = status
+
+    def close(self):
+        self._file.close()
+
+
+def batch_journal_path(batch_id, journal_dir=JOURNAL_DIR):
+    '''
+    Description:
+        Default journal file of a batch
+    '''
+    if not batch_id or os.sep in batch_id or (os.altsep and os.altsep in batch_id):
+        raise ValueError('batch_id must be a non empty name without path separators')
+    return os.path.join(journal_dir, batch_id + '.jsonl')
+
+
+def memo_batch(nav, jobs, batch_id, journal_path=None, collection=False, on_status=None):
+    '''
+    Description:
+        Memo's every job, skipping the ones the journal says are done. Jobs for
+        the same account are run back to back so the account is only searched
+        once (search_account skips the search when already on the account).
+    Input:
+        [nav]            - a logged in ThirdEyeNav
+        [jobs]           - iterable of MemoJob or (account, subject, body/date) tuples
+        [batch_id]       - name of this batch. Rerun with the same id to resume
+                           it after a crash; use a new id for every new batch
+        [journal_path]   - Optional. Journal file used to resume. Defaults to
+                           [batch_id].jsonl in JOURNAL_DIR
+        [collection]     - Optional. Use memo_account_collection (body is the
+                           call done date) instead of memo_account
+        [on_status]      - Optional. Called with each JobStatus as it finishes
+    Output:
+        A dictionary with the per job statuses, counts and memos per minute
+    '''
+    # group jobs by account, keeping the order accounts first appear in
+    grouped = OrderedDict()
+    for job in jobs:
+        job = MemoJob(*job)
+        grouped.setdefault(job.account, []).append(job)
+
+    if journal_path is None:
+        journal_path = batch_journal_path(batch_id)
+    journal = MemoJournal(journal_path)
+    statuses = []
+    counts = {WRITTEN: 0, DONE: 0, UNCONFIRMED: 0, FAILED: 0}
+    start = time.monotonic()
+    try:
+        for account_jobs in grouped.values():
+            for job in account_jobs:
+                job_start = time.monotonic()
+                status = _run_job(nav, journal, batch_id, job, collection)
+                result = JobStatus(job, status, time.monotonic() - job_start)
+                statuses.append(result)
+                counts[status] += 1
+                if on_status is not None:
+                    on_status(result)
+    finally:
+        journal.close()
+
+    elapsed = time.monotonic() - start
+    return {
+        'statuses': statuses,
+        'counts': counts,
+        'elapsed': elapsed,
+        'memos_per_minute': counts[WRITTEN] / elapsed * 60 if elapsed else 0.0,
+    }
+
+
+def _run_job(nav, journal, batch_id, job, collection):
+    key = job_key(batch_id, job, collection)
+    previous = journal.state.get(key)
+    if previous == WRITTEN:
+        return DONE
+    if previous == PENDING:
+        # saving it again could memo the account twice
+        return UNCONFIRMED
+
+    journal.record(key, job.account, PENDING)
+    if collection:
+        ok = nav.memo_account_collection(job.account, job.subject, job.body)
+    else:
+        ok = nav.memo_account(job.account, job.subject, job.body)
+    status = WRITTEN if ok else FAILED
+    journal.record(key, job.account, status)
+    return status
@@ -0,0 +1,446 @@
+"""
+mock_server.py
+
+Local stand-in for the Third Eye web app, used to measure and exercise
+ThirdEyeNav / ThirdEyeHttpNav without touching gaac.thirdeyesys.ca. It serves
+
+- the login form (LoginId / LoginPassword / login) and a session cookie
+- the search page (VISIBLE_ContractNo / quoteSearchContractByAll)
+- account pages laid out so the absolute xpaths in definitions.py resolve,
+  with the insured / collection / notices tabs (top1, top5, top6)
+- the memo screen (ALT+M, memoFunctions, memoSubject, memoBody, Save Memo)
+- the collection memo row (Reminder Call, ContractCollectionLetter_* , Save)
+- the accounting and management report pages, whose Create Report(s)
+  buttons download an html table "Excel" report as 'ControllerServlet'
+
+Every request can be slowed down with an artificial latency.
+
+Usage:
+    python -m src.mock_server [--port 8080] [--latency 0.2] [--accounts 1000]
+"""
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from html import escape
+import argparse
+import random
+import secrets
+import threading
+import time
+
+# defaults for the stand-in data
+ACCOUNTS = 1000
+REPORT_ROWS = 500
+FIRST_CONTRACT = 100000
+
+# page actions, matching the ones in definitions.PAGE_URLS
+SEARCH_ACTION = '425'
+ACCOUNTING_ACTION = '293'
+MANAGEMENT_ACTION = '295'
+
+
+def make_accounts(count=ACCOUNTS, seed=0):
+    '''
+    Description:
+        Deterministic fake accounts keyed by contract number (no MWF prefix).
+        Every third account is in good standing and has no cancellation date,
+        like the real ones.
+    '''
+    rng = random.Random(seed)
+    accounts = {}
+    for i in range(count):
+        number = str(FIRST_CONTRACT + i)
+        late = i % 3 != 0
+        accounts[number] = {
+            'contract': 'MWF' + number,
+            'insured': 'Insured Person ' + str(i),
+            'phone': '(%03d)%03d-%04d ext' % (rng.randint(200, 999), rng.randint(200, 999), rng.randint(0, 9999)),
+            'agent': 'Agency ' + str(i % 50),
+            'agentphone': '(%03d) %03d-%04d x1' % (rng.randint(200, 999), rng.randint(200, 999), rng.randint(0, 9999)),
+            'loangroup': 'LG' + str(i % 7),
+            'nextpaymentdate': '%02d/%02d/2025' % (rng.randint(1, 12), rng.randint(1, 28)),
+            'defaultdate': '%02d/%02d/2025' % (rng.randint(1, 12), rng.randint(1, 28)) if late else '',
+            'canceldate': '%02d/%02d/2025' % (rng.randint(1, 12), rng.randint(1, 28)) if late else None,
+            'payamt': '$%s.%02d' % ('{:,}'.format(rng.randint(50, 3000)), rng.randint(0, 99)),
+            'latepayamt': '$%d.00' % (rng.randint(0, 50) if late else 0),
+            'nextpaydate': '$%s.%02d' % ('{:,}'.format(rng.randint(50, 3000)), rng.randint(0, 99)),
+            'due': '$%s.%02d' % ('{:,}'.format(rng.randint(0, 9000) if late else 0), rng.randint(0, 99)),
+            'address': '%d Main St<br>Town %d, ON' % (rng.randint(1, 999), i % 20),
+            'notices': ['Notice of Intent %02d/%02d/2024' % (rng.randint(1, 12), rng.randint(1, 28))],
+            'memos': [],
+            'collection_memos': [],
+        }
+    return accounts
+
+
+class MockThirdEyeServer:
+    '''
+    Description:
+        Threaded HTTP server holding the fake accounts, sessions and memos.
+        Call start() to serve on a background thread and stop() when done.
+
+    Input:
+        [host], [port]   - where to listen. Port 0 picks a free one
+        [latency]        - seconds added to every request
+        [report_latency] - extra seconds spent "generating" a report
+        [accounts]       - number of fake accounts
+        [report_rows]    - rows in each downloaded report
+        [username], [password] - Optional. Required credentials. Anything is
+                           accepted when they are None
+    '''
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, report_latency=0.0,
+                 accounts=ACCOUNTS, report_rows=REPORT_ROWS, username=None, password=None):
+        self.latency = latency
+        self.report_latency = report_latency
+        self.report_rows = report_rows
+        self.username = username
+        self.password = password
+        self.accounts = make_accounts(accounts)
+        self.sessions = set()
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.httpd = ThreadingHTTPServer((host, port), _Handler)
+        self.httpd.mock = self
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return 'http://%s:%d/insight/' % (host, port)
+
+    def contracts(self):
+        return [account['contract'] for account in self.accounts.values()]
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def find_account(self, number):
+        number = (number or '').strip().upper()
+        if number.startswith('MWF'):
+            number = number[3:]
+        return self.accounts.get(number)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1' # keep-alive, like the real server
+    disable_nagle_algorithm = True
+    wbufsize = -1 # send headers and body together, flushed after each request
+
+    def log_message(self, format, *args):
+        pass # quiet
+
+    # request plumbing
+
+    @property
+    def mock(self):
+        return self.server.mock
+
+    def _begin(self):
+        with self.mock.lock:
+            self.mock.requests += 1
+        if self.mock.latency:
+            time.sleep(self.mock.latency)
+        url = urlparse(self.path)
+        self.query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        self.route = url.path
+        self.form = {}
+        if self.command == 'POST':
+            length = int(self.headers.get('Content-Length') or 0)
+            body = self.rfile.read(length).decode('utf-8', 'replace')
+            self.form = {k: v[0] for k, v in parse_qs(body, keep_blank_values=True).items()}
+
+    def _logged_in(self):
+        cookies = self.headers.get('Cookie') or ''
+        for part in cookies.split(';'):
+            name, _, value = part.strip().partition('=')
+            if name == 'JSESSIONID' and value in self.mock.sessions:
+                return True
+        return False
+
+    def _send(self, body, status=200, content_type='text/html; charset=utf-8', headers=None):
+        data = body.encode('utf-8') if isinstance(body, str) else body
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _redirect(self, location, headers=None):
+        headers = dict(headers or {})
+        headers['Location'] = location
+        self._send('', status=303, headers=headers)
+
+    def do_GET(self):
+        self._begin()
+        if not self.route.startswith('/insight'):
+            return self._send('not found', status=404, content_type='text/plain')
+        action = self.query.get('action')
+        if action is None:
+            return self._send(login_page())
+        if not self._logged_in():
+            return self._send(login_page())
+        if action == 'home':
+            return self._send(page('Home', search_form() + '<p>Admin Options</p>'))
+        if action == SEARCH_ACTION:
+            return self._send(page('Search', search_form() + '<p>Admin Options</p>'))
+        if action == 'account':
+            return self._account(self.query.get('contract'))
+        if action == ACCOUNTING_ACTION:
+            return self._send(report_page('Create Report', ['Check Register']))
+        if action == MANAGEMENT_ACTION:
+            return self._send(report_page('Create Reports', ['Collection Report', 'Late Payment Calls (Excel)']))
+        if action == 'report':
+            return self._report()
+        return self._send(page('Unknown', '<p>Unknown action</p>'), status=404)
+
+    def do_POST(self):
+        self._begin()
+        action = self.query.get('action')
+        if action == 'login':
+            return self._login()
+        if not self._logged_in():
+            return self._send(login_page())
+        if action == 'search':
+            return self._account(self.form.get('VISIBLE_ContractNo'))
+        if action == 'memo':
+            return self._save_memo()
+        if action == 'collection_memo':
+            return self._save_collection_memo()
+        return self._send(page('Unknown', '<p>Unknown action</p>'), status=404)
+
+    # actions
+
+    def _login(self):
+        mock = self.mock
+        if ((mock.username is not None and self.form.get('LoginId') != mock.username) or
+                (mock.password is not None and self.form.get('LoginPassword') != mock.password)):
+            return self._send(login_page('Invalid login'))
+        token = secrets.token_hex(16)
+        with mock.lock:
+            mock.sessions.add(token)
+        self._redirect('ControllerServlet?action=home',
+                       headers={'Set-Cookie': 'JSESSIONID=' + token + '; Path=/insight; HttpOnly'})
+
+    def _account(self, number):
+        account = self.mock.find_account(number)
+        if account is None:
+            return self._send(page('Search', search_form() + '<p>No contracts found</p>'))
+        return self._send(account_page(account))
+
+    def _save_memo(self):
+        account = self.mock.find_account(self.form.get('contract'))
+        if account is None:
+            return self._send(page('Error', '<p>No such contract</p>'), status=404)
+        with self.mock.lock:
+            account['memos'].append((self.form.get('memoSubject', ''), self.form.get('memoBody', '')))
+        self._redirect('ControllerServlet?action=account&contract=' + account['contract'])
+
+    def _save_collection_memo(self):
+        account = self.mock.find_account(self.form.get('contract'))
+        if account is None:
+            return self._send(page('Error', '<p>No such contract</p>'), status=404)
+        with self.mock.lock:
+            account['collection_memos'].append((self.form.get('ContractCollectionLetter_CallDoneDate0', ''),
+                                                self.form.get('ContractCollectionLetter_Memo0', '')))
+        self._redirect('ControllerServlet?action=account&contract=' + account['contract'])
+
+    def _report(self):
+        if self.mock.report_latency:
+            time.sleep(self.mock.report_latency)
+        name = self.query.get('availableReportList', 'Report')
+        rows = ['<tr><th>Contract No</th><th>Insured</th><th>Due Date</th><th>Amount Due</th><th>Agent</th></tr>']
+        accounts = list(self.mock.accounts.values())
+        for i in range(self.mock.report_rows):
+            account = accounts[i % len(accounts)]
+            rows.append('<tr><td>%s</td><td>%s</td><td>%s</td><td>%s</td><td>%s</td></tr>' % (
+                account['contract'], escape(account['insured']), account['nextpaymentdate'],
+                account['due'], escape(account['agent'])))
+        body = ('<html><body><table><tr><td>' + escape(name) + ' ' + escape(self.query.get('FromDate', '')) +
+                ' - ' + escape(self.query.get('ToDate', '')) + '</td></tr></table><table>' +
+                '\n'.join(rows) + '</table></body></html>')
+        self._send(body, content_type='application/vnd.ms-excel',
+                   headers={'Content-Disposition': 'attachment; filename="ControllerServlet"'})
+
+
+# html
+
+def page(title, body, script=''):
+    return ('<!DOCTYPE html><html><head><title>Third Eye - ' + escape(title) + '</title></head><body>' +
+            body + script + '</body></html>')
+
+
+def login_page(message=''):
+    return page('Login',
+                '<form method="post" action="ControllerServlet?action=login">'
+                '<p>' + escape(message) + '</p>'
+                'User <input type="text" name="LoginId"> '
+                'Password <input type="password" name="LoginPassword"> '
+                '<input type="submit" name="login" value="Login">'
+                '</form>')
+
+
+def search_form():
+    return ('<form method="post" action="ControllerServlet?action=search">'
+            'Contract <input type="text" name="VISIBLE_ContractNo"> '
+            '<input type="submit" name="quoteSearchContractByAll" value="Search">'
+            '</form>')
+
+
+def report_page(button_title, reports):
+    options = ''.join('<option value="%s">%s</option>' % (escape(r), escape(r)) for r in reports)
+    return page('Reports',
+                '<form method="get" action="ControllerServlet">'
+                '<input type="hidden" name="action" value="report">'
+                '<select name="availableReportList">' + options + '</select> '
+                'From <input type="text" id="FromDate" name="FromDate"> '
+                'To <input type="text" id="ToDate" name="ToDate"> '
+                '<input type="submit" title="' + button_title + '" value="' + button_title + '">'
+                '</form>')
+
+
+def _row(*cells):
+    return '<tr>' + ''.join('<td>' + cell + '</td>' for cell in cells) + '</tr>'
+
+
+ACCOUNT_SCRIPT = """
+<script>
+function showTab(id) {
+    document.getElementById(id).style.display = '';
+}
+document.addEventListener('keydown', function (e) {
+    if (e.altKey && ((e.key || '').toLowerCase() === 'm' || e.code === 'KeyM')) {
+        document.getElementById('memoScreen').style.display = '';
+    }
+});
+</script>
+"""
+
+
+def account_page(account):
+    a = {key: escape(value) if isinstance(value, str) else value for key, value in account.items()}
+    cancel = _row('Cancellation Date', a['canceldate']) if account['canceldate'] is not None else '<tr><td>Cancellation Date</td></tr>'
+
+    summary = (
+        '<span>'
+        '<div><table>' +
+        _row('Contract', '', a['contract']) +
+        _row('Insured', '', a['insured']) +
+        _row('Phone', '', '<span>' + a['phone'] + '</span>') +
+        '</table></div>'
+        '<div></div>'
+        '<div><table>' +
+        _row('Agent', '', a['agent']) +
+        _row('Agent Phone', '', a['agentphone']) +
+        _row('Loan Group', '', a['loangroup']) +
+        '</table></div>'
+        '<div></div><div></div><div></div>'
+        '<div><div>Payments</div><div><table>' +
+        _row('Schedule', '') +
+        _row('Next Payment Date', a['nextpaymentdate']) +
+        _row('NOI Date', a['defaultdate']) +
+        cancel +
+        _row('Plan', '') +
+        _row('Regular Payment', '<b><span>' + a['payamt'] + '</span></b>') +
+        _row('Late Payment', a['latepayamt']) +
+        _row('', '') +
+        _row('Next Payment Amount', a['nextpaydate']) +
+        _row('Current Due', a['due']) +
+        '</table></div></div>'
+        '</span>')
+
+    insured_tab = ('<span id="tabInsured" style="display:none"><table>' +
+                   _row('Insured', '') + _row('Mailing', '') + _row('Address', account['address']) +
+                   '</table></span>')
+
+    collection_rows = ''.join(_row(escape(d), escape(m)) for d, m in account['collection_memos'])
+    collection_tab = (
+        '<span id="tabCollection" style="display:none">'
+        '<input type="button" title="Reminder Call" value="Reminder Call" '
+        'onclick="document.getElementById(\'newCall\').style.display=\'\'">'
+        '<table>' + _row('Call Done', 'Memo') + collection_rows + '</table>'
+        '<div id="newCall" style="display:none">'
+        'Date <input type="text" name="ContractCollectionLetter_CallDoneDate0"> '
+        'Memo <input type="text" name="ContractCollectionLetter_Memo0"> '
+        '<input type="submit" title="Save" value="Save">'
+        '</div></span>')
+
+    notices = ''.join(_row(escape(n)) for n in account['notices'])
+    notices_tab = '<span id="tabNotices" style="display:none"><table>' + notices + '</table></span>'
+
+    panel = summary + insured_tab + '<span></span><span></span>' + collection_tab + '<span></span>' + notices_tab
+
+    memos = ''.join('<li>' + escape(s) + ' - ' + escape(b) + '</li>' for s, b in account['memos'])
+    memo_screen = (
+        '<div id="memoScreen" style="display:none">'
+        '<a id="memoFunctions" href="#" onclick="document.getElementById(\'memoEditor\').style.display=\'\'; return false;">New Memo</a>'
+        '<form method="post" action="ControllerServlet?action=memo">'
+        '<input type="hidden" name="contract" value="' + a['contract'] + '">'
+        '<div id="memoEditor" style="display:none">'
+        '<input type="text" id="memoSubject" name="memoSubject"> '
+        '<textarea id="memoBody" name="memoBody"></textarea> '
+        '<input type="submit" title="Save Memo" value="Save Memo">'
+        '</div></form>'
+        '<ul id="memoList">' + memos + '</ul>'
+        '</div>')
+
+    tabs = ('<table><tr><td>'
+            '<a id="top1" href="#" onclick="showTab(\'tabInsured\'); return false;">Insured</a> '
+            '<a id="top5" href="#" onclick="showTab(\'tabCollection\'); return false;">Collections</a> '
+            '<a id="top6" href="#" onclick="showTab(\'tabNotices\'); return false;">Notices</a>'
+            '</td></tr></table>')
+
+    body = (
+        search_form() +
+        '<form method="post" action="ControllerServlet?action=collection_memo">'
+        '<input type="hidden" name="contract" value="' + a['contract'] + '">'
+        '<div>' + tabs +
+        '<table><tr><td><table>'
+        '<tr><td>Admin Options</td></tr>'
+        '<tr><td></td></tr>'
+        '<tr><td></td><td><table>'
+        '<tr><td></td></tr>'
+        '<tr><td></td><td>' + panel + '</td></tr>'
+        '</table></td></tr>'
+        '</table></td></tr></table>'
+        '</div></form>' +
+        memo_screen)
+    return page('Account ' + account['contract'], body, ACCOUNT_SCRIPT)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local stand-in for the Third Eye web app')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every request')
+    parser.add_argument('--report-latency', type=float, default=0.0, help='extra seconds per report')
+    parser.add_argument('--accounts', type=int, default=ACCOUNTS)
+    parser.add_argument('--report-rows', type=int, default=REPORT_ROWS)
+    args = parser.parse_args()
+
+    server = MockThirdEyeServer(args.host, args.port, args.latency, args.report_latency,
+                                args.accounts, args.report_rows)
+    print('Serving mock Third Eye at ' + server.base_url)
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == '__main__':
+    main()
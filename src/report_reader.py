@@ -0,0 +1,338 @@
+"""
+report_reader.py
+
+Streams the rows of the reports saved by ThirdEyeNav.download_report (Check
+Register, Collection Report, Late Payment Calls (Excel)) as typed records.
+Files are read one row at a time with generators so memory stays flat no
+matter how large the report is.
+
+Supported formats (sniffed from the first bytes, not the extension):
+- csv / tab separated text
+- html tables saved with an .xls extension (what Third Eye's "Excel"
+  reports usually are)
+- .xlsx (needs openpyxl)
+- legacy binary .xls (needs xlrd, which loads the workbook up front)
+"""
+
+from collections import namedtuple
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+from html.parser import HTMLParser
+import csv
+import itertools
+import re
+
+# bytes read per chunk when streaming text and html reports
+CHUNK_SIZE = 64 * 1024
+
+# names of the contract number column, compared after _header_name (so
+# 'Contract No.', 'CONTRACT_NO' and 'Contract #' all match). A whole cell has
+# to match: a title row like 'Accounts 30 days late' is not a header
+CONTRACT_HEADERS = frozenset(base + suffix
+                             for base in ('contract', 'account', 'acct', 'policy')
+                             for suffix in ('', ' no', ' number', ' num', ' nbr', 'no', 'number'))
+
+# number of leading rows searched for the header row. Reports often start
+# with a title and the date range before the actual table
+HEADER_SEARCH_ROWS = 50
+
+DATE_FORMATS = ('%m/%d/%Y', '%m/%d/%y', '%Y-%m-%d', '%d-%b-%Y', '%b %d, %Y')
+
+US_DATE_RE = re.compile(r'^(\d{1,2})/(\d{1,2})/(\d{4})$')
+MONEY_RE = re.compile(r'^\(?-?\$?-?[\d,]*\d(\.\d+)?\)?$')
+DATE_RE = re.compile(r'^(\d{1,4}[/-]\d{1,2}[/-]\d{1,4}|[A-Za-z]{3} \d{1,2}, \d{4}|\d{1,2}-[A-Za-z]{3}-\d{4})$')
+
+# a single report row
+#   [contract] - contract number as a string ('' if the row has none)
+#   [fields]   - dictionary of column header -> typed value (date, Decimal or str)
+#   [line]     - row number within the table, starting at 1 after the header
+ReportRow = namedtuple('ReportRow', ['contract', 'fields', 'line'])
+
+
+def read_report(path, unique=False):
+    '''
+    Description:
+        Streams the typed rows of a downloaded report.
+    Input:
+        [path]   - path of the downloaded report
+        [unique] - Optional. Only yield the first row for each contract
+    Output:
+        A generator of ReportRow
+    '''
+    header, rows = raw_table(path)
+    if header is None:
+        return
+
+    contract_col = _contract_column(header)
+    seen = set()
+    line = 0
+    for raw in rows:
+        if not any(str(cell).strip() for cell in raw if cell is not None):
+            continue
+        line += 1
+        fields = {}
+        for name, cell in zip(header, raw):
+            if name:
+                fields[name] = convert(cell)
+        contract = ''
+        if contract_col is not None and contract_col < len(raw):
+            contract = _cell_text(raw[contract_col])
+        if unique:
+            if contract in seen:
+                continue
+            seen.add(contract)
+        yield ReportRow(contract, fields, line)
+
+
+def raw_table(path):
+    '''
+    Description:
+        The header row of a report and an iterator over the raw (unconverted)
+        rows after it. Title rows above the header are skipped.
+    Output:
+        (header, rows). header is None for an empty report
+    '''
+    return _find_header(iter_raw_rows(path))
+
+
+def iter_raw_rows(path):
+    '''
+    Description:
+        Yields each row of the report as a list of cell values. Picks the
+        parser by looking at the first bytes of the file.
+    '''
+    with open(path, 'rb') as f:
+        magic = f.read(8)
+
+    if magic.startswith(b'PK'):
+        return _xlsx_rows(path)
+    if magic.startswith(b'\xd0\xcf\x11\xe0'):
+        return _xls_rows(path)
+    if magic.lstrip().startswith(b'<'):
+        return _html_rows(path)
+    return _csv_rows(path)
+
+
+def convert(value):
+    '''
+    Description:
+        Converts a cell to a date, Decimal or stripped string based on what it
+        looks like. '$1,234.56' and '(12.00)' become Decimals, '01/31/2025'
+        becomes a date.
+    '''
+    if value is None:
+        return ''
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    if isinstance(value, bool):
+        return str(value)
+    if isinstance(value, (int, float)):
+        return Decimal(str(value))
+
+    text = str(value).strip()
+    if not text:
+        return ''
+    match = US_DATE_RE.match(text)
+    if match:
+        # fast path for the mm/dd/yyyy dates Third Eye uses, strptime is slow
+        month, day, year = match.groups()
+        try:
+            return date(int(year), int(month), int(day))
+        except ValueError:
+            return text
+    if DATE_RE.match(text):
+        for fmt in DATE_FORMATS:
+            try:
+                return datetime.strptime(text, fmt).date()
+            except ValueError:
+                pass
+    if MONEY_RE.match(text) and ('.' in text or '$' in text or ',' in text):
+        negative = text.startswith('(') or '-' in text
+        digits = text.strip('()').replace('$', '').replace(',', '').replace('-', '')
+        try:
+            amount = Decimal(digits)
+        except InvalidOperation:
+            return text
+        return -amount if negative else amount
+    return text
+
+
+def memo_rows(nav, rows, memo_subject, done_date):
+    '''
+    Description:
+        Feeds report rows straight into ThirdEyeNav.memo_account_collection.
+        Each contract is memo'd once even if it shows up on several rows.
+    Input:
+        [nav]          - a logged in ThirdEyeNav
+        [rows]         - iterable of ReportRow (e.g. read_report(path))
+        [memo_subject] - The memo as a string
+        [done_date]    - call done date as a string
+    Output:
+        A generator of (contract, success) tuples
+    '''
+    seen = set()
+    for row in rows:
+        if not row.contract or row.contract in seen:
+            continue
+        seen.add(row.contract)
+        yield row.contract, nav.memo_account_collection(row.contract, memo_subject, done_date)
+
+
+def scrape_rows(nav, rows, desired_info, **kwargs):
+    '''
+    Description:
+        Feeds report rows straight into get_info. Works with ThirdEyeNav or
+        anything with the same get_info signature. Each contract is scraped once.
+    Output:
+        A generator of (contract, info) tuples
+    '''
+    seen = set()
+    for row in rows:
+        if not row.contract or row.contract in seen:
+            continue
+        seen.add(row.contract)
+        yield row.contract, nav.get_info(row.contract, desired_info, **kwargs)
+
+
+def _find_header(rows):
+    # returns (header, rest of the rows). The rows searched are kept so that
+    # none are lost when the header has to fall back to the first row
+    scanned = []
+    for raw in itertools.islice(rows, HEADER_SEARCH_ROWS):
+        scanned.append(raw)
+        cells = [str(cell).strip() if cell is not None else '' for cell in raw]
+        if _contract_column(cells) is not None:
+            return cells, rows
+
+    # no recognisable header. Fall back to the first row so the rest of the
+    # file is still read, just without a contract column
+    for index, raw in enumerate(scanned):
+        cells = [str(cell).strip() if cell is not None else '' for cell in raw]
+        if any(cells):
+            return cells, itertools.chain(scanned[index + 1:], rows)
+    return None, rows
+
+
+def _header_name(name):
+    return ' '.join(re.sub(r'[^a-z0-9]+', ' ', str(name).lower()).split())
+
+
+def _cell_text(value):
+    # spreadsheet readers hand back whole numbers as floats: contract 100000
+    # has to come out as '100000', not '100000.0'
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value if value is not None else '').strip()
+
+
+def _contract_column(header):
+    for index, name in enumerate(header):
+        if _header_name(name) in CONTRACT_HEADERS:
+            return index
+    return None
+
+
+def _csv_rows(path):
+    with open(path, newline='', encoding='utf-8-sig', errors='replace') as f:
+        sample = f.read(CHUNK_SIZE)
+        f.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=',\t;|')
+        except csv.Error:
+            dialect = csv.excel
+        for raw in csv.reader(f, dialect):
+            yield raw
+
+
+def _xlsx_rows(path):
+    import openpyxl # optional, only needed for real .xlsx reports
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        for raw in workbook.worksheets[0].iter_rows(values_only=True):
+            yield list(raw)
+    finally:
+        workbook.close()
+
+
+def _xls_rows(path):
+    import xlrd # optional, only needed for legacy binary .xls reports
+    workbook = xlrd.open_workbook(path, on_demand=True)
+    try:
+        sheet = workbook.sheet_by_index(0)
+        for index in range(sheet.nrows):
+            raw = []
+            for cell in sheet.row(index):
+                if cell.ctype == xlrd.XL_CELL_DATE:
+                    raw.append(xlrd.xldate.xldate_as_datetime(cell.value, workbook.datemode))
+                elif cell.ctype == xlrd.XL_CELL_NUMBER and cell.value.is_integer():
+                    # xlrd stores every number as a float
+                    raw.append(int(cell.value))
+                else:
+                    raw.append(cell.value)
+            yield raw
+    finally:
+        workbook.release_resources()
+
+
+class _TableRowParser(HTMLParser):
+    '''
+    Description:
+        Incremental html parser that collects <tr> rows as lists of cell text.
+        Finished rows are drained by _html_rows after every chunk so only one
+        chunk worth of rows is held at a time.
+    '''
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.rows = []
+        self._row = None
+        self._cell = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'tr':
+            self._end_row()
+            self._row = []
+        elif tag in ('td', 'th'):
+            self._end_cell()
+            if self._row is None:
+                self._row = []
+            self._cell = []
+        elif tag == 'br' and self._cell is not None:
+            self._cell.append(' ')
+
+    def handle_endtag(self, tag):
+        if tag in ('td', 'th'):
+            self._end_cell()
+        elif tag in ('tr', 'table'):
+            self._end_row()
+
+    def handle_data(self, data):
+        if self._cell is not None:
+            self._cell.append(data)
+
+    def _end_cell(self):
+        if self._cell is not None and self._row is not None:
+            self._row.append(' '.join(''.join(self._cell).split()))
+        self._cell = None
+
+    def _end_row(self):
+        self._end_cell()
+        if self._row:
+            self.rows.append(self._row)
+        self._row = None
+
+
+def _html_rows(path):
+    parser = _TableRowParser()
+    with open(path, encoding='utf-8', errors='replace') as f:
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            parser.feed(chunk)
+            rows, parser.rows = parser.rows, []
+            yield from rows
+    parser.close()
+    parser._end_row()
+    yield from parser.rows
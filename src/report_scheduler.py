@@ -0,0 +1,338 @@
+"""
+report_scheduler.py
+
+Runs report downloads concurrently. A job is (report, from date, to date):
+
+- long date ranges are split into chunks (calendar months by default), so a
+  year of Check Register is twelve quick requests instead of one that takes
+  minutes to generate
+- chunks run in parallel, each on its own ThirdEyeNav session with its own
+  download directory (download_report tells files apart by watching the
+  directory, so two sessions can't share one)
+- the chunks of a job are merged into one CSV in date order
+- a job or chunk that is already downloading is not downloaded again:
+  callers asking for the same thing share the one download
+
+    with ReportScheduler('headless', username, password, sessions=4) as scheduler:
+        futures = [scheduler.submit('Check Register', '01/01/2024', '12/31/2024'),
+                   scheduler.submit('Late Payment', '06/01/2024', '06/30/2024')]
+        for future in futures:
+            print(future.result().path)
+"""
+
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from src.download_watcher import DownloadResult, report_filename
+from src.report_reader import raw_table
+import csv
+import os
+import queue
+import shutil
+import tempfile
+import threading
+import time
+
+# default number of browser sessions downloading at once
+SESSIONS = 3
+
+# reports that take a date range and can be split
+DATED_REPORTS = ('Check Register', 'Late Payment')
+
+# 'month' splits on calendar months, a number splits every that many days
+CHUNK = 'month'
+
+# times a chunk is retried (on a fresh session if its driver died)
+CHUNK_RETRIES = 1
+
+# dates as typed into Third Eye's FromDate / ToDate fields
+DATE_FORMAT = '%m/%d/%Y'
+
+# a requested report
+ReportJob = namedtuple('ReportJob', ['report', 'l_date', 'r_date'])
+
+
+def split_range(l_date, r_date, chunk=CHUNK):
+    '''
+    Description:
+        Splits the inclusive range [l_date, r_date] (mm/dd/yyyy) into
+        consecutive sub ranges. Month chunks line up with calendar months so
+        overlapping requests end up asking for identical chunks
+    Output:
+        A list of (from, to) date strings in order
+    '''
+    start = datetime.strptime(l_date, DATE_FORMAT).date()
+    end = datetime.strptime(r_date, DATE_FORMAT).date()
+    if end < start:
+        raise ValueError('From date ' + l_date + ' is after to date ' + r_date)
+
+    ranges = []
+    while start <= end:
+        if chunk == 'month':
+            next_month = (start.replace(day=1) + timedelta(days=32)).replace(day=1)
+            stop = min(end, next_month - timedelta(days=1))
+        else:
+            stop = min(end, start + timedelta(days=int(chunk) - 1))
+        ranges.append((start.strftime(DATE_FORMAT), stop.strftime(DATE_FORMAT)))
+        start = stop + timedelta(days=1)
+    return ranges
+
+
+def merge_reports(paths, output_path):
+    '''
+    Description:
+        Concatenates the tables of several downloaded reports into one CSV.
+        The header is taken from the first file that has one; title rows and
+        repeated headers of the other files are dropped
+    Output:
+        Number of data rows written
+    '''
+    header = None
+    count = 0
+    with open(output_path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        for path in paths:
+            file_header, rows = raw_table(path)
+            if file_header is None:
+                continue
+            if header is None:
+                header = file_header
+                writer.writerow(header)
+            for raw in rows:
+                cells = ['' if cell is None else str(cell).strip() for cell in raw]
+                if not any(cells) or cells == header:
+                    continue
+                writer.writerow(cells)
+                count += 1
+    return count
+
+
+class ReportScheduler:
+    '''
+    Description:
+        Downloads reports on a small pool of browser sessions. submit() returns
+        a concurrent.futures.Future holding a DownloadResult for the merged
+        file (or None if any chunk could not be downloaded).
+
+    Input:
+        [headless], [username], [password] - passed to ThirdEyeNav
+        [sessions]    - Optional. Browser sessions downloading at once
+        [output_dir]  - Optional. Where merged reports are written
+        [chunk]       - Optional. 'month' or a number of days per chunk
+        [nav_factory] - Optional. Callable taking a download directory and
+                        returning a session. Defaults to ThirdEyeNav
+        [nav_kwargs]  - Optional. Extra ThirdEyeNav arguments (lean, throttle...)
+    '''
+    def __init__(self, headless, username, password, sessions=SESSIONS, output_dir=None,
+                 chunk=CHUNK, nav_factory=None, **nav_kwargs):
+        if sessions < 1:
+            raise ValueError('Need at least one session')
+        from src.third_eye_nav import DOWNLOAD_DIR
+        self.headless = headless
+        self.username = username
+        self.password = password
+        self.sessions = sessions
+        self.output_dir = output_dir or DOWNLOAD_DIR
+        self.chunk = chunk
+        self.nav_factory = nav_factory
+        self.nav_kwargs = nav_kwargs
+        self.work_dir = tempfile.mkdtemp(prefix='third_eye_reports_')
+        self.stats = {'jobs': 0, 'jobs_shared': 0, 'chunks': 0, 'chunks_shared': 0, 'chunk_failures': 0}
+
+        self._lock = threading.Lock()
+        self._jobs = {}    # ReportJob -> Future, while running
+        self._chunks = {}  # ReportJob -> Future, while running
+        self._idle = queue.Queue()
+        self._navs = []
+        # lean chrome profile slots, one per open session (chrome locks them)
+        self._free_slots = list(range(sessions))
+        self._slots = {}
+        self._chunk_pool = ThreadPoolExecutor(sessions, thread_name_prefix='report-chunk')
+        self._job_pool = ThreadPoolExecutor(sessions * 2, thread_name_prefix='report-job')
+        self._closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        '''
+        Description:
+            Waits for running jobs, then closes every session and removes the
+            chunk files
+        '''
+        if self._closed:
+            return
+        self._closed = True
+        self._job_pool.shutdown(wait=True)
+        self._chunk_pool.shutdown(wait=True)
+        for nav in self._navs:
+            try:
+                nav.close_driver()
+            except Exception:
+                pass
+        self._navs = []
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def submit(self, report, l_date=None, r_date=None):
+        '''
+        Description:
+            Schedules a report. Asking for a job that is already running
+            returns the running job's future instead of downloading it twice
+        Output:
+            A Future of DownloadResult (None on failure)
+        '''
+        job = ReportJob(report, l_date, r_date)
+        with self._lock:
+            if self._closed:
+                raise RuntimeError('ReportScheduler is closed')
+            future = self._jobs.get(job)
+            if future is not None:
+                self.stats['jobs_shared'] += 1
+                return future
+            self.stats['jobs'] += 1
+            future = self._job_pool.submit(self._run_job, job)
+            self._jobs[job] = future
+        future.add_done_callback(lambda _: self._forget(self._jobs, job))
+        return future
+
+    def run(self, jobs):
+        '''
+        Description:
+            Submits every (report, from, to) job and waits for all of them
+        Output:
+            A list of DownloadResult (or None) in the same order as jobs
+        '''
+        futures = [self.submit(*job) for job in jobs]
+        return [future.result() for future in futures]
+
+    def _forget(self, running, key):
+        with self._lock:
+            running.pop(key, None)
+
+    def chunks(self, job):
+        '''
+        Description:
+            The chunk jobs a job is split into
+        '''
+        if job.report not in DATED_REPORTS or not job.l_date or not job.r_date:
+            return [job]
+        return [ReportJob(job.report, l, r) for l, r in split_range(job.l_date, job.r_date, self.chunk)]
+
+    def _submit_chunk(self, chunk):
+        with self._lock:
+            future = self._chunks.get(chunk)
+            if future is not None:
+                self.stats['chunks_shared'] += 1
+                return future
+            self.stats['chunks'] += 1
+            future = self._chunk_pool.submit(self._download_chunk, chunk)
+            self._chunks[chunk] = future
+        future.add_done_callback(lambda _: self._forget(self._chunks, chunk))
+        return future
+
+    def _run_job(self, job):
+        start = time.monotonic()
+        futures = [self._submit_chunk(chunk) for chunk in self.chunks(job)]
+        paths = [future.result() for future in futures]
+        if any(path is None for path in paths):
+            print("Could not download all of " + job.report + ", giving up on the merge")
+            return None
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        output_path = os.path.join(self.output_dir, report_filename(job.report, job.l_date, job.r_date, '.csv'))
+        merge_reports(paths, output_path)
+        return DownloadResult(output_path, os.path.getsize(output_path), time.monotonic() - start)
+
+    def _new_nav(self):
+        # every session downloads into its own directory
+        download_dir = tempfile.mkdtemp(dir=self.work_dir)
+        if self.nav_factory is not None:
+            nav = self.nav_factory(download_dir)
+            slot = None
+        else:
+            from src.third_eye_nav import ThirdEyeNav, lean_profile_dir
+            with self._lock:
+                slot = self._free_slots.pop(0)
+            kwargs = dict(self.nav_kwargs)
+            kwargs.setdefault('profile_dir', lean_profile_dir(slot))
+            try:
+                nav = ThirdEyeNav(self.headless, self.username, self.password,
+                                  download_dir=download_dir, **kwargs)
+            except Exception:
+                self._release_slot(slot)
+                raise
+        if not nav.login():
+            # a logged out session would fail every chunk it is given
+            try:
+                nav.close_driver()
+            except Exception:
+                pass
+            if slot is not None:
+                self._release_slot(slot)
+            raise RuntimeError('Could not log in to Third Eye')
+        with self._lock:
+            self._navs.append(nav)
+            if slot is not None:
+                self._slots[id(nav)] = slot
+        return nav
+
+    def _release_slot(self, slot):
+        with self._lock:
+            self._free_slots.append(slot)
+
+    def _take_nav(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        # at most one session per chunk thread, so this never exceeds [sessions]
+        return self._new_nav()
+
+    def _retire_nav(self, nav):
+        with self._lock:
+            if nav in self._navs:
+                self._navs.remove(nav)
+            slot = self._slots.pop(id(nav), None)
+        try:
+            nav.close_driver()
+        except Exception:
+            pass
+        if slot is not None:
+            self._release_slot(slot)
+
+    def _download_chunk(self, chunk):
+        # runs on a chunk thread. Returns the path of a private copy of the
+        # chunk (the session's download directory is reused) or None
+        try:
+            nav = self._take_nav()
+        except Exception as e:
+            print("Could not start a session for " + chunk.report + ": " + str(e))
+            return None
+        try:
+            for attempt in range(CHUNK_RETRIES + 1):
+                result = nav.download_report(chunk.report, chunk.l_date, chunk.r_date)
+                if result is not None:
+                    path = os.path.join(self.work_dir, report_filename(*chunk) + os.path.splitext(result.path)[1])
+                    os.replace(result.path, path)
+                    return path
+                with self._lock:
+                    self.stats['chunk_failures'] += 1
+                if not nav.is_alive() and attempt < CHUNK_RETRIES:
+                    self._retire_nav(nav)
+                    nav = None
+                    nav = self._new_nav()
+            return None
+        except Exception as e:
+            print("Failed to download " + report_filename(*chunk) + ": " + str(e))
+            return None
+        finally:
+            # only a working session goes back; the next chunk starts a new
+            # one in place of a dead or closed session
+            if nav is not None:
+                if nav.is_alive():
+                    self._idle.put(nav)
+                else:
+                    self._retire_nav(nav)
@@ -0,0 +1,305 @@
+"""
+session_pool.py
+
+This module contains a pool of logged in ThirdEyeNav sessions. Each worker owns
+its own chrome driver and WebDriverWait object so account numbers can be
+scraped or memo'd in parallel instead of one after another.
+
+Dependencies:
+- Selenium
+- Chrome Web Browser executbale on your system
+"""
+
+from src.third_eye_nav import ThirdEyeNav, lean_profile_dir
+from selenium.common.exceptions import InvalidSessionIdException
+from selenium.common.exceptions import NoSuchWindowException
+import queue
+import threading
+import time
+
+# default number of browsers in the pool. Third Eye starts timing out when
+# too many sessions hit it at once so keep this modest
+POOL_SIZE = 4
+
+# number of times a job is retried on a fresh driver before giving up
+MAX_RETRIES = 1
+
+# extra login attempts for a new session before it is given up on
+LOGIN_RETRIES = 1
+
+# errors that mean the browser session itself is gone
+SESSION_LOST = (InvalidSessionIdException, NoSuchWindowException)
+
+
+class PoolWorker:
+    '''
+    Description:
+        One slot in the pool. Holds a ThirdEyeNav session plus the counters
+        used to size the pool against the server.
+
+    Input:
+        [worker_id] - index of the worker in the pool
+        [nav]       - a ThirdEyeNav object (or anything with the same API)
+    '''
+    def __init__(self, worker_id, nav):
+        self.worker_id = worker_id
+        self.nav = nav
+        self.processed = 0
+        self.failures = 0
+        self.restarts = 0
+        self.busy_seconds = 0.0
+        # cleared when the session died and could not be replaced
+        self.usable = True
+
+    def throughput(self):
+        '''
+        Description:
+            Accounts handled per second of busy time for this worker
+        '''
+        if self.busy_seconds == 0:
+            return 0.0
+        return self.processed / self.busy_seconds
+
+
+class SessionPool:
+    '''
+    Description:
+        Creates [size] ThirdEyeNav sessions and fans jobs out across them with
+        a work queue. Results are handed back in the same order as the input.
+        A worker whose driver dies is replaced with a fresh, logged in session
+        and the job is retried.
+
+    Input:
+        [headless]    - passed to ThirdEyeNav ('headless' or 'head')
+        [username]    - Username for Third Eye account
+        [password]    - Password for Third Eye account
+        [size]        - number of browser sessions in the pool
+        [max_retries] - how many times a job is retried after a driver failure
+        [nav_factory] - Optional. Callable returning a new session. Defaults to
+                        ThirdEyeNav(headless, username, password)
+        [throttle]    - Optional. A Throttle shared by every default session, so
+                        the whole pool stays under one request rate
+        [lean]        - Optional. Use the lean chrome profile for the default
+                        sessions. Each worker gets its own profile directory
+    '''
+    def __init__(self, headless, username, password, size=POOL_SIZE,
+                 max_retries=MAX_RETRIES, nav_factory=None, throttle=None, lean=False):
+        if size < 1:
+            raise ValueError('Pool size must be at least 1')
+        self.headless = headless
+        self.username = username
+        self.password = password
+        self.size = size
+        self.max_retries = max_retries
+        self.nav_factory = nav_factory
+        self.throttle = throttle
+        self.lean = lean
+        self.workers = []
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _new_nav(self, slot):
+        if self.nav_factory is not None:
+            nav = self.nav_factory()
+        else:
+            # chrome locks its profile, so workers can't share one
+            nav = ThirdEyeNav(self.headless, self.username, self.password, throttle=self.throttle,
+                              lean=self.lean, profile_dir=lean_profile_dir(slot))
+        for attempt in range(LOGIN_RETRIES + 1):
+            if nav.login():
+                return nav
+        # a session that can't log in would only fail every job it is given
+        try:
+            nav.close_driver()
+        except Exception:
+            pass
+        raise RuntimeError('Could not log in to Third Eye')
+
+    def start(self):
+        '''
+        Description:
+            Opens and logs in every session. Browsers are started in parallel
+            because chrome start up + login is the slow part.
+        '''
+        if self.workers:
+            return
+        navs = [None] * self.size
+        errors = []
+
+        def _open(i):
+            try:
+                navs[i] = self._new_nav(i)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=_open, args=(i,)) for i in range(self.size)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.workers = [PoolWorker(i, nav) for i, nav in enumerate(navs) if nav is not None]
+        if not self.workers:
+            raise errors[0] if errors else RuntimeError('Could not start any sessions')
+        if errors:
+            print(str(len(errors)) + " session(s) failed to start. Running with " + str(len(self.workers)))
+
+    def close(self):
+        '''
+        Description:
+            Releases every browser in the pool
+        '''
+        for worker in self.workers:
+            try:
+                worker.nav.close_driver()
+            except Exception:
+                pass
+        self.workers = []
+
+    def _recover(self, worker):
+        '''
+        Description:
+            Re-logs in a worker whose session was dropped, or replaces it
+            entirely when its driver is no longer responding.
+        Output:
+            True if the worker is usable again, otherwise false
+        '''
+        if worker.nav.is_alive():
+            worker.nav.is_logged_in = False
+            worker.nav.current_page = None
+            if worker.nav.login():
+                return True
+
+        try:
+            worker.nav.close_driver()
+        except Exception:
+            pass
+        try:
+            worker.nav = self._new_nav(worker.worker_id)
+        except Exception as e:
+            print("Could not replace worker " + str(worker.worker_id) + ": " + str(e))
+            return False
+        with self._lock:
+            worker.restarts += 1
+        return True
+
+    def _run_job(self, worker, func, item):
+        attempts = 0
+        while True:
+            try:
+                result = func(worker.nav, item)
+            except Exception as e:
+                # handed back as the job's result, like get_info's errors
+                result = e
+            failed = result is False or isinstance(result, Exception)
+            if not failed:
+                return result
+            # only a lost session is recovered. A failure from a healthy,
+            # logged in driver (e.g. the TimeoutException get_info returns
+            # for a missing field) is a real answer
+            lost = isinstance(result, SESSION_LOST) or not worker.nav.is_alive() or not worker.nav.is_logged_in
+            if not lost:
+                return result
+            if attempts >= self.max_retries:
+                return result
+            if not self._recover(worker):
+                # nothing left to run jobs on. The other workers take the rest
+                worker.usable = False
+                return result
+            attempts += 1
+
+    def _worker_loop(self, worker, func, jobs, results):
+        while worker.usable:
+            try:
+                index, item = jobs.get_nowait()
+            except queue.Empty:
+                return
+            start = time.perf_counter()
+            result = self._run_job(worker, func, item)
+            elapsed = time.perf_counter() - start
+            results[index] = result
+            with self._lock:
+                worker.processed += 1
+                worker.busy_seconds += elapsed
+                if result is False or isinstance(result, Exception):
+                    worker.failures += 1
+
+    def map(self, func, items):
+        '''
+        Description:
+            Runs func(nav, item) for every item across the pool
+        Input:
+            [func]  - callable taking a ThirdEyeNav and one item
+            [items] - iterable of items (account numbers, memo jobs, ...)
+        Output:
+            A list of results in the same order as items
+        '''
+        self.start()
+        items = list(items)
+        jobs = queue.Queue()
+        for index, item in enumerate(items):
+            jobs.put((index, item))
+        results = [None] * len(items)
+
+        threads = [threading.Thread(target=self._worker_loop, args=(w, func, jobs, results))
+                   for w in self.workers]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        # workers whose session could not be replaced are dropped. If none are
+        # left, the jobs they didn't get to fail and the next map() starts over
+        self.workers = [w for w in self.workers if w.usable]
+        while True:
+            try:
+                index, item = jobs.get_nowait()
+            except queue.Empty:
+                break
+            results[index] = RuntimeError('No working Third Eye sessions left')
+        return results
+
+    def get_info(self, contracts, desired_info, single_pass=False):
+        '''
+        Description:
+            Parallel version of ThirdEyeNav.get_info
+        Output:
+            A list of dictionaries in the same order as contracts
+        '''
+        return self.map(lambda nav, contract: nav.get_info(contract, desired_info, single_pass=single_pass), contracts)
+
+    def memo_account_collection(self, jobs):
+        '''
+        Description:
+            Parallel version of ThirdEyeNav.memo_account_collection
+        Input:
+            [jobs] - iterable of (account_number, memo_subject, date) tuples
+        Output:
+            A list of bools in the same order as jobs
+        '''
+        return self.map(lambda nav, job: nav.memo_account_collection(*job), jobs)
+
+    def throughput(self):
+        '''
+        Description:
+            Per worker counters used to size the pool
+        Output:
+            A list of dictionaries, one per worker
+        '''
+        stats = []
+        with self._lock:
+            for worker in self.workers:
+                stats.append({
+                    'worker': worker.worker_id,
+                    'processed': worker.processed,
+                    'failures': worker.failures,
+                    'restarts': worker.restarts,
+                    'accounts_per_sec': worker.throughput(),
+                })
+        return stats
@@ -0,0 +1,143 @@
+"""
+session_store.py
+
+Encrypted on-disk store for the cookies of an authenticated Third Eye
+session. ThirdEyeNav saves its cookies here after a successful login and puts
+them back into new drivers, so short lived jobs and pool workers can skip the
+login form while the server still accepts the session.
+
+The store is encrypted with Fernet (AES + HMAC). The key comes from the
+THIRD_EYE_SESSION_KEY environment variable or, failing that, a key file
+readable only by the current user.
+
+Dependencies:
+- cryptography
+"""
+
+from cryptography.fernet import Fernet, InvalidToken
+import json
+import os
+import tempfile
+import time
+
+# default locations
+STORE_DIR = os.path.join(os.path.expanduser('~'), '.third_eye')
+SESSION_PATH = os.path.join(STORE_DIR, 'session.bin')
+KEY_PATH = os.path.join(STORE_DIR, 'session.key')
+
+# environment variable holding a Fernet key (overrides KEY_PATH)
+SESSION_KEY_ENV = 'THIRD_EYE_SESSION_KEY'
+
+# saved sessions older than this are not even tried
+SESSION_MAX_AGE = 8 * 60 * 60
+
+
+class SessionStore:
+    '''
+    Description:
+        Saves and loads the cookies of one logged in user.
+
+    Input:
+        [path]    - Optional. Encrypted session file
+        [key]     - Optional. Fernet key. Defaults to THIRD_EYE_SESSION_KEY or
+                    the key file, which is created on first use
+        [max_age] - Optional. Seconds a saved session is trusted for
+    '''
+    def __init__(self, path=SESSION_PATH, key=None, max_age=SESSION_MAX_AGE):
+        self.path = path
+        self.max_age = max_age
+        self._fernet = Fernet(key or load_key())
+
+    def save(self, username, cookies):
+        '''
+        Description:
+            Encrypts and writes the cookies of [username]'s session
+        Input:
+            [username] - user the session belongs to
+            [cookies]  - list of cookie dictionaries from driver.get_cookies()
+        '''
+        data = json.dumps({'username': username, 'saved': time.time(), 'cookies': cookies})
+        token = self._fernet.encrypt(data.encode('utf-8'))
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        # write to a private temporary file first so a crash can't leave half
+        # a session and two processes saving at once can't mix their writes
+        fd, temp = tempfile.mkstemp(dir=directory, prefix='.session.')
+        try:
+            with open(fd, 'wb') as f:
+                f.write(token)
+            os.replace(temp, self.path)
+        except BaseException:
+            _remove(temp)
+            raise
+
+    def load(self, username):
+        '''
+        Description:
+            Reads back the cookies saved for [username]
+        Output:
+            The list of cookies, or None if there is no usable session
+        '''
+        try:
+            with open(self.path, 'rb') as f:
+                token = f.read()
+            data = json.loads(self._fernet.decrypt(token))
+        except (OSError, InvalidToken, ValueError):
+            return None
+
+        if data.get('username') != username:
+            return None
+        if time.time() - data.get('saved', 0) > self.max_age:
+            return None
+        return data.get('cookies') or None
+
+    def clear(self):
+        '''
+        Description:
+            Forgets the saved session, e.g. once the server has expired it
+        '''
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def load_key(path=KEY_PATH):
+    '''
+    Description:
+        Returns the Fernet key from THIRD_EYE_SESSION_KEY or from the key file,
+        generating the file (mode 600) the first time
+    '''
+    key = os.environ.get(SESSION_KEY_ENV)
+    if key:
+        return key.encode('ascii')
+
+    try:
+        with open(path, 'rb') as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        pass
+
+    # the key is written out in full before it appears under [path], and
+    # link() fails if another process got there first. Then that key is used
+    key = Fernet.generate_key()
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, temp = tempfile.mkstemp(dir=directory, prefix='.session.key.')
+    try:
+        with open(fd, 'wb') as f:
+            f.write(key)
+        os.link(temp, path)
+    except FileExistsError:
+        with open(path, 'rb') as f:
+            return f.read().strip()
+    finally:
+        _remove(temp)
+    return key
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
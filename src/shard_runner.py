@@ -0,0 +1,400 @@
+"""
+shard_runner.py
+
+Batch entry point that spreads a contract list over several worker processes.
+Threads in one process (SessionPool) all share one GIL and one chromedriver
+client, so past a handful of browsers the python side becomes the
+bottleneck. Here every process owns its own ThirdEyeNav (or ThirdEyeHttpNav).
+
+- contracts are read from a CSV, JSON lines or plain text file
+- get_info results are streamed to one output file (JSON lines or CSV) in
+  the same order as the input, whichever process finished them
+- accounts that fail go on a retry queue and are run again, on a fresh
+  session if the driver died, up to --retries times. Accounts that still fail
+  are written to the output with their error and, optionally, to a file that
+  can be used as the input of the next run
+- the summary at the end shows accounts/sec for every process
+
+Usage:
+    THIRD_EYE_USERNAME=... THIRD_EYE_PASSWORD=... \\
+        python -m src.shard_runner contracts.csv results.jsonl [--processes 8]
+            [--fields insured,due] [--backend selenium|http] [--retries 2]
+            [--failed failed.txt] [--single-pass] [--lean] [--base-url URL]
+            [--rate 5]
+"""
+
+from src.definitions import INFO_FIELDS, info_keys
+import argparse
+import atexit
+import csv
+import json
+import multiprocessing
+import os
+import queue
+import signal
+import tempfile
+import time
+
+# default number of worker processes
+PROCESSES = 4
+
+# times a failed account is put back on the queue
+RETRIES = 2
+
+# jobs handed out per process at a time. Bounds memory and the reorder buffer
+IN_FLIGHT_PER_PROCESS = 4
+
+# column names recognised as the contract number in a CSV input
+CONTRACT_COLUMNS = ('contract', 'contract no', 'contract_no', 'contractno', 'account', 'account number')
+
+
+def read_contracts(path):
+    '''
+    Description:
+        Yields the contract numbers in [path], in order. The format is picked
+        from the extension:
+            .jsonl / .json - one object per line with a 'contract' key (or a bare string)
+            .csv           - the column named like CONTRACT_COLUMNS, else the first column
+            anything else  - one contract per line
+        Blank entries are skipped.
+    '''
+    extension = os.path.splitext(path)[1].lower()
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        if extension in ('.jsonl', '.json'):
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                record = json.loads(line)
+                contract = record.get('contract') if isinstance(record, dict) else record
+                if contract:
+                    yield str(contract).strip()
+
+        elif extension == '.csv':
+            reader = csv.reader(f)
+            header = next(reader, None)
+            if header is None:
+                return
+            names = [name.strip().lower() for name in header]
+            column = next((names.index(name) for name in CONTRACT_COLUMNS if name in names), None)
+            if column is None:
+                # no header, the first row is a contract too
+                column = 0
+                if header and header[0].strip():
+                    yield header[0].strip()
+            for row in reader:
+                if len(row) > column and row[column].strip():
+                    yield row[column].strip()
+
+        else:
+            for line in f:
+                if line.strip():
+                    yield line.strip()
+
+
+class ResultWriter:
+    '''
+    Description:
+        Writes results in input order. Results that arrive early wait in a
+        buffer until every result before them has been written.
+
+    Input:
+        [path]   - output file. '.csv' writes a CSV with one column per field,
+                   '.parquet' / '.arrow' typed columns (see account_export,
+                   failed accounts are left out), anything else JSON lines
+        [fields] - field names, used for the CSV header
+    '''
+    def __init__(self, path, fields):
+        self.csv = path.lower().endswith('.csv')
+        self.columnar = path.lower().endswith(('.parquet', '.arrow', '.feather'))
+        self.fields = list(fields)
+        self.next_index = 0
+        self.pending = {}
+        if self.columnar:
+            from src.account_export import AccountBatchWriter
+            self._file = AccountBatchWriter(path)
+            return
+        self._file = open(path, 'w', newline='', encoding='utf-8')
+        if self.csv:
+            self._writer = csv.writer(self._file)
+            self._writer.writerow(['contract'] + list(fields) + ['error'])
+
+    def add(self, index, record):
+        self.pending[index] = record
+        while self.next_index in self.pending:
+            self._write(self.pending.pop(self.next_index))
+            self.next_index += 1
+
+    def _write(self, record):
+        if self.columnar:
+            if record.get('info') is not None:
+                self._file.write_info(record['contract'], record['info'])
+        elif self.csv:
+            info = record.get('info') or {}
+            self._writer.writerow([record['contract']] + [info.get(key) for key in self.fields] +
+                                  [record.get('error') or ''])
+        else:
+            self._file.write(json.dumps(record) + '\n')
+
+    def close(self):
+        self._file.close()
+
+
+# per process state, set up by _init_worker
+_nav = None
+_nav_args = None
+_slot = 0
+
+
+def _new_nav(nav_args):
+    if nav_args['backend'] == 'http':
+        from src.http_nav import ThirdEyeHttpNav
+        nav = ThirdEyeHttpNav(nav_args['username'], nav_args['password'], base_url=nav_args['base_url'])
+    else:
+        from src.third_eye_nav import ThirdEyeNav, lean_profile_dir
+        # chrome locks its profile, so every process needs its own. Keyed on
+        # the worker slot so the next run reuses the same (warm) profiles
+        nav = ThirdEyeNav(nav_args['headless'], nav_args['username'], nav_args['password'],
+                          lean=nav_args['lean'], profile_dir=lean_profile_dir(_slot), base_url=nav_args['base_url'],
+                          throttle=_throttle(nav_args))
+    if not nav.login():
+        nav.close_driver()
+        raise RuntimeError('login failed')
+    return nav
+
+
+def _throttle(nav_args):
+    # every process shares the one token bucket through the rate file. The
+    # circuit breaker only sees this process's requests
+    if not nav_args.get('rate'):
+        return None
+    from src.throttle import Throttle, RateLimiter, CircuitBreaker
+    return Throttle(RateLimiter(nav_args['rate'], path=nav_args['rate_file']), CircuitBreaker())
+
+
+def _init_worker(nav_args, slots):
+    # slots counts the workers started so far. A worker that replaces a
+    # crashed one gets a new slot, its predecessor's chrome may still be up
+    global _nav_args, _slot
+    _nav_args = nav_args
+    with slots.get_lock():
+        _slot = slots.value
+        slots.value += 1
+    # a chrome left running keeps the lock on this slot's profile, so the
+    # session is closed whether the pool is closed or terminated
+    atexit.register(_close_nav)
+    signal.signal(signal.SIGTERM, _terminate)
+
+
+def _close_nav():
+    global _nav
+    if _nav is None:
+        return
+    try:
+        _nav.close_driver()
+    except Exception:
+        pass
+    _nav = None
+
+
+def _terminate(signum, frame):
+    _close_nav()
+    os._exit(1)
+
+
+def _scrape(index, contract, attempt, wanted, single_pass):
+    # runs in a worker process. Never raises: errors are sent back as strings
+    global _nav
+    start = time.perf_counter()
+    error = None
+    info = None
+    try:
+        if _nav is None or not _nav.is_alive():
+            if _nav is not None:
+                _nav.close_driver()
+            _nav = _new_nav(_nav_args)
+        if not _nav.is_logged_in and not _nav.login():
+            error = 'login failed'
+        else:
+            result = _nav.get_info(contract, wanted, single_pass=single_pass)
+            if isinstance(result, Exception):
+                error = type(result).__name__ + ': ' + str(result)
+            elif not isinstance(result, dict):
+                error = 'get_info returned ' + str(result)
+            elif result and all(value is None for value in result.values()):
+                error = 'contract not found'
+            else:
+                info = result
+    except Exception as e:
+        error = type(e).__name__ + ': ' + str(e)
+        # start over with a fresh session on the next job
+        if _nav is not None and not _nav.is_alive():
+            _nav = None
+    return {'index': index, 'contract': contract, 'attempt': attempt, 'info': info, 'error': error,
+            'pid': os.getpid(), 'seconds': time.perf_counter() - start}
+
+
+def run_sharded(contracts, output_path, fields=None, processes=PROCESSES, retries=RETRIES,
+                failed_path=None, single_pass=False, backend='selenium', headless='headless',
+                username='', password='', lean=False, base_url=None, rate=None, rate_file=None):
+    '''
+    Description:
+        Scrapes every contract with get_info across [processes] worker
+        processes and writes the results to [output_path] in input order.
+    Input:
+        [contracts]   - iterable of contract numbers (see read_contracts)
+        [output_path] - results file, JSON lines or .csv
+        [fields]      - Optional. Field names to scrape. All by default
+        [processes]   - Optional. Worker processes, one session each
+        [retries]     - Optional. Times a failed account is retried
+        [failed_path] - Optional. File listing the accounts that still failed
+        [single_pass] - Optional. Passed to get_info
+        [backend]     - Optional. 'selenium' (ThirdEyeNav) or 'http' (ThirdEyeHttpNav)
+        [headless], [username], [password], [lean], [base_url] - session options
+        [rate]        - Optional. Page loads + searches per second across all
+                        processes (selenium backend). No limit by default
+        [rate_file]   - Optional. State file of the shared rate limiter
+    Output:
+        A summary dictionary: totals, elapsed time, accounts/sec overall and
+        a per process list of processed/failures/busy seconds/accounts per sec
+    '''
+    if processes < 1:
+        raise ValueError('Need at least one process')
+    field_names = info_keys(fields) if fields is not None else [key for key, _, _ in INFO_FIELDS]
+    nav_args = {'backend': backend, 'headless': headless, 'username': username, 'password': password,
+                'lean': lean, 'base_url': base_url, 'rate': rate,
+                'rate_file': rate_file or os.path.join(tempfile.gettempdir(), 'third_eye_%d.rate' % os.getpid())}
+
+    # spawn, not fork: chromedriver and selenium's connection pools don't survive a fork
+    context = multiprocessing.get_context('spawn')
+    done = queue.Queue()
+    writer = ResultWriter(output_path, field_names)
+    failed_file = open(failed_path, 'w', encoding='utf-8') if failed_path else None
+    per_process = {}
+    totals = {'accounts': 0, 'ok': 0, 'failed': 0, 'retried': 0}
+    window = processes * IN_FLIGHT_PER_PROCESS
+    in_flight = 0
+    source = enumerate(contracts)
+    exhausted = False
+    start = time.monotonic()
+
+    pool = context.Pool(processes, initializer=_init_worker, initargs=(nav_args, context.Value('i', 0)))
+    finished = False
+    try:
+        def submit(index, contract, attempt):
+            pool.apply_async(_scrape, (index, contract, attempt, field_names, single_pass),
+                             callback=done.put, error_callback=lambda e: done.put(e))
+
+        while True:
+            # keep every process busy without reading the whole input up front
+            while not exhausted and in_flight < window:
+                try:
+                    index, contract = next(source)
+                except StopIteration:
+                    exhausted = True
+                    break
+                submit(index, contract, 0)
+                in_flight += 1
+                totals['accounts'] += 1
+            if in_flight == 0:
+                break
+
+            result = done.get()
+            if isinstance(result, Exception):
+                # only happens if a worker process itself crashed
+                raise result
+
+            stats = per_process.setdefault(result['pid'], {'processed': 0, 'failures': 0, 'busy_seconds': 0.0})
+            stats['processed'] += 1
+            stats['busy_seconds'] += result['seconds']
+
+            if result['error'] is not None:
+                stats['failures'] += 1
+                if result['attempt'] < retries:
+                    totals['retried'] += 1
+                    submit(result['index'], result['contract'], result['attempt'] + 1)
+                    continue
+                totals['failed'] += 1
+                if failed_file is not None:
+                    failed_file.write(result['contract'] + '\n')
+            else:
+                totals['ok'] += 1
+
+            in_flight -= 1
+            writer.add(result['index'], {'contract': result['contract'], 'info': result['info'],
+                                         'error': result['error'], 'attempts': result['attempt'] + 1})
+        finished = True
+    finally:
+        # every job is done: let the workers exit and close their sessions.
+        # Otherwise stop them now (their SIGTERM handler closes the session)
+        if finished:
+            pool.close()
+        else:
+            pool.terminate()
+        pool.join()
+        writer.close()
+        if failed_file is not None:
+            failed_file.close()
+        if rate and rate_file is None:
+            try:
+                os.remove(nav_args['rate_file'])
+            except OSError:
+                pass
+
+    elapsed = time.monotonic() - start
+    processes_summary = []
+    for number, (pid, stats) in enumerate(sorted(per_process.items())):
+        busy = stats['busy_seconds']
+        processes_summary.append({
+            'process': number,
+            'pid': pid,
+            'processed': stats['processed'],
+            'failures': stats['failures'],
+            'busy_seconds': busy,
+            'accounts_per_sec': stats['processed'] / busy if busy else 0.0,
+        })
+    summary = dict(totals)
+    summary['elapsed'] = elapsed
+    summary['accounts_per_sec'] = totals['accounts'] / elapsed if elapsed else 0.0
+    summary['processes'] = processes_summary
+    return summary
+
+
+def print_summary(summary):
+    print('%d accounts, %d ok, %d failed, %d retries in %.1fs (%.2f accounts/sec)' % (
+        summary['accounts'], summary['ok'], summary['failed'], summary['retried'],
+        summary['elapsed'], summary['accounts_per_sec']))
+    for stats in summary['processes']:
+        print('  process %-3d pid %-7d %6d done %4d failed %8.1fs busy %7.2f accounts/sec' % (
+            stats['process'], stats['pid'], stats['processed'], stats['failures'],
+            stats['busy_seconds'], stats['accounts_per_sec']))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Scrape a contract list with get_info across worker processes')
+    parser.add_argument('input', help='contracts: .csv, .jsonl or one per line')
+    parser.add_argument('output', help='results: .jsonl, .csv, .parquet or .arrow')
+    parser.add_argument('--processes', type=int, default=PROCESSES)
+    parser.add_argument('--fields', help='comma separated field names (default: all)')
+    parser.add_argument('--retries', type=int, default=RETRIES)
+    parser.add_argument('--failed', help='write accounts that still failed here')
+    parser.add_argument('--backend', choices=('selenium', 'http'), default='selenium')
+    parser.add_argument('--single-pass', action='store_true', help='get_info(single_pass=True)')
+    parser.add_argument('--lean', action='store_true', help='lean chrome profile')
+    parser.add_argument('--head', action='store_true', help='show the browsers')
+    parser.add_argument('--base-url', help='another Third Eye server, e.g. the mock server')
+    parser.add_argument('--rate', type=float, help='page loads + searches per second, all processes together')
+    args = parser.parse_args()
+
+    fields = [name.strip() for name in args.fields.split(',')] if args.fields else None
+    summary = run_sharded(read_contracts(args.input), args.output, fields=fields, processes=args.processes,
+                          retries=args.retries, failed_path=args.failed, single_pass=args.single_pass,
+                          backend=args.backend, headless='head' if args.head else 'headless',
+                          username=os.environ.get('THIRD_EYE_USERNAME', ''),
+                          password=os.environ.get('THIRD_EYE_PASSWORD', ''),
+                          lean=args.lean, base_url=args.base_url, rate=args.rate)
+    print_summary(summary)
+
+
+if __name__ == '__main__':
+    main()
@@ -18,30 +18,119 @@ TODO
 
 from selenium import webdriver
 from selenium.webdriver.common.keys import Keys
-from selenium.common.exceptions import NoSuchElementException
 from selenium.common.exceptions import StaleElementReferenceException
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.support.ui import Select
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.common.by import By
 from selenium.common.exceptions import TimeoutException
+from selenium.common.exceptions import WebDriverException
+from urllib.parse import urlparse, parse_qs
+from collections import deque
+from src.definitions import page_urls
+from src.definitions import ACCOUNT_PANEL, ACCOUNT_FOUND, info_keys
+from src.adaptive_wait import AdaptiveWait
+from src.locators import LOCATORS, LocatorResolver
+from src.download_watcher import DOWNLOAD_TIMEOUT, snapshot, wait_for_download
+from src.download_watcher import report_filename, rename_download
+from src.instrumentation import DISABLED, TimedWait, timed
 import os
 import time
-import sys
 
 # time in seconds that the selenium driver will wait for a webpage to resolve
 # this may need to be adjusted for slow internet connection 
 error_wait_time = 10
 
-# URL's
-LOGIN_PAGE = "https://gaac.thirdeyesys.ca/insight/"
-SEARCH_PAGE = "https://gaac.thirdeyesys.ca/insight/ControllerServlet?action=425&guid=1734391617932"
-ACCOUNTING_REPORTS_PAGE = "https://gaac.thirdeyesys.ca/insight/ControllerServlet?action=293&guid=1733370000893"
-MANAGEMENT_REPORTS_PAGE = "https://gaac.thirdeyesys.ca/insight/ControllerServlet?action=295&guid=1734375935562"
+# javascript run by get_info(single_pass=True). Takes a list of xpaths relative
+# to the element passed second (the account panel) and returns the text of
+# each match (null when the element is missing)
+BATCH_TEXT_SCRIPT = """
+var out = [];
+for (var i = 0; i < arguments[0].length; i++) {
+    var node = document.evaluate(arguments[0][i], arguments[1], null,
+        XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+    out.push(node ? node.innerText : null);
+}
+return out;
+"""
+
+# javascript used to work out which page the driver is really on. Cheaper
+# than reloading a page just to be sure. Takes the account number to look for
+# (or null), the xpath of a found contract and the account panel xpath
+PAGE_STATE_SCRIPT = """
+var find = function(xpath) {
+    return document.evaluate(xpath, document, null,
+        XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+};
+var account = arguments[0];
+var panel = find(arguments[2]);
+return {
+    url: window.location.href,
+    login_form: document.getElementsByName('LoginId').length > 0,
+    search_box: document.getElementsByName('VISIBLE_ContractNo').length > 0,
+    account_page: find(arguments[1]) !== null,
+    has_account: !!(account && panel && panel.innerText.indexOf(account) !== -1),
+    report_list: document.getElementsByName('availableReportList').length > 0
+};
+"""
+
+# javascript used by get_info_pipelined to start a search without waiting
+# for the result. Marks the current document so the caller can tell when the
+# result page has replaced it. Returns false if there is no search box
+START_SEARCH_SCRIPT = """
+var box = document.getElementsByName('VISIBLE_ContractNo')[0];
+var submit = document.getElementsByName('quoteSearchContractByAll')[0];
+if (!box || !submit) {
+    return false;
+}
+box.value = arguments[0];
+document.documentElement.setAttribute('data-te-pending', '1');
+submit.click();
+return true;
+"""
+
+# true once the page started by START_SEARCH_SCRIPT has replaced the old one
+SEARCH_DONE_SCRIPT = """
+return document.readyState !== 'loading' &&
+    !document.documentElement.hasAttribute('data-te-pending');
+"""
+
+# tabs get_info_pipelined keeps loading at once, and how often it checks
+# whether a tab's search has come back
+PIPELINE_TABS = 3
+PIPELINE_POLL = 0.05
+
+# seconds to wait for the probe page when reusing a saved session
+SESSION_PROBE_WAIT = 5
+
+# lean chrome profile (see driver_factory). Requests matching these patterns
+# are dropped before they leave the browser
+LEAN_BLOCKED_URLS = [
+    '*.png', '*.jpg', '*.jpeg', '*.gif', '*.bmp', '*.ico', '*.svg',
+    '*.woff', '*.woff2', '*.ttf', '*.otf', '*.eot',
+    '*.css',
+]
+LEAN_PROFILE_DIR = os.path.join(os.path.expanduser('~'), '.third_eye', 'chrome_profile')
+
+# pages that are opened on top of an account page
+ACCOUNT_SUBPAGES = ('Memo Screen', 'Collection Page', 'Collection Memo Page')
 
 # download directory 
 DOWNLOAD_DIR = os.path.join(os.path.expanduser('~'), 'Downloads')
 
+class BrowserTab:
+    '''
+    Description:
+        What ThirdEyeNav remembers about a browser tab while another tab is
+        active. Element handles belong to one document, so every tab has its
+        own LocatorResolver
+    '''
+    def __init__(self, handle, resolver, current_page=None, current_account=None):
+        self.handle = handle
+        self.resolver = resolver
+        self.current_page = current_page
+        self.current_account = current_account
+
 class ThirdEyeNav:
     '''
     Description: 
@@ -55,15 +144,42 @@ class ThirdEyeNav:
             should be displayed to the screen
         [username] - Username for Third Eye account 
         [password] - Password for Third Eye account
+        [download_dir] - Optional. Directory chrome saves reports to
+        [lean] - Optional. Use the lean chrome profile (no images, fonts or
+            css, eager page loads). See driver_factory
+        [profile_dir] - Optional. Chrome profile reused by the lean profile.
+            Browsers open at the same time each need their own, see
+            lean_profile_dir
+        [session_store] - Optional. A SessionStore used to reuse the cookies
+            of an earlier login instead of filling in the login form
+        [instrument] - Optional. An Instrumentation object that receives the
+            timing of every step. Off when not given
+        [base_url] - Optional. Point at another Third Eye server (e.g. the
+            mock server in src/mock_server.py) instead of BASE_URL
+        [throttle] - Optional. A Throttle (src/throttle.py) shared with the
+            other workers. Rate limits page loads and searches, pauses while
+            the server is timing out and retries timeouts with backoff
     '''
-    def __init__(self, headless, username, password):
+    def __init__(self, headless, username, password, download_dir=DOWNLOAD_DIR, lean=False, profile_dir=LEAN_PROFILE_DIR,
+                 session_store=None, instrument=None, base_url=None, throttle=None):
         # set data members
+        self.page_urls = page_urls(base_url)
+        self.throttle = throttle
+        self.created = time.monotonic()
+        self.instrument = instrument if instrument is not None else DISABLED
+        self.session_store = session_store
+        self.download_dir = download_dir
+        self.lean = lean
+        self.profile_dir = profile_dir
         self.open_driver(headless)
-        self.download_dir = DOWNLOAD_DIR
         self.username = username
         self.password = password
         self.is_logged_in = False
         self.current_page=None 
+        self.current_account = None
+        # page loads done vs avoided, see navigate_to / search_account
+        self.stats = {'page_loads': 0, 'page_loads_skipped': 0, 'searches': 0, 'searches_skipped': 0,
+                      'sessions_restored': 0, 'startup_to_first_query': None}
     '''
     Description:
         Release the web browser driver and reset session information
@@ -73,18 +189,126 @@ class ThirdEyeNav:
         self.close_driver()
 
     def close_driver(self):
-        # Explicitly close the Selenium WebDriver
-        if self.driver:
-            self.driver.close()
+        # Explicitly close the Selenium WebDriver. quit() also stops the
+        # chromedriver process so replaced drivers don't pile up
+        if getattr(self, 'driver', None):
+            try:
+                self.driver.quit()
+            except WebDriverException:
+                pass # driver already dead
             self.driver = None
         # Reset other attributes
         self.is_logged_in = False
         self.current_page = None
+        self.current_account = None
+        self.tabs = []
+        self.active_tab = 0
     
     def open_driver(self,headless):
-        self.driver = driver_factory(headless)
+        self.driver = driver_factory(headless, self.download_dir, lean=self.lean, profile_dir=self.profile_dir)
         self.wait = WebDriverWait(self.driver, error_wait_time)
+        if self.instrument.enabled:
+            self.wait = TimedWait(self.wait, self.instrument)
+        # learned element timings are kept when the driver is replaced
+        if getattr(self, 'waiter', None) is None:
+            self.waiter = AdaptiveWait(self.driver, error_wait_time, self.instrument)
+        else:
+            self.waiter.attach(self.driver)
+        # element handles belong to one driver
+        self.resolver = LocatorResolver(self.waiter)
+        # extra tabs, see open_tabs
+        self.tabs = []
+        self.active_tab = 0
 
+    def open_tabs(self, count):
+        '''
+        Description:
+            Opens browser tabs until there are [count]. Tabs share the
+            browser's cookies, so they are all logged in once one is. The
+            driver stays on the tab it was on
+        Output:
+            The number of tabs
+        '''
+        if not self.tabs:
+            self.tabs = [BrowserTab(self.driver.current_window_handle, self.resolver,
+                                    self.current_page, self.current_account)]
+            self.active_tab = 0
+        active = self.active_tab
+        while len(self.tabs) < count:
+            self._save_tab()
+            self.driver.switch_to.new_window('tab')
+            if self.lean:
+                block_resources(self.driver)
+            self.tabs.append(BrowserTab(self.driver.current_window_handle, LocatorResolver(self.waiter)))
+            self.active_tab = len(self.tabs) - 1
+            self._restore_tab(self.tabs[-1])
+        self.switch_tab(active)
+        return len(self.tabs)
+
+    def switch_tab(self, index):
+        '''
+        Description:
+            Makes tab [index] the one every other method works on. The page,
+            account and cached elements of the tab being left are kept and
+            handed back when it is switched to again, so navigate_to (memo
+            screen via ALT+M, collection tab) and search_account keep working
+            per tab
+        '''
+        if index == self.active_tab or not self.tabs:
+            return
+        self._save_tab()
+        tab = self.tabs[index]
+        self.driver.switch_to.window(tab.handle)
+        self.active_tab = index
+        self._restore_tab(tab)
+
+    def close_tabs(self):
+        '''
+        Description:
+            Closes every tab but the first and switches back to it
+        '''
+        if not self.tabs:
+            return
+        self.switch_tab(0)
+        for tab in self.tabs[1:]:
+            try:
+                self.driver.switch_to.window(tab.handle)
+                self.driver.close()
+            except WebDriverException:
+                pass # tab already gone
+        self.driver.switch_to.window(self.tabs[0].handle)
+        self.tabs = []
+        self.active_tab = 0
+
+    def _save_tab(self):
+        if self.tabs:
+            tab = self.tabs[self.active_tab]
+            tab.resolver = self.resolver
+            tab.current_page = self.current_page
+            tab.current_account = self.current_account
+
+    def _restore_tab(self, tab):
+        self.resolver = tab.resolver
+        self.current_page = tab.current_page
+        self.current_account = tab.current_account
+
+    def is_alive(self):
+        '''
+        Description:
+            Checks whether the web driver is still responding. A crashed chrome
+            instance or a killed chromedriver will raise on any command.
+        Output:
+            True if the driver answers, otherwise false
+        '''
+        if not getattr(self, 'driver', None):
+            return False
+        try:
+            self.driver.current_url
+        except WebDriverException:
+            return False
+        return True
+
+    @timed('login')
     def login(self):
         '''
         Description: 
@@ -101,6 +325,11 @@ class ThirdEyeNav:
         if self.is_logged_in is True:
             return True
 
+        # a saved session is much cheaper than filling in the login form
+        if self.session_store is not None and self.restore_session():
+            self.is_logged_in = True
+            return True
+
         try:
             # travel to the login page
             self.navigate_to("Login Page")
@@ -130,9 +359,112 @@ class ThirdEyeNav:
             return False
         else:
             self.is_logged_in = True
+
+        if self.session_store is not None:
+            self.save_session()
         
         return True
+
+    def save_session(self):
+        '''
+        Description:
+            Saves the cookies of the logged in session to self.session_store
+        '''
+        try:
+            self.session_store.save(self.username, self.driver.get_cookies())
+        except Exception as e:
+            print("Could not save session: " + str(e))
+
+    def restore_session(self):
+        '''
+        Description:
+            Puts the saved session cookies into the driver and loads the search
+            page as a probe. The search box only shows for a logged in user, so
+            if the login form comes back instead the session has expired and
+            the saved copy is thrown away.
+        Output:
+            True if the saved session is still good, otherwise false
+        '''
+        cookies = self.session_store.load(self.username)
+        if not cookies:
+            return False
+
+        try:
+            try:
+                # CDP can set cookies for a domain without loading a page first
+                self.driver.execute_cdp_cmd('Network.setCookies', {'cookies': [_cdp_cookie(c) for c in cookies]})
+            except WebDriverException:
+                # add_cookie needs the browser to be on the domain already
+                self._load_page('Login Page')
+                for cookie in cookies:
+                    self.driver.add_cookie(cookie)
+
+            self._load_page('Search Page')
+            WebDriverWait(self.driver, SESSION_PROBE_WAIT).until(EC.any_of(
+                EC.presence_of_element_located((By.NAME,"VISIBLE_ContractNo")),
+                EC.presence_of_element_located((By.NAME,"LoginId"))))
+        except WebDriverException:
+            return False
+
+        state = self.detect_page()
+        if state and state['search_box'] and not state['login_form']:
+            self.current_page = 'Search Page'
+            self.stats['sessions_restored'] += 1
+            return True
+
+        self.session_store.clear()
+        return False
     
+    def detect_page(self, account_number=None):
+        '''
+        Description:
+            Checks a few cheap DOM markers to find out where the driver really
+            is, instead of trusting self.current_page.
+        Input:
+            [account_number] - Optional. Also check whether the account panel
+                on screen belongs to this account
+        Output:
+            A dictionary of markers (url, login_form, search_box, account_page,
+            has_account, report_list) or None if the page could not be read
+        '''
+        if account_number and account_number.upper().startswith('MWF'):
+            account_number = account_number[3:]
+        try:
+            return self.driver.execute_script(PAGE_STATE_SCRIPT, account_number or None, ACCOUNT_FOUND, ACCOUNT_PANEL)
+        except WebDriverException:
+            return None
+
+    def _already_on(self, dest):
+        # pages loaded with driver.get are recognised by their markers
+        state = self.detect_page()
+        if state is None:
+            return False
+        if dest == 'Login Page':
+            return state['login_form']
+        if dest == 'Search Page':
+            # any search box will do, including the one in the account page header
+            return state['search_box']
+        return state['report_list'] and _page_action(state['url']) == _page_action(self.page_urls[dest])
+
+    def _load_page(self, dest):
+        self._throttle_acquire()
+        failed = False
+        try:
+            with self.instrument.span('driver.get', dest=dest):
+                self.driver.get(self.page_urls[dest])
+        except WebDriverException:
+            # a timeout, or a load that died (connection reset, refused...).
+            # Both count against the breaker
+            failed = True
+            raise
+        finally:
+            # every acquire gets an outcome, or a half open breaker waits forever
+            self._throttle_record(failed)
+        self.stats['page_loads'] += 1
+        self.resolver.reset()
+        self.current_account = None
+
+    @timed('navigate_to', 'dest')
     def navigate_to(self, dest):
         '''
         Description: 
@@ -140,48 +472,74 @@ class ThirdEyeNav:
             self.driver is expected to ALREADY be set to a certain page
             'Collection Page' - Needs to be on an account page
             'Memo Screen' - Needs to be on an account page
+            Pages reached by URL are only reloaded if detect_page says the
+            driver is somewhere else.
         Input:  
             [dest] - The destination web page to be travelled to.
         Output: 
             Sets self.driver to the new page and returns true if successful. 
             Otherwise, false
-        TODO - check elems to make sure user is on correct page and that is loaded. 
         '''      
-        try: 
-            if dest == 'Login Page' and self.current_page != 'Login Page':
-                self.driver.get(LOGIN_PAGE)
+        attempt = 0
+        while True:
+            try: 
+                if dest in self.page_urls:
+                    if self._already_on(dest):
+                        self.stats['page_loads_skipped'] += 1
+                    else:
+                        self._load_page(dest)
             
-            elif dest == 'Search Page' and self.current_page != 'Search Page':
-                self.driver.get(SEARCH_PAGE)
+                elif dest == 'Memo Screen' and self.current_page != 'Memo Screen':
+                    self.resolver.find('body').send_keys(Keys.ALT, 'M')
+                    self.resolver.find('memo_functions').click()
+                
+                elif dest == 'Collection Page' and self.current_page != 'Collection Page':
+                    self.resolver.find('collection_tab').click()
+
+                elif dest == 'Collection Memo Page' and self.current_page != 'Collection Memo Page':
+                    self.resolver.find('collection_tab').click()
+                    self.resolver.find('reminder_call').click()
+                    
+            except TimeoutException:
+                if self._retry_after_timeout(attempt):
+                    attempt += 1
+                    continue
+                print("Failed to navigate to " + dest)
+                return False
+            except:
+                print("Unknown Error in navigate_to")
+                return False
+            break
         
-            elif dest == 'Memo Screen' and self.current_page != 'Memo Screen':
-                self.wait.until(EC.presence_of_element_located((By.XPATH,"//body"))).send_keys(Keys.ALT, 'M')
-                self.wait.until(EC.presence_of_element_located((By.ID,"memoFunctions"))).click()
+        self.current_page = dest
+        return True
 
-            elif dest == 'Accounting Reports Page' and self.current_page != 'Accounting Reports Page':
-                self.driver.get(ACCOUNTING_REPORTS_PAGE)
-            
-            elif dest == 'Management Reports Page' and self.current_page != 'Management Reports Page':
-                self.driver.get(MANAGEMENT_REPORTS_PAGE)
-            
-            elif dest == 'Collection Page' and self.current_page != 'Collection Page':
-                self.wait.until(EC.presence_of_element_located((By.ID,"top5"))).click()
+    def _throttle_acquire(self):
+        # wait for the rate limiter / circuit breaker before hitting the server
+        if self.throttle is not None:
+            with self.instrument.span('throttle'):
+                self.throttle.acquire()
 
-            elif dest == 'Collection Memo Page' and self.current_page != 'Collection Memo Page':
-                self.wait.until(EC.presence_of_element_located((By.ID,"top5"))).click()
-                self.wait.until(EC.presence_of_element_located((By.CSS_SELECTOR,"input[title='Reminder Call']"))).click()
-                
-                 
-        except TimeoutException:
-            print("Failed to navigate to " + dest)
+    def _throttle_record(self, timed_out):
+        if self.throttle is not None:
+            self.throttle.record(timed_out)
+
+    def _retry_after_timeout(self, attempt):
+        '''
+        Description:
+            Sleeps a jittered backoff if retries are left. The timeout itself
+            was already recorded where the request was made
+        Output:
+            True if the caller should try again
+        '''
+        if self.throttle is None:
             return False
-        except:
-            print("Unknown Error in navigate_to")
+        if attempt >= self.throttle.retries:
             return False
-        
-        self.current_page = dest
+        time.sleep(self.throttle.backoff(attempt))
         return True
            
+    @timed('memo_account', 'account')
     def memo_account(self, account_number, memo_subject, memo_body, insured_name = None):
         '''
         Description: 
@@ -195,12 +553,9 @@ class ThirdEyeNav:
             Returns true if all the account was memo'd succsesfully. Otherwise,
             return false.    
         '''
-        # move to search page, if not already there
-        if not self.navigate_to("Search Page"):
-            return false
-        
         # search for account and move to memo screen
-        self.search_account(account_number)
+        if not self.search_account(account_number):
+            return False
         self.navigate_to('Memo Screen')
         
         # write memo
@@ -232,16 +587,14 @@ class ThirdEyeNav:
             #print("Save succussful")
             return True
         
+    @timed('memo_account_collection', 'account')
     def memo_account_collection(self, account_number, memo_subject, date):
-        # move to search page, if not already there
         if not self.login():
             return False
 
-        if not self.navigate_to("Search Page"):
-            return False
-        
         # search for account and move to memo screen
-        self.search_account(account_number)
+        if not self.search_account(account_number):
+            return False
         self.navigate_to('Collection Memo Page')
 
         try:
@@ -263,104 +616,120 @@ class ThirdEyeNav:
         
         return True
 
-    def download_report(self, report, l_date=None, r_date=None):
+    @timed('download_report', 'report')
+    def download_report(self, report, l_date=None, r_date=None, timeout=DOWNLOAD_TIMEOUT):
         '''
         Description:
-            Downloads the specified report. The report should appear in the users
-            download file. The naming convention for the files is 
-            'ControllerServlet'. This module cannot guarantee the exact file name
-            as it appears in the users filesystem
+            Downloads the specified report into self.download_dir. Instead of
+            sleeping a fixed amount of time, the download directory is watched
+            and the function returns as soon as the new file is fully written.
+            The file is then renamed to '<report> <from> to <to>.<ext>' so the
+            name no longer depends on how many 'ControllerServlet (n)' files
+            are already there.
         Input:
             [report] - The name of the target file. So far this function supports
                 1. Check Register
-                2. Collection Calls
+                2. Collection Report
+                3. Late Payment
+            [l_date]  - from date, required for Check Register and Late Payment
+            [r_date]  - to date, required for Check Register and Late Payment
+            [timeout] - Optional. Seconds to wait for the download to finish
         Output:
-            Returns the expected filepath of the download. The operating system may 
-            suffix the name with (1), (2), etc. The calling function will need to 
-            decipher the correct file name.
+            A DownloadResult(path, size, elapsed) for the downloaded file or
+            None if the report could not be downloaded.
         '''
         try:
-            if report == 'Check Register':
-                if l_date or r_date:
-                    raise ValueError('Dates are required for Check Register report')
-
-                # travel to the accounts report page
-                self.navigate_to('Accounting Reports Page')
-
-                # locate the dropdown object
-                select_elem = self.wait.until(EC.presence_of_element_located((By.NAME,'availableReportList')))
-                dropdown = Select(select_elem)
-
-                # make selection
-                dropdown.select_by_visible_text('Check Register')
-
-                # locate the from date, to date and generate report elements
-                from_date = self.wait.until(EC.presence_of_element_located((By.ID,'FromDate')))
-                to_date = self.wait.until(EC.presence_of_element_located((By.ID,'ToDate')))
-                create_report = self.wait.until(EC.presence_of_element_located((By.XPATH,'//*[@title="Create Report"]')))
-
-                # send data
-                from_date.clear()
-                to_date.clear()
-                from_date.send_keys(l_date)
-                to_date.send_keys(r_date)
-                create_report.click()
+            # fill in the report form
+            with self.instrument.span('download.form', report=report):
+                if report == 'Check Register':
+                    if not l_date or not r_date:
+                        raise ValueError('Dates are required for Check Register report')
 
-            elif report == 'Collection Report':
-                # travel to the management report page
-                self.navigate_to('Management Reports Page')
-                
-                # locate and select the dropdown object
-                select_elem = self.wait.until(EC.presence_of_element_located((By.NAME,'availableReportList')))
-                dropdown = Select(select_elem)
-                dropdown.select_by_visible_text('Collection Report')
+                    # travel to the accounts report page
+                    self.navigate_to('Accounting Reports Page')
 
-                # download the report and wait
-                create_report = self.wait.until(EC.presence_of_element_located((By.XPATH,'//*[@title="Create Reports"]')))
-                create_report.click()
-                time.sleep(10)
-            
-            elif report == 'Late Payment':
-                if not l_date or not r_date:
-                    raise ValueError('Dates are required for Late Payment report')
-                
-                # travel to the management report page
-                self.navigate_to('Management Reports Page')
-                
-                # locate and select the dropdown object
-                select_elem = self.wait.until(EC.presence_of_element_located((By.NAME,'availableReportList')))
-                dropdown = Select(select_elem)
-                dropdown.select_by_visible_text('Late Payment Calls (Excel)')
-
-                # locate the date fields
-                from_date = self.wait.until(EC.presence_of_element_located((By.NAME,'FromDate')))
-                to_date = self.wait.until(EC.presence_of_element_located((By.NAME,'ToDate')))
-                from_date.clear()
-                to_date.clear()
-                from_date.send_keys(l_date)
-                to_date.send_keys(r_date)
-
-                # download the report and wait
-                create_report = self.wait.until(EC.presence_of_element_located((By.XPATH,'//*[@title="Create Reports"]')))
+                    # locate the dropdown object
+                    select_elem = self.wait.until(EC.presence_of_element_located((By.NAME,'availableReportList')))
+                    dropdown = Select(select_elem)
+
+                    # make selection
+                    dropdown.select_by_visible_text('Check Register')
+
+                    # locate the from date, to date and generate report elements
+                    from_date = self.wait.until(EC.presence_of_element_located((By.ID,'FromDate')))
+                    to_date = self.wait.until(EC.presence_of_element_located((By.ID,'ToDate')))
+                    create_report = self.wait.until(EC.presence_of_element_located((By.XPATH,'//*[@title="Create Report"]')))
+
+                    # send data
+                    from_date.clear()
+                    to_date.clear()
+                    from_date.send_keys(l_date)
+                    to_date.send_keys(r_date)
+
+                elif report == 'Collection Report':
+                    # travel to the management report page
+                    self.navigate_to('Management Reports Page')
+
+                    # locate and select the dropdown object
+                    select_elem = self.wait.until(EC.presence_of_element_located((By.NAME,'availableReportList')))
+                    dropdown = Select(select_elem)
+                    dropdown.select_by_visible_text('Collection Report')
+
+                    create_report = self.wait.until(EC.presence_of_element_located((By.XPATH,'//*[@title="Create Reports"]')))
+
+                elif report == 'Late Payment':
+                    if not l_date or not r_date:
+                        raise ValueError('Dates are required for Late Payment report')
+
+                    # travel to the management report page
+                    self.navigate_to('Management Reports Page')
+
+                    # locate and select the dropdown object
+                    select_elem = self.wait.until(EC.presence_of_element_located((By.NAME,'availableReportList')))
+                    dropdown = Select(select_elem)
+                    dropdown.select_by_visible_text('Late Payment Calls (Excel)')
+
+                    # locate the date fields
+                    from_date = self.wait.until(EC.presence_of_element_located((By.NAME,'FromDate')))
+                    to_date = self.wait.until(EC.presence_of_element_located((By.NAME,'ToDate')))
+                    from_date.clear()
+                    to_date.clear()
+                    from_date.send_keys(l_date)
+                    to_date.send_keys(r_date)
+
+                    create_report = self.wait.until(EC.presence_of_element_located((By.XPATH,'//*[@title="Create Reports"]')))
+                else:
+                    raise Exception("Invalid arguments in function download_report")
+
+            # download the report and wait for the new file to be written
+            before = snapshot(self.download_dir)
+            with self.instrument.span('download.click', report=report):
                 create_report.click()
-                time.sleep(10)
-            else:
-                raise Exception("Invalid arguments in function download_report")
-        except TimeoutException:
+            with self.instrument.span('download.wait_file', report=report):
+                result = wait_for_download(self.download_dir, before, timeout)
+            if result is None:
+                print("Timed out waiting for " + report + " to download")
+                return None
+
+            extension = os.path.splitext(result.path)[1]
+            with self.instrument.span('download.rename', report=report):
+                return rename_download(result, report_filename(report, l_date, r_date, extension))
+        except TimeoutException as e:
             print(e)
-            return ''
+            return None
         except Exception as e:
             print(e)
-            return ''
-
-        return self.download_dir
+            return None
     
+    @timed('search_account', 'account')
     def search_account(self,account_number):
         '''
         Description:
             This function is used to simulate searching for a contract. It is designed
             to be a helper function and used in conjunction with other methods to
-            either scrape or send data to a contract's data page
+            either scrape or send data to a contract's data page. If the driver
+            is already on the account the search is skipped, and a search box
+            already on screen is reused instead of loading the search page.
         In:
             [account_number] - The account number to search for
         Out:
@@ -369,119 +738,311 @@ class ThirdEyeNav:
         # check for empty string
         if not account_number:
             return False
-        
-        # move to the search page if necessary
-        if not self.navigate_to('Search Page'):
+
+        state = self.detect_page(account_number)
+        if state and state['has_account'] and self.current_account == account_number:
+            self.stats['searches_skipped'] += 1
+            # stay on the memo screen / collection tab if one is already open
+            if self.current_page not in ACCOUNT_SUBPAGES:
+                self.current_page = "Account " + account_number
+            return True
+
+        attempt = 0
+        while True:
+            found = self._search(account_number, state)
+            if found is not None:
+                break
+            # the server didn't answer in time
+            if not self._retry_after_timeout(attempt):
+                print("Could not find search bar or search failed")
+                return False
+            attempt += 1
+            state = self.detect_page(account_number)
+        if not found:
+            return False
+
+        self.current_account = account_number
+        if self.stats['startup_to_first_query'] is None:
+            self.stats['startup_to_first_query'] = time.monotonic() - self.created
+        return True
+
+    def _search(self, account_number, state):
+        '''
+        Description:
+            One attempt at the search for search_account
+        Output:
+            True if the contract was found, False if it wasn't or something
+            went wrong, None if the server timed out
+        '''
+        # move to the search page if there is no search bar on screen
+        try:
+            if not (state and state['search_box']):
+                self._load_page('Search Page')
+        except TimeoutException:
+            return None
+        except:
+            print("Unknown Error in search_account")
             return False
 
         # input contract number into search bar and search
+        sent = False
+        timed_out = False
         try:
-            contractSearch = self.wait.until(EC.presence_of_element_located((By.NAME,"VISIBLE_ContractNo")))
-            contractSearch.clear()
-            contractSearch.send_keys(account_number)
-            self.wait.until(EC.presence_of_element_located((By.NAME,"quoteSearchContractByAll"))).click()
+            contractSearch = self.resolver.find('search_box')
+            with self.instrument.span('search.send_keys'):
+                contractSearch.clear()
+                contractSearch.send_keys(account_number)
+            submit = self.resolver.find('search_submit')
+            # the search loads a new document. Wait for the current one to go
+            # away so the result isn't read off the page that was already up
+            previous = self.driver.find_element(By.TAG_NAME, 'html')
+            self._throttle_acquire()
+            sent = True
+            with self.instrument.span('search.submit'):
+                submit.click()
             self.current_page = "Account " + account_number
+            self.current_account = None
+            self.stats['searches'] += 1
+            self.wait.until(EC.staleness_of(previous))
+            self.resolver.reset()
 
             # if the following element is resolved then the contract was found
-            self.wait.until(EC.presence_of_element_located((By.XPATH, "/html/body/form[2]/div/table[2]/tbody/tr/td/table/tbody/tr[3]/td[2]/table/tbody/tr[2]/td[2]/span[1]/div[1]/table/tbody/tr[1]/td[1]")))
+            self.resolver.find('account_found')
         except TimeoutException:
-            print("Could not find search bar or search failed")
-            return False
+            # a page with a search box came back, the contract just isn't there
+            state = self.detect_page()
+            if state and state['search_box'] and not state['account_page']:
+                print("Contract " + account_number + " not found")
+                return False
+            timed_out = True
+            return None
         except:
             print("Unknown Error")
             return False
+        finally:
+            if sent:
+                self._throttle_record(timed_out)
         return True
 
-    def get_info(self,contract, desired_info):
+    @timed('get_info', 'contract')
+    def get_info(self,contract, desired_info, single_pass=False):
         '''
         Description:
             This method is designed to web scrape insured (client) info
         Input:
             [contract] - The contract to search for
-            [desired_info] - the desired information as a bool array [insured name, insured phone number, agent name, loan group, 
+            [desired_info] - the desired information, either as field names
+                (e.g. ['insured', 'due'], see LOCATORS) or as the original bool
+                array [insured name, insured phone number, agent name, loan group, 
                 next payment amount, default date, cancellation date, regular payment, late payment, next payment,
                 current amt due, agent phone, insured mailing address]
+            [single_pass] - Optional. Read all fields with one browser call
+                instead of one wait per field. Missing fields come back as None
         Output:
-            returns the desired info as a dictionary
+            returns the desired info as a dictionary. Fields in OPTIONAL_FIELDS
+            that are not on the account come back as None. A LookupError is
+            returned if the contract could not be found
         '''
+        keys = info_keys(desired_info)
+
         if not self.search_account(contract):
-            pass # TODO 
+            # whatever is still on screen belongs to another account
+            return LookupError('Could not find contract ' + str(contract))
+
+        if single_pass:
+            return self._get_info_single_pass(keys)
 
         map = {}
         try:
-            # insured
-            if desired_info[0] is True:
-                elem = self.wait.until(EC.presence_of_element_located((By.XPATH,"/html/body/form[2]/div/table[2]/tbody/tr/td/table/tbody/tr[3]/td[2]/table/tbody/tr[2]/td[2]/span[1]/div[1]/table/tbody/tr[2]/td[3]")))
-                map['insured'] = elem.text
-
-            # phone number
-            if desired_info[1] is True: 
-                elem = self.wait.until(EC.presence_of_element_located((By.XPATH,"/html/body/form[2]/div/table[2]/tbody/tr/td/table/tbody/tr[3]/td[2]/table/tbody/tr[2]/td[2]/span[1]/div[1]/table/tbody/tr[3]/td[3]/span")))
-                map['phone'] = (elem.text)[:13]
-            
-            # Agent
-            if desired_info[2] is True:
-                elem = self.wait.until(EC.presence_of_element_located((By.XPATH,"/html/body/form[2]/div/table[2]/tbody/tr/td/table/tbody/tr[3]/td[2]/table/tbody/tr[2]/td[2]/span[1]/div[3]/table/tbody/tr[1]/td[3]")))
-                map['agent'] = (elem.text)
-            
-            # loan group
-            if desired_info[3] is True:
-                elem = self.wait.until(EC.presence_of_element_located((By.XPATH,"/html/body/form[2]/div/table[2]/tbody/tr/td/table/tbody/tr[3]/td[2]/table/tbody/tr[2]/td[2]/span[1]/div[3]/table/tbody/tr[3]/td[3]")))
-                map['loangroup'] = (elem.text)
-
-            # next payment due date 
-            if desired_info[4] is True:
-                elem = self.wait.until(EC.presence_of_element_located((By.XPATH,"/html/body/form[2]/div/table[2]/tbody/tr/td/table/tbody/tr[3]/td[2]/table/tbody/tr[2]/td[2]/span[1]/div[7]/div[2]/table/tbody/tr[2]/td[2]")))
-                map['nextpaymentdate'] = (elem.text)
-
-            # NOI (default) date 
-            if desired_info[5] is True:
-                elem = self.wait.until(EC.presence_of_element_located((By.XPATH,"/html/body/form[2]/div/table[2]/tbody/tr/td/table/tbody/tr[3]/td[2]/table/tbody/tr[2]/td[2]/span[1]/div[7]/div[2]/table/tbody/tr[3]/td[2]")))
-                map['defaultdate'] = (elem.text)
-
-            # cancellation date 
-            if desired_info[6] is True:
-                elem = self.wait.until(EC.presence_of_element_located((By.XPATH,"/html/body/form[2]/div/table[2]/tbody/tr/td/table/tbody/tr[3]/td[2]/table/tbody/tr[2]/td[2]/span[1]/div[7]/div[2]/table/tbody/tr[4]/td[2]")))
-                map['canceldate'] = (elem.text)
-
-            # regular payment amount 
-            if desired_info[7] is True:
-                elem = self.wait.until(EC.presence_of_element_located((By.XPATH,"/html/body/form[2]/div/table[2]/tbody/tr/td/table/tbody/tr[3]/td[2]/table/tbody/tr[2]/td[2]/span[1]/div[7]/div[2]/table/tbody/tr[6]/td[2]/b/span[1]")))
-                map['payamt'] = (elem.text)
-
-            # late payment amount 
-            if desired_info[8] is True:
-                elem = self.wait.until(EC.presence_of_element_located((By.XPATH,"/html/body/form[2]/div/table[2]/tbody/tr/td/table/tbody/tr[3]/td[2]/table/tbody/tr[2]/td[2]/span[1]/div[7]/div[2]/table/tbody/tr[7]/td[2]")))
-                map['latepayamt'] = (elem.text)
-
-            # next payment due amount 
-            if desired_info[9] is True:
-                elem = self.wait.until(EC.presence_of_element_located((By.XPATH,"/html/body/form[2]/div/table[2]/tbody/tr/td/table/tbody/tr[3]/td[2]/table/tbody/tr[2]/td[2]/span[1]/div[7]/div[2]/table/tbody/tr[9]/td[2]")))
-                map['nextpaydate'] = (elem.text)
-
-            # current due amount 
-            if desired_info[10] is True:
-                elem = self.wait.until(EC.presence_of_element_located((By.XPATH,"/html/body/form[2]/div/table[2]/tbody/tr/td/table/tbody/tr[3]/td[2]/table/tbody/tr[2]/td[2]/span[1]/div[7]/div[2]/table/tbody/tr[10]/td[2]")))
-                map['due'] = (elem.text)
-
-            # agent phone 
-            if desired_info[11] is True:
-                elem = self.wait.until(EC.presence_of_element_located((By.XPATH,"/html/body/form[2]/div/table[2]/tbody/tr/td/table/tbody/tr[3]/td[2]/table/tbody/tr[2]/td[2]/span[1]/div[3]/table/tbody/tr[2]/td[3]")))
-                map['agentphone'] = (elem.text)[:14]
-
-            # insured address
-            if desired_info[12] is True:
-                self.wait.until(EC.presence_of_element_located((By.ID,"top1"))).click()
-                elem = self.wait.until(EC.presence_of_element_located((By.XPATH,"/html/body/form[2]/div/table[2]/tbody/tr/td/table/tbody/tr[3]/td[2]/table/tbody/tr[2]/td[2]/span[2]/table[1]/tbody/tr[3]/td[2]")))
-                map['address'] = (elem.text)
-
-        except IndexError:
-            pass
+            for key in keys:
+                with self.instrument.span('get_info.field', field=key):
+                    # the address lives on the 'Insured' tab
+                    if key == 'address':
+                        self.resolver.find('insured_tab').click()
+
+                    # looked up under the cached account panel. Optional fields
+                    # that are not on the page come back as None
+                    elem = self.resolver.find(key)
+                    map[key] = (elem.text)[:LOCATORS[key].maxlen] if elem is not None else None
+
         except Exception as e:
             return e
 
         return map
 
+    def _get_info_single_pass(self, keys):
+        '''
+        Description:
+            Waits once for the account summary panel then reads every requested
+            field with a single execute_script call, relative to the cached
+            panel. Fields that are not on the page come back as None instead
+            of costing a full timeout.
+        Input:
+            [keys] - field names, see info_keys
+        Output:
+            returns the desired info as a dictionary
+        '''
+        if not keys:
+            return {}
+
+        try:
+            # the address lives on the 'Insured' tab
+            if 'address' in keys:
+                self.resolver.find('insured_tab').click()
+
+            parent, xpaths = self.resolver.relative_paths(keys)
+            with self.instrument.span('get_info.script', fields=len(keys)):
+                try:
+                    texts = self.driver.execute_script(BATCH_TEXT_SCRIPT, xpaths, self.resolver.container(parent))
+                except StaleElementReferenceException:
+                    self.resolver.reset()
+                    texts = self.driver.execute_script(BATCH_TEXT_SCRIPT, xpaths, self.resolver.container(parent))
+        except Exception as e:
+            return e
+
+        map = {}
+        for key, text in zip(keys, texts):
+            map[key] = text.strip()[:LOCATORS[key].maxlen] if text is not None else None
+        return map
+
+    def get_info_pipelined(self, contracts, desired_info, tabs=PIPELINE_TABS):
+        '''
+        Description:
+            get_info over many contracts, overlapping page loads. Up to [tabs]
+            searches are loading at once, each in its own extra tab; while they
+            load the fields of the oldest one are read (single pass) and its
+            tab is given the next contract. Results come back in the same order
+            as contracts. Expects to be logged in.
+
+            The main tab (tab 0) is never used for searches. The driver is
+            switched back to it before every result is handed over, so other
+            methods called between results work on the main tab as usual
+            while the pipeline's tabs keep loading.
+        Input:
+            [contracts]    - iterable of contract numbers
+            [desired_info] - see get_info
+            [tabs]         - Optional. Pages kept loading at once, at least 1
+        Output:
+            A generator of (contract, info) tuples. info is a LookupError for
+            a contract that could not be found, like get_info
+        '''
+        # checked here rather than in the generator so bad arguments fail at
+        # the call, not at the first result
+        if tabs < 1:
+            raise ValueError('get_info_pipelined needs at least one tab')
+        return self._get_info_pipelined(iter(contracts), info_keys(desired_info), tabs)
+
+    def _get_info_pipelined(self, contracts, keys, tabs):
+        self.open_tabs(tabs + 1)
+        # (tab, contract, search started) in the order the searches went out
+        in_flight = deque()
+        try:
+            for index in range(1, tabs + 1):
+                if not self._pipeline_start(index, contracts, in_flight):
+                    break
+
+            while in_flight:
+                index, contract, started = in_flight.popleft()
+                self.switch_tab(index)
+                with self.instrument.span('pipeline.wait', account=contract):
+                    found = self._finish_search(contract) if started else self.search_account(contract)
+                if found:
+                    info = self._get_info_single_pass(keys)
+                else:
+                    info = LookupError('Could not find contract ' + str(contract))
+                # refill the tab before handing the result over, so it loads
+                # while the caller works on this one
+                self._pipeline_start(index, contracts, in_flight)
+                self.switch_tab(0)
+                yield contract, info
+        finally:
+            # searches abandoned by a caller that stopped early still need an
+            # outcome, see _throttle_record
+            for _, _, started in in_flight:
+                if started:
+                    self._throttle_record(False)
+            try:
+                self.switch_tab(0)
+            except WebDriverException:
+                pass # driver died, nothing to go back to
+
+    def _pipeline_start(self, index, contracts, in_flight):
+        # sends the next contract's search out on tab [index]. False once
+        # contracts runs out
+        contract = next(contracts, None)
+        if contract is None:
+            return False
+        self.switch_tab(index)
+        try:
+            started = self._start_search(contract)
+        except WebDriverException:
+            started = False # searched the slow way by get_info_pipelined
+        in_flight.append((index, contract, started))
+        return True
+
+    def _start_search(self, account_number):
+        '''
+        Description:
+            Submits a search on the current tab without waiting for the
+            result, see _finish_search
+        Output:
+            True if the search went out
+        '''
+        if not account_number:
+            return False
+        state = self.detect_page()
+        if not (state and state['search_box']):
+            self._load_page('Search Page')
+        self._throttle_acquire()
+        started = False
+        try:
+            with self.instrument.span('search.submit'):
+                started = bool(self.driver.execute_script(START_SEARCH_SCRIPT, account_number))
+        finally:
+            # a search that went out is recorded by _finish_search
+            if not started:
+                self._throttle_record(False)
+        if not started:
+            return False
+        self.stats['searches'] += 1
+        self.current_page = "Account " + account_number
+        self.current_account = None
+        self.resolver.reset()
+        return True
+
+    def _finish_search(self, account_number):
+        '''
+        Description:
+            Waits for a search sent by _start_search on the current tab. A
+            timeout falls back to search_account, which retries
+        Output:
+            True if the contract was found, otherwise false
+        '''
+        timed_out = False
+        try:
+            WebDriverWait(self.driver, error_wait_time, poll_frequency=PIPELINE_POLL).until(
+                lambda driver: driver.execute_script(SEARCH_DONE_SCRIPT))
+        except TimeoutException:
+            timed_out = True
+        finally:
+            # the search sent by _start_search is over, one way or another
+            self._throttle_record(timed_out)
+        if timed_out:
+            return self.search_account(account_number)
+
+        state = self.detect_page(account_number)
+        if state and state['has_account']:
+            self.current_account = account_number
+            if self.stats['startup_to_first_query'] is None:
+                self.stats['startup_to_first_query'] = time.monotonic() - self.created
+            return True
+        if state and state['search_box'] and not state['account_page']:
+            print("Contract " + account_number + " not found")
+            return False
+        # some other page came back
+        return self.search_account(account_number)
+
+    @timed('search_for_mail')
     def search_for_mail(self):
         '''
         Description: 
@@ -492,8 +1053,8 @@ class ThirdEyeNav:
         
         try:
             #go to notices tab
-            self.wait.until(EC.presence_of_element_located((By.ID,"top6"))).click() 
-            notices_table = self.wait.until(EC.presence_of_element_located((By.XPATH,"/html/body/form[2]/div/table[2]/tbody/tr/td/table/tbody/tr[3]/td[2]/table/tbody/tr[2]/td[2]/span[7]/table[1]")))           
+            self.resolver.find('notices_tab').click()
+            notices_table = self.resolver.find('notices_table')
         except TimeoutException:
             print("Could not find search bar")
             return False
@@ -507,19 +1068,80 @@ class ThirdEyeNav:
         return (last_sent[:index_of_date] + ',' + last_sent[index_of_date+1:])
 
 
-def driver_factory(headless: str):
+def lean_profile_dir(slot=0):
+    '''
+    Description:
+        Lean chrome profile for one of several browsers running at once.
+        Chrome locks a profile while it is open, so every slot gets its own
+        directory. Slots are reused between runs to keep their http cache warm
+    Input:
+        [slot] - index of the browser, e.g. its pool worker id
+    '''
+    if not slot:
+        return LEAN_PROFILE_DIR
+    return LEAN_PROFILE_DIR + '-' + str(slot)
+
+
+def driver_factory(headless: str, download_dir: str = DOWNLOAD_DIR, lean: bool = False, profile_dir: str = LEAN_PROFILE_DIR):
     # configure chrome web browser for automation
     chrome_options = webdriver.ChromeOptions()
     prefs = {
         "plugins.always_open_pdf_externally": True,
-        "download.default_directory": DOWNLOAD_DIR,
+        "download.default_directory": download_dir,
         "download.prompt_for_download": False,  # Disable the prompt
         "download.directory_upgrade": True,  # Automatically overwrite existing files
         "safebrowsing.enabled": True,  # Enable safe browsing to avoid issues
     }
+    if lean:
+        # the scraper never looks at images, fonts or styling
+        prefs["profile.managed_default_content_settings.images"] = 2
+        prefs["profile.managed_default_content_settings.fonts"] = 2
+        prefs["profile.managed_default_content_settings.stylesheets"] = 2
     chrome_options.add_experimental_option("prefs", prefs)
     if headless == 'headless':
         chrome_options.add_argument('--headless')
 
+    if lean:
+        # hand control back once the DOM is parsed instead of waiting for the
+        # full 'load' event. Every lookup goes through WebDriverWait anyway
+        chrome_options.page_load_strategy = 'eager'
+        chrome_options.add_argument('--disable-gpu')
+        chrome_options.add_argument('--disable-extensions')
+        chrome_options.add_argument('--blink-settings=imagesEnabled=false')
+        # reuse the same profile between runs so the http cache stays warm.
+        # chrome locks a profile while it is open, so browsers running at the
+        # same time need their own profile_dir
+        chrome_options.add_argument('--user-data-dir=' + profile_dir)
+
+    driver = webdriver.Chrome(options=chrome_options)
+
+    if lean:
+        # block whatever the content settings above don't cover
+        block_resources(driver)
+
     # return web driver
-    return webdriver.Chrome(options=chrome_options)
\ No newline at end of file
+    return driver
+
+
+def block_resources(driver):
+    # CDP settings only apply to the tab the driver is on, so every new tab
+    # needs this again
+    try:
+        driver.execute_cdp_cmd('Network.enable', {})
+        driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': LEAN_BLOCKED_URLS})
+    except WebDriverException:
+        print("Could not block resources through CDP, continuing without")
+
+
+def _page_action(url):
+    # the 'action' query parameter identifies a ControllerServlet page
+    return parse_qs(urlparse(url).query).get('action', [None])[0]
+
+
+def _cdp_cookie(cookie):
+    # selenium's get_cookies() format -> CDP Network.CookieParam
+    param = {key: cookie[key] for key in ('name', 'value', 'domain', 'path', 'secure', 'httpOnly', 'sameSite')
+             if key in cookie}
+    if 'expiry' in cookie:
+        param['expires'] = cookie['expiry']
+    return param
@@ -0,0 +1,305 @@
+"""
+throttle.py
+
+Keeps a fleet of ThirdEyeNav workers at a request rate Third Eye can take.
+
+- RateLimiter is a token bucket shared by every thread that holds it. Given
+  a state file it is also shared between processes (shard_runner workers):
+  the bucket lives in the file and is updated under an OS file lock.
+- CircuitBreaker watches the share of recent requests that timed out. When
+  it crosses the threshold the breaker opens and every worker pauses for a
+  cool down instead of each burning error_wait_time on a server that isn't
+  answering. After the cool down a single trial request is let through.
+- backoff() gives the jittered exponential delay used between retries.
+
+Throttle bundles the three for ThirdEyeNav, which calls acquire() before
+every page load or search and record() with the outcome.
+"""
+
+from collections import deque
+import os
+import random
+import struct
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError: # windows
+    fcntl = None
+    import msvcrt
+
+# default requests per second across everything sharing the limiter
+RATE = 2.0
+
+# requests that can go out back to back after a quiet spell
+BURST = 4
+
+# circuit breaker: outcomes remembered, timeout share that opens the breaker,
+# outcomes needed before it can open, and seconds it stays open
+WINDOW = 20
+THRESHOLD = 0.5
+MIN_CALLS = 5
+COOLDOWN = 30.0
+
+# retries after a timeout, and the backoff base / cap in seconds
+RETRIES = 2
+BACKOFF_BASE = 1.0
+BACKOFF_CAP = 30.0
+
+# breaker states
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+def backoff(attempt, base=BACKOFF_BASE, cap=BACKOFF_CAP):
+    '''
+    Description:
+        "Full jitter" exponential backoff: a random delay between 0 and
+        base * 2^attempt seconds, capped at [cap]. The randomness keeps
+        workers that failed together from retrying together
+    '''
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class _FileLock:
+    # exclusive OS lock on an open file, held for the with block
+    def __init__(self, f):
+        self.f = f
+
+    def __enter__(self):
+        if fcntl is not None:
+            fcntl.flock(self.f.fileno(), fcntl.LOCK_EX)
+        else:
+            self.f.seek(0)
+            msvcrt.locking(self.f.fileno(), msvcrt.LK_LOCK, 1)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if fcntl is not None:
+            fcntl.flock(self.f.fileno(), fcntl.LOCK_UN)
+        else:
+            self.f.seek(0)
+            msvcrt.locking(self.f.fileno(), msvcrt.LK_UNLCK, 1)
+        return False
+
+
+class RateLimiter:
+    '''
+    Description:
+        Token bucket allowing [rate] requests per second with bursts of up to
+        [burst]. acquire() blocks until a token is free.
+
+    Input:
+        [rate]  - tokens added per second
+        [burst] - Optional. Size of the bucket
+        [path]  - Optional. State file shared by every process using the same
+                  path. Without it the limiter only covers this process
+    '''
+    _STATE = struct.Struct('<dd') # tokens, time of the last refill
+
+    def __init__(self, rate=RATE, burst=BURST, path=None):
+        if rate <= 0:
+            raise ValueError('rate must be positive')
+        self.rate = rate
+        self.burst = max(1.0, float(burst))
+        self.path = path
+        self._lock = threading.Lock()
+        self._tokens = self.burst
+        self._updated = time.time()
+        self._file = None
+        if path is not None:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._file = open(path, 'a+b')
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _take(self, tokens, updated):
+        # refill for the time passed, then take a token if there is one.
+        # Returns the new state and the seconds to wait (0 if taken)
+        now = time.time()
+        tokens = min(self.burst, tokens + max(0.0, now - updated) * self.rate)
+        if tokens >= 1:
+            return tokens - 1, now, 0.0
+        return tokens, now, (1 - tokens) / self.rate
+
+    def try_acquire(self):
+        '''
+        Description:
+            Takes a token if one is free
+        Output:
+            0 if a token was taken, otherwise the seconds until one will be
+        '''
+        with self._lock:
+            if self._file is None:
+                self._tokens, self._updated, wait = self._take(self._tokens, self._updated)
+                return wait
+
+            with _FileLock(self._file):
+                self._file.seek(0)
+                data = self._file.read(self._STATE.size)
+                if len(data) == self._STATE.size:
+                    tokens, updated = self._STATE.unpack(data)
+                else:
+                    tokens, updated = self.burst, time.time() # first user of the file
+                tokens, updated, wait = self._take(tokens, updated)
+                self._file.seek(0)
+                self._file.truncate()
+                self._file.write(self._STATE.pack(tokens, updated))
+                self._file.flush()
+                return wait
+
+    def acquire(self):
+        '''
+        Description:
+            Blocks until a token is taken
+        Output:
+            Seconds spent waiting
+        '''
+        waited = 0.0
+        while True:
+            wait = self.try_acquire()
+            if wait == 0:
+                return waited
+            time.sleep(wait)
+            waited += wait
+
+
+class CircuitBreaker:
+    '''
+    Description:
+        Opens when more than [threshold] of the last [window] requests timed
+        out, pausing everyone for [cooldown] seconds. Then lets one trial
+        request through: success closes the breaker, another timeout opens it
+        for a new cool down. Every request let through must be followed by a
+        record() call; a trial left unrecorded for [cooldown] seconds is
+        replaced by a new one.
+
+    Input:
+        [window], [threshold], [min_calls], [cooldown] - see the constants above
+    '''
+    def __init__(self, window=WINDOW, threshold=THRESHOLD, min_calls=MIN_CALLS, cooldown=COOLDOWN):
+        self.threshold = threshold
+        self.min_calls = min_calls
+        self.cooldown = cooldown
+        self.outcomes = deque(maxlen=window) # True for a timeout
+        self.state = CLOSED
+        self.opened_at = None
+        self.trips = 0
+        self._trial = False
+        self._trial_started = None
+        self._lock = threading.Lock()
+
+    def timeout_ratio(self):
+        with self._lock:
+            return sum(self.outcomes) / len(self.outcomes) if self.outcomes else 0.0
+
+    def wait_time(self):
+        '''
+        Description:
+            Seconds the caller should hold off before sending a request. 0 means go
+        '''
+        with self._lock:
+            if self.state == CLOSED:
+                return 0.0
+            remaining = self.opened_at + self.cooldown - time.monotonic()
+            if remaining > 0:
+                return remaining
+            # cool down over: one trial request at a time. A trial whose
+            # outcome never came back (the caller died or forgot to record)
+            # is given up on after a cool down so another one can go out
+            now = time.monotonic()
+            if self._trial and now - self._trial_started < self.cooldown:
+                return min(1.0, self.cooldown)
+            self.state = HALF_OPEN
+            self._trial = True
+            self._trial_started = now
+            return 0.0
+
+    def record(self, timed_out):
+        '''
+        Description:
+            Records the outcome of a request
+        Input:
+            [timed_out] - True if the server did not answer in time or the
+                          request failed outright
+        '''
+        with self._lock:
+            self.outcomes.append(bool(timed_out))
+            if self.state == HALF_OPEN:
+                self._trial = False
+                if timed_out:
+                    self._open()
+                else:
+                    self.state = CLOSED
+                    self.outcomes.clear()
+                return
+            if (self.state == CLOSED and len(self.outcomes) >= self.min_calls and
+                    sum(self.outcomes) / len(self.outcomes) > self.threshold):
+                self._open()
+
+    def _open(self):
+        self.state = OPEN
+        self.opened_at = time.monotonic()
+        self.trips += 1
+        print("Third Eye is timing out, pausing requests for " + str(self.cooldown) + " seconds")
+
+
+class Throttle:
+    '''
+    Description:
+        What ThirdEyeNav needs to pace itself: a shared rate limiter, a shared
+        circuit breaker and the retry policy. Give the same Throttle (or ones
+        built on the same limiter state file) to every worker.
+
+    Input:
+        [limiter] - Optional. A RateLimiter. None means no rate limit
+        [breaker] - Optional. A CircuitBreaker. None means no breaker
+        [retries] - Optional. Times a timed out page load / search is retried
+        [backoff_base], [backoff_cap] - Optional. See backoff()
+    '''
+    def __init__(self, limiter=None, breaker=None, retries=RETRIES,
+                 backoff_base=BACKOFF_BASE, backoff_cap=BACKOFF_CAP):
+        self.limiter = limiter
+        self.breaker = breaker
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self._lock = threading.Lock()
+        self.stats = {'requests': 0, 'timeouts': 0, 'retries': 0, 'throttled_seconds': 0.0}
+
+    def acquire(self):
+        '''
+        Description:
+            Blocks while the breaker is open, then until the rate limiter
+            hands out a token
+        '''
+        waited = 0.0
+        if self.breaker is not None:
+            while True:
+                wait = self.breaker.wait_time()
+                if wait == 0:
+                    break
+                time.sleep(wait)
+                waited += wait
+        if self.limiter is not None:
+            waited += self.limiter.acquire()
+        with self._lock:
+            self.stats['requests'] += 1
+            self.stats['throttled_seconds'] += waited
+
+    def record(self, timed_out):
+        if self.breaker is not None:
+            self.breaker.record(timed_out)
+        if timed_out:
+            with self._lock:
+                self.stats['timeouts'] += 1
+
+    def backoff(self, attempt):
+        with self._lock:
+            self.stats['retries'] += 1
+        return backoff(attempt, self.backoff_base, self.backoff_cap)
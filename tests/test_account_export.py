@@ -0,0 +1,84 @@
+"""
+test_account_export.py
+
+Tests for the typed account records in src/account_export.py. The columnar
+writer test needs pyarrow and is skipped without it.
+"""
+
+from datetime import date, datetime, timezone
+from decimal import Decimal
+from src.account_export import (ACCOUNT_SCHEMA, account_record, normalize_phone, parse_date,
+                                parse_decimal)
+import pytest
+
+
+def test_parse_decimal():
+    assert parse_decimal('$1,234.56') == Decimal('1234.56')
+    assert parse_decimal('(12.00)') == Decimal('-12.00')
+    assert parse_decimal(' 7.5 ') == Decimal('7.50')
+    assert parse_decimal('12') == Decimal('12.00')
+    assert parse_decimal('') is None
+    assert parse_decimal('n/a') is None
+    assert parse_decimal(None) is None
+
+
+def test_parse_date():
+    assert parse_date('03/15/2025') == date(2025, 3, 15)
+    assert parse_date('2025-03-15') == date(2025, 3, 15)
+    assert parse_date('') is None
+    assert parse_date('soon') is None
+    assert parse_date(None) is None
+
+
+def test_normalize_phone():
+    assert normalize_phone('(555)123-4567') == '(555) 123-4567'
+    assert normalize_phone('1-555-123-4567') == '(555) 123-4567'
+    # get_info cuts phone numbers off, extra digits are dropped
+    assert normalize_phone('555.123.45678') == '(555) 123-4567'
+    assert normalize_phone('555-123') is None
+    assert normalize_phone('') is None
+    assert normalize_phone(None) is None
+
+
+def test_account_record():
+    scraped_at = datetime(2025, 3, 15, tzinfo=timezone.utc)
+    record = account_record('MWF1', {'insured': ' Jane Doe ', 'due': '$10.00', 'canceldate': '04/01/2025',
+                                     'agentphone': '(555)123-4567', 'agent': ''}, scraped_at)
+    assert list(record) == ['contract', 'scraped_at'] + [name for name, _ in ACCOUNT_SCHEMA
+                                                         if name not in ('contract', 'scraped_at')]
+    assert record['contract'] == 'MWF1'
+    assert record['scraped_at'] == scraped_at
+    assert record['insured'] == 'Jane Doe'
+    assert record['due'] == Decimal('10.00')
+    assert record['canceldate'] == date(2025, 4, 1)
+    assert record['agentphone'] == '(555) 123-4567'
+    assert record['agent'] is None
+    assert record['payamt'] is None
+
+
+def test_failed_scrape_gives_empty_record():
+    record = account_record('MWF1', LookupError('MWF1'))
+    assert record['contract'] == 'MWF1'
+    assert all(record[name] is None for name, _ in ACCOUNT_SCHEMA if name not in ('contract', 'scraped_at'))
+
+
+@pytest.mark.parametrize('name', ['accounts.parquet', 'accounts.arrow'])
+def test_batch_writer_round_trip(tmp_path, name):
+    pa = pytest.importorskip('pyarrow')
+    from src.account_export import AccountBatchWriter
+
+    path = str(tmp_path / name)
+    with AccountBatchWriter(path, row_group_size=2) as writer:
+        for i in range(5):
+            writer.write_info('MWF' + str(i), {'due': str(i) + '.50', 'nextpaymentdate': '03/15/2025'})
+    assert writer.rows == 5
+
+    if name.endswith('.arrow'):
+        table = pa.ipc.open_file(path).read_all()
+    else:
+        import pyarrow.parquet as pq
+        table = pq.read_table(path)
+    assert table.num_rows == 5
+    assert table.column('contract').to_pylist() == ['MWF' + str(i) for i in range(5)]
+    assert table.column('due').to_pylist()[4] == Decimal('4.50')
+    assert table.column('nextpaymentdate').to_pylist()[0] == date(2025, 3, 15)
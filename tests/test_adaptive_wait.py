@@ -0,0 +1,82 @@
+"""
+test_adaptive_wait.py
+
+Tests for the learned timeouts of AdaptiveWait (src/adaptive_wait.py) with a
+fake driver.
+"""
+
+from selenium.common.exceptions import TimeoutException
+from src.adaptive_wait import (AdaptiveWait, MIN_SAMPLES, MIN_TIMEOUT, MIN_OPTIONAL_TIMEOUT,
+                               OPTIONAL_TIMEOUT, TIMEOUT_FACTOR)
+import pytest
+
+TIMEOUT = 10
+
+
+class FakeDriver:
+    # the presence script finds the element unless [missing] is set
+    def __init__(self):
+        self.missing = False
+        self.script_timeout = None
+
+    def set_script_timeout(self, seconds):
+        self.script_timeout = seconds
+
+    def execute_async_script(self, script, by, value, timeout):
+        return None if self.missing else 'element'
+
+
+def trained(seconds, count=MIN_SAMPLES, key='due'):
+    wait = AdaptiveWait(FakeDriver(), TIMEOUT)
+    for _ in range(count):
+        wait.record(key, seconds)
+    return wait
+
+
+def test_default_until_enough_samples():
+    wait = trained(0.1, count=MIN_SAMPLES - 1)
+    assert wait.timeout_for('due') == TIMEOUT
+    assert wait.timeout_for('due', optional=True) == OPTIONAL_TIMEOUT
+    assert wait.driver.script_timeout > TIMEOUT
+
+
+def test_learned_timeout():
+    wait = trained(1.0)
+    assert wait.timeout_for('due') == TIMEOUT_FACTOR * 1.0
+
+
+def test_floor():
+    wait = trained(0.01)
+    assert wait.timeout_for('due') == MIN_TIMEOUT
+    assert wait.timeout_for('due', optional=True) == MIN_OPTIONAL_TIMEOUT
+
+
+def test_cap():
+    wait = trained(TIMEOUT)
+    assert wait.timeout_for('due') == TIMEOUT
+
+
+def test_timeouts_grow_back_and_successes_shrink():
+    wait = trained(0.01)
+    wait.driver.missing = True
+    timeouts = []
+    for _ in range(4):
+        with pytest.raises(TimeoutException):
+            wait.until_present('due', 'id', 'due')
+        timeouts.append(wait.timeout_for('due'))
+    assert timeouts == [MIN_TIMEOUT * 2, MIN_TIMEOUT * 4, TIMEOUT, TIMEOUT]
+
+    wait.driver.missing = False
+    for _ in range(6):
+        assert wait.until_present('due', 'id', 'due') == 'element'
+    assert wait.timeout_for('due') == MIN_TIMEOUT
+    assert 'due' not in wait.backoff
+
+
+def test_optional_misses_only_grow_to_the_optional_default():
+    wait = trained(0.01, key='canceldate')
+    wait.driver.missing = True
+    for _ in range(10):
+        assert wait.until_present('canceldate', 'id', 'canceldate', optional=True) is None
+    assert wait.timeout_for('canceldate', optional=True) == OPTIONAL_TIMEOUT
+    assert wait.stats()['canceldate']['misses'] == 10
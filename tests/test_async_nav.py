@@ -0,0 +1,100 @@
+"""
+test_async_nav.py
+
+Tests for AsyncThirdEyeNav in src/async_nav.py, using fake sessions passed
+in through nav_factory.
+"""
+
+from src.async_nav import AsyncThirdEyeNav
+import asyncio
+import threading
+import time
+import pytest
+
+
+class FakeNav:
+    def __init__(self, created):
+        created.append(self)
+        self.closed = False
+
+    def get_info(self, contract, desired_info, single_pass=False):
+        time.sleep(0.01)
+        return {'contract': contract}
+
+    def close_driver(self):
+        self.closed = True
+
+
+def fake_factory(created, delay=0.02):
+    def factory():
+        # a slow start up gives concurrent open() calls a chance to overlap
+        time.sleep(delay)
+        return FakeNav(created)
+    return factory
+
+
+def test_concurrent_first_calls_open_once():
+    created = []
+    nav = AsyncThirdEyeNav('headless', 'user', 'password', concurrency=2,
+                           nav_factory=fake_factory(created))
+
+    async def run():
+        results = await asyncio.gather(*[nav.get_info(c, [True]) for c in ('1', '2', '3')])
+        await nav.close()
+        return results
+
+    results = asyncio.run(run())
+    assert [r['contract'] for r in results] == ['1', '2', '3']
+    assert len(created) == 2
+    assert all(n.closed for n in created)
+
+
+def test_gather_info_stays_bounded():
+    created = []
+    lock = threading.Lock()
+    state = {'now': 0, 'peak': 0}
+
+    class CountingNav(FakeNav):
+        def get_info(self, contract, desired_info, single_pass=False):
+            with lock:
+                state['now'] += 1
+                state['peak'] = max(state['peak'], state['now'])
+            time.sleep(0.01)
+            with lock:
+                state['now'] -= 1
+            if contract == 'bad':
+                raise ValueError(contract)
+            return {'contract': contract}
+
+    nav = AsyncThirdEyeNav('headless', 'user', 'password', concurrency=3,
+                           nav_factory=lambda: CountingNav(created))
+    contracts = [str(i) for i in range(10)] + ['bad']
+
+    async def run():
+        async with nav:
+            return [pair async for pair in nav.gather_info(contracts, [True])]
+
+    results = dict(asyncio.run(run()))
+    assert set(results) == set(contracts)
+    assert isinstance(results['bad'], ValueError)
+    assert results['4'] == {'contract': '4'}
+    assert state['peak'] <= 3
+    assert len(created) == 3
+
+
+def test_failed_open_closes_started_sessions():
+    created = []
+    calls = []
+
+    def factory():
+        calls.append(None)
+        if len(calls) == 2:
+            raise RuntimeError('chrome failed to start')
+        return FakeNav(created)
+
+    nav = AsyncThirdEyeNav('headless', 'user', 'password', concurrency=3, nav_factory=factory)
+    with pytest.raises(RuntimeError):
+        asyncio.run(nav.open())
+    assert len(created) == 2
+    assert all(n.closed for n in created)
+    assert nav.navs == []
@@ -0,0 +1,95 @@
+"""
+test_change_detector.py
+
+Tests for the fingerprint based change detection in src/change_detector.py.
+"""
+
+from src.change_detector import ChangeDetector, contract_key, row_fingerprint, MAGIC
+from src.report_reader import ReportRow
+
+
+def row(contract, due, days_late='1'):
+    return ReportRow(contract, {'Due': due, 'Days Late': days_late}, 0)
+
+
+def contracts(rows):
+    return [r.contract for r in rows]
+
+
+def test_first_run_everything_is_new(tmp_path):
+    detector = ChangeDetector(str(tmp_path / 'report.fp'))
+    assert contracts(detector.changed_rows([row('MWF1', '10'), row('MWF2', '5')])) == ['MWF1', 'MWF2']
+    assert detector.counts == {'new': 2, 'changed': 0, 'unchanged': 0, 'removed': 0}
+
+
+def test_only_accepted_contracts_are_remembered(tmp_path):
+    path = str(tmp_path / 'report.fp')
+    detector = ChangeDetector(path)
+    list(detector.changed_rows([row('MWF1', '10'), row('MWF2', '5')]))
+    detector.accept('MWF1')
+    detector.save()
+
+    # MWF2 wasn't accepted (its memo failed), so it comes up again
+    detector = ChangeDetector(path)
+    assert contracts(detector.changed_rows([row('MWF1', '10'), row('MWF2', '5')])) == ['MWF2']
+    assert detector.counts['unchanged'] == 1
+
+
+def test_changed_and_removed(tmp_path):
+    path = str(tmp_path / 'report.fp')
+    detector = ChangeDetector(path)
+    list(detector.changed_rows([row('MWF1', '10'), row('MWF2', '5')]))
+    detector.accept_all()
+    detector.save()
+
+    detector = ChangeDetector(path)
+    assert contracts(detector.changed_rows([row('MWF1', '12'), row('MWF3', '1')])) == ['MWF1', 'MWF3']
+    assert detector.counts == {'new': 1, 'changed': 1, 'unchanged': 0, 'removed': 1}
+
+
+def test_unaccepted_change_keeps_old_fingerprint(tmp_path):
+    path = str(tmp_path / 'report.fp')
+    detector = ChangeDetector(path)
+    list(detector.changed_rows([row('MWF1', '10')]))
+    detector.accept_all()
+    detector.save()
+
+    # changed but not handled: still changed next run
+    detector = ChangeDetector(path)
+    list(detector.changed_rows([row('MWF1', '12')]))
+    detector.save()
+    detector = ChangeDetector(path)
+    assert contracts(detector.changed_rows([row('MWF1', '12')])) == ['MWF1']
+
+
+def test_ignored_columns_and_prefix(tmp_path):
+    path = str(tmp_path / 'report.fp')
+    detector = ChangeDetector(path, ignore=['Days Late'])
+    list(detector.changed_rows([row('MWF1', '10', days_late='1')]))
+    detector.accept_all()
+    detector.save()
+
+    detector = ChangeDetector(path, ignore=['Days Late'])
+    assert contracts(detector.changed_rows([row('mwf1', '10', days_late='2')])) == []
+    assert contract_key('MWF1') == contract_key(' mwf1') == contract_key('1')
+
+
+def test_rows_of_one_contract_combine():
+    first, second = row('MWF1', '10'), row('MWF1', '5')
+    detector = ChangeDetector('unused.fp')
+    one = detector.fingerprints([first, second])
+    other = detector.fingerprints([second, first])
+    assert one == {contract_key('MWF1'): (one[contract_key('MWF1')][0], first)}
+    assert one[contract_key('MWF1')][0] == other[contract_key('MWF1')][0]
+    assert one[contract_key('MWF1')][0] != row_fingerprint(first)
+
+
+def test_unrecognised_file_is_ignored(tmp_path):
+    path = tmp_path / 'report.fp'
+    path.write_bytes(b'not a fingerprint file')
+    detector = ChangeDetector(str(path))
+    assert detector.previous == {}
+    list(detector.changed_rows([row('MWF1', '10')]))
+    detector.accept_all()
+    detector.save()
+    assert path.read_bytes().startswith(MAGIC)
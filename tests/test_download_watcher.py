@@ -0,0 +1,67 @@
+"""
+test_download_watcher.py
+
+Tests for wait_for_download and the naming of finished downloads in
+src/download_watcher.py.
+"""
+
+from datetime import date
+from src.download_watcher import DownloadResult, rename_download, report_filename, snapshot, wait_for_download
+import os
+import threading
+
+POLL = 0.01
+
+
+def test_empty_report_finishes(tmp_path):
+    before = snapshot(str(tmp_path))
+    (tmp_path / 'report.csv').write_bytes(b'')
+    result = wait_for_download(str(tmp_path), before, timeout=1, poll_interval=POLL)
+    assert result is not None
+    assert result.size == 0
+
+
+def test_empty_file_waits_for_partial(tmp_path):
+    before = snapshot(str(tmp_path))
+    final = tmp_path / 'report.csv'
+    partial = tmp_path / 'report.csv.crdownload'
+    final.write_bytes(b'')
+    partial.write_bytes(b'Contract No')
+
+    def finish():
+        partial.unlink()
+        final.write_bytes(b'Contract No\nMWF1\n')
+
+    timer = threading.Timer(0.1, finish)
+    timer.start()
+    result = wait_for_download(str(tmp_path), before, timeout=2, poll_interval=POLL)
+    timer.join()
+    assert result is not None
+    assert result.size == len(b'Contract No\nMWF1\n')
+
+
+def test_times_out(tmp_path):
+    before = snapshot(str(tmp_path))
+    (tmp_path / 'report.csv.crdownload').write_bytes(b'')
+    assert wait_for_download(str(tmp_path), before, timeout=0.05, poll_interval=POLL) is None
+
+
+def test_report_filenames():
+    assert report_filename('Late Payment', '01/01/2025', '01/31/2025', '.xls') == \
+        'Late Payment 01-01-2025 to 01-31-2025.xls'
+    assert report_filename('Collection Report', extension='.xls', day=date(2025, 3, 15)) == \
+        'Collection Report 03-15-2025.xls'
+
+
+def test_rename_keeps_older_download(tmp_path):
+    names = []
+    for content in (b'first', b'second', b'third'):
+        download = tmp_path / 'download.xls'
+        download.write_bytes(content)
+        result = rename_download(DownloadResult(str(download), len(content), 0.0), 'Collection Report.xls')
+        names.append(result.path)
+    assert [os.path.basename(path) for path in names] == [
+        'Collection Report.xls', 'Collection Report (2).xls', 'Collection Report (3).xls']
+    assert (tmp_path / 'Collection Report.xls').read_bytes() == b'first'
+    assert (tmp_path / 'Collection Report (3).xls').read_bytes() == b'third'
+    assert not (tmp_path / 'download.xls').exists()
@@ -0,0 +1,143 @@
+"""
+test_http_nav.py
+
+Tests for the browserless backend (src/http_nav.py), run against the local
+stand-in server in src/mock_server.py, so no chrome and no network access
+are needed.
+
+Usage:
+    python -m pytest tests
+"""
+
+from src.definitions import INFO_FIELDS
+from src.http_nav import ThirdEyeHttpNav
+from src.mock_server import MockThirdEyeServer
+import pytest
+
+USERNAME = 'tester'
+PASSWORD = 'secret'
+
+ALL_KEYS = [key for key, _, _ in INFO_FIELDS]
+
+
+@pytest.fixture(scope='module')
+def server():
+    with MockThirdEyeServer(accounts=12, username=USERNAME, password=PASSWORD) as server:
+        yield server
+
+
+@pytest.fixture
+def nav(server):
+    nav = ThirdEyeHttpNav(USERNAME, PASSWORD, base_url=server.base_url)
+    assert nav.login()
+    yield nav
+    nav.close_driver()
+
+
+def expected_info(server, contract):
+    # what the account page shows for each field, cut the way get_info cuts it
+    account = server.find_account(contract)
+    info = {}
+    for key, _, length in INFO_FIELDS:
+        value = account[key]
+        if value is not None:
+            value = value.replace('<br>', '\n')[:length]
+        info[key] = value
+    return info
+
+
+def test_login_success(server):
+    nav = ThirdEyeHttpNav(USERNAME, PASSWORD, base_url=server.base_url)
+    assert nav.login() is True
+    assert nav.is_logged_in
+    # a second call doesn't log in again
+    assert nav.login() is True
+    nav.close_driver()
+
+
+def test_login_wrong_password(server):
+    nav = ThirdEyeHttpNav(USERNAME, 'wrong', base_url=server.base_url)
+    assert nav.login() is False
+    assert not nav.is_logged_in
+    nav.close_driver()
+
+
+def test_search_found(nav, server):
+    contract = server.contracts()[1]
+    assert nav.search_account(contract) is True
+    assert nav.current_page == 'Account ' + contract
+
+
+def test_search_without_prefix(nav, server):
+    assert nav.search_account(server.contracts()[1][3:]) is True
+
+
+def test_search_not_found(nav):
+    assert nav.search_account('MWF999999') is False
+    assert nav.current_account is None
+
+
+def test_get_info_not_found(nav, server):
+    # the previous account's page must not be read for the missing one
+    assert nav.get_info(server.contracts()[1], ['insured'])
+    assert isinstance(nav.get_info('MWF999999', ['insured']), LookupError)
+
+
+def test_search_empty(nav):
+    assert nav.search_account('') is False
+
+
+@pytest.mark.parametrize('index', [0, 1, 2])
+def test_get_info_every_field(nav, server, index):
+    contract = server.contracts()[index]
+    assert nav.get_info(contract, ALL_KEYS) == expected_info(server, contract)
+
+
+@pytest.mark.parametrize('key', ALL_KEYS)
+def test_get_info_single_field(nav, server, key):
+    # late account, every field is on the page
+    contract = server.contracts()[1]
+    assert nav.get_info(contract, [key]) == {key: expected_info(server, contract)[key]}
+
+
+def test_get_info_bool_list(nav, server):
+    contract = server.contracts()[1]
+    desired = [key in ('insured', 'due') for key in ALL_KEYS]
+    info = nav.get_info(contract, desired)
+    assert list(info) == ['insured', 'due']
+    assert info == {'insured': expected_info(server, contract)['insured'],
+                    'due': expected_info(server, contract)['due']}
+
+
+def test_get_info_missing_optional_fields(nav, server):
+    # every third account is in good standing: the default date cell is empty
+    # and there is no cancellation date row at all
+    contract = server.contracts()[0]
+    info = nav.get_info(contract, ['defaultdate', 'canceldate', 'insured'])
+    assert info['defaultdate'] == ''
+    assert info['canceldate'] is None
+    assert info['insured'] == expected_info(server, contract)['insured']
+
+
+def test_get_info_phone_lengths(nav, server):
+    info = nav.get_info(server.contracts()[1], ['phone', 'agentphone'])
+    assert len(info['phone']) == 13
+    assert len(info['agentphone']) == 14
+
+
+def test_get_info_unknown_field(nav, server):
+    with pytest.raises(ValueError):
+        nav.get_info(server.contracts()[1], ['not_a_field'])
+
+
+def test_search_for_mail(nav, server):
+    contract = server.contracts()[2]
+    assert nav.search_account(contract)
+    notice = server.find_account(contract)['notices'][-1]
+    index = notice.rfind(' ')
+    assert nav.search_for_mail() == notice[:index] + ',' + notice[index + 1:]
+
+
+def test_search_for_mail_off_account_page(nav):
+    assert nav.navigate_to('Search Page')
+    assert nav.search_for_mail() is False
@@ -0,0 +1,99 @@
+"""
+test_info_cache.py
+
+Tests for CachedThirdEyeNav (src/info_cache.py) in front of the HTTP backend
+and the local mock server.
+"""
+
+from src.http_nav import ThirdEyeHttpNav
+from src.info_cache import CachedThirdEyeNav, InfoCache
+from src.mock_server import MockThirdEyeServer
+import pytest
+
+
+@pytest.fixture
+def server():
+    with MockThirdEyeServer(accounts=6) as server:
+        yield server
+
+
+@pytest.fixture
+def cached(server):
+    nav = ThirdEyeHttpNav('tester', 'secret', base_url=server.base_url)
+    assert nav.login()
+    yield CachedThirdEyeNav(nav, InfoCache(':memory:'))
+    nav.close_driver()
+
+
+def test_second_lookup_is_cached(cached, server):
+    contract = server.contracts()[1]
+    first = cached.get_info(contract, ['insured', 'due'])
+    requests = server.requests
+    assert cached.get_info(contract, ['insured', 'due']) == first
+    assert server.requests == requests
+
+
+def test_not_found_is_not_cached(cached, server):
+    # a failed search right after a good one must not store the good
+    # account's fields under the missing contract
+    assert cached.get_info(server.contracts()[1], ['insured'])
+    assert isinstance(cached.get_info('MWF999999', ['insured']), LookupError)
+    assert cached.cache.get('MWF999999', ['insured']) == {}
+
+
+def test_other_accounts_values_are_not_cached(cached, server):
+    class WrongPage:
+        # a backend that reads the fields off another account's page
+        current_account = server.contracts()[2]
+
+        def get_info(self, contract, desired_info, **kwargs):
+            return {'insured': 'Someone Else'}
+
+    cached.nav = WrongPage()
+    assert cached.get_info(server.contracts()[1], ['insured']) == {'insured': 'Someone Else'}
+    assert cached.cache.get(server.contracts()[1], ['insured']) == {}
+
+
+def test_memo_invalidates_bare_contract_number(cached, server):
+    # report_reader hands back xls contract numbers without the MWF prefix
+    contract = server.contracts()[1]
+    bare = contract[3:]
+    assert cached.get_info(contract, ['due'])
+
+    class Memo:
+        current_account = contract
+
+        def memo_account(self, account_number, subject, body):
+            return True
+
+    cached.nav = Memo()
+    assert cached.memo_account(bare, 'Subject', 'Body')
+    assert cached.cache.get(contract, ['due']) == {}
+
+
+def test_prefix_and_case_share_an_entry():
+    cache = InfoCache(':memory:')
+    cache.put('mwf100000', {'due': '10.00'})
+    assert cache.get('100000', ['due']) == {'due': '10.00'}
+    assert cache.get('MWF100000', ['due']) == {'due': '10.00'}
+
+
+def test_field_not_on_page_is_cached():
+    class GoodStanding:
+        # an account with no cancel date shows no canceldate field
+        current_account = 'MWF100000'
+        calls = 0
+
+        def get_info(self, contract, desired_info, **kwargs):
+            self.calls += 1
+            return {key: None if key in ('canceldate', 'insured') else '1.00' for key in desired_info}
+
+    nav = GoodStanding()
+    cached = CachedThirdEyeNav(nav, InfoCache(':memory:'))
+    assert cached.get_info('MWF100000', ['canceldate', 'due']) == {'canceldate': None, 'due': '1.00'}
+    assert cached.get_info('MWF100000', ['canceldate', 'due']) == {'canceldate': None, 'due': '1.00'}
+    assert nav.calls == 1
+    # a required field that couldn't be read is asked for again
+    cached.get_info('MWF100000', ['insured'])
+    cached.get_info('MWF100000', ['insured'])
+    assert nav.calls == 3
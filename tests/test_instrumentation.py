@@ -0,0 +1,152 @@
+"""
+test_instrumentation.py
+
+Tests for the spans, hooks and sinks in src/instrumentation.py.
+"""
+
+from src.instrumentation import (DISABLED, NULL_SPAN, Instrumentation, JsonLinesSink, PrometheusSink,
+                                 TimedWait, timed)
+import io
+import json
+import pytest
+import time
+
+
+class Stepper:
+    # stands in for ThirdEyeNav: timed methods look up self.instrument
+    def __init__(self, instrument):
+        self.instrument = instrument
+        self.calls = 0
+
+    @timed('navigate_to', 'dest')
+    def navigate_to(self, dest, result=True):
+        self.calls += 1
+        return result
+
+
+class FakeWait:
+    def until(self, method, message=''):
+        return method(None)
+
+    def until_not(self, method, message=''):
+        return not method(None)
+
+
+def recorder():
+    events = []
+    return Instrumentation([events.append]), events
+
+
+def test_disabled_is_a_no_op():
+    assert not DISABLED.enabled
+    assert DISABLED.span('navigate_to', dest='Search Page') is NULL_SPAN
+    with DISABLED.span('navigate_to') as span:
+        span.fail('ignored')
+        span.set(field='due')
+    stepper = Stepper(DISABLED)
+    assert stepper.navigate_to('Search Page', result=False) is False
+    assert stepper.calls == 1
+    assert DISABLED.hooks == []
+
+
+def test_spans_nest_and_time():
+    instrument, events = recorder()
+    with instrument.span('get_info', account='MWF1') as outer:
+        with instrument.span('get_info.field', field='due'):
+            time.sleep(0.02)
+    inner_event, outer_event = events
+    assert inner_event['parent_id'] == outer.span_id
+    assert outer_event['parent_id'] is None
+    assert inner_event['field'] == 'due' and outer_event['account'] == 'MWF1'
+    assert inner_event['seconds'] >= 0.02
+    assert outer_event['seconds'] >= inner_event['seconds']
+    assert inner_event['ok'] and outer_event['ok']
+
+
+def test_exception_and_fail_mark_the_span():
+    instrument, events = recorder()
+    with pytest.raises(ValueError):
+        with instrument.span('search_account'):
+            raise ValueError('bad account')
+    with instrument.span('navigate_to') as span:
+        span.fail('not loaded')
+    assert [(event['ok'], event['error']) for event in events] == [
+        (False, 'ValueError'), (False, 'not loaded')]
+    # the stack unwound, so the next span has no parent
+    with instrument.span('navigate_to'):
+        pass
+    assert events[-1]['parent_id'] is None
+
+
+def test_timed_labels_and_failures():
+    instrument, events = recorder()
+    stepper = Stepper(instrument)
+    assert stepper.navigate_to('Search Page') is True
+    assert stepper.navigate_to('Login Page', result=False) is False
+    assert [(event['dest'], event['ok'], event['error']) for event in events] == [
+        ('Search Page', True, None), ('Login Page', False, 'returned False')]
+
+
+def test_broken_hook_does_not_raise():
+    events = []
+
+    def broken(event):
+        raise RuntimeError('tracer down')
+
+    instrument = Instrumentation([broken, events.append])
+    with instrument.span('wait'):
+        pass
+    assert len(events) == 1
+
+
+def test_timed_wait():
+    instrument, events = recorder()
+    wait = TimedWait(FakeWait(), instrument)
+    assert wait.until(lambda driver: 'element') == 'element'
+    assert wait.until_not(lambda driver: False) is True
+    assert [event['step'] for event in events] == ['wait', 'wait']
+
+
+def test_json_lines_sink():
+    out = io.StringIO()
+    instrument = Instrumentation([JsonLinesSink(out)])
+    with instrument.span('get_info.field', field='due'):
+        pass
+    lines = out.getvalue().splitlines()
+    assert len(lines) == 1
+    event = json.loads(lines[0])
+    assert event['step'] == 'get_info.field' and event['field'] == 'due' and event['ok'] is True
+
+
+def test_json_lines_sink_appends_to_path(tmp_path):
+    path = str(tmp_path / 'events.jsonl')
+    for step in ('navigate_to', 'search_account'):
+        sink = JsonLinesSink(path)
+        sink({'step': step, 'seconds': 0.1, 'ok': True})
+        sink.close()
+    with open(path, encoding='utf-8') as f:
+        assert [json.loads(line)['step'] for line in f] == ['navigate_to', 'search_account']
+
+
+def test_prometheus_text():
+    sink = PrometheusSink(buckets=(0.1, 1), prefix='test')
+    sink({'step': 'wait', 'seconds': 0.05, 'ok': True})
+    sink({'step': 'wait', 'seconds': 0.5, 'ok': True})
+    sink({'step': 'wait', 'seconds': 2.0, 'ok': False})
+    sink({'step': 'navigate_to', 'seconds': 0.1, 'ok': True})
+    assert sink.render() == (
+        '# TYPE test_steps_total counter\n'
+        'test_steps_total{step="navigate_to",status="ok"} 1\n'
+        'test_steps_total{step="wait",status="error"} 1\n'
+        'test_steps_total{step="wait",status="ok"} 2\n'
+        '# TYPE test_step_seconds histogram\n'
+        'test_step_seconds_bucket{step="navigate_to",le="0.1"} 1\n'
+        'test_step_seconds_bucket{step="navigate_to",le="1"} 1\n'
+        'test_step_seconds_bucket{step="navigate_to",le="+Inf"} 1\n'
+        'test_step_seconds_sum{step="navigate_to"} 0.100000\n'
+        'test_step_seconds_count{step="navigate_to"} 1\n'
+        'test_step_seconds_bucket{step="wait",le="0.1"} 1\n'
+        'test_step_seconds_bucket{step="wait",le="1"} 2\n'
+        'test_step_seconds_bucket{step="wait",le="+Inf"} 3\n'
+        'test_step_seconds_sum{step="wait"} 2.550000\n'
+        'test_step_seconds_count{step="wait"} 3\n')
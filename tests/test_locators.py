@@ -0,0 +1,132 @@
+"""
+test_locators.py
+
+Tests for the locator registry and the container caching of LocatorResolver
+(src/locators.py) with a fake waiter, so no browser is needed.
+"""
+
+from selenium.common.exceptions import NoSuchElementException, StaleElementReferenceException
+from selenium.common.exceptions import TimeoutException
+from selenium.webdriver.common.by import By
+from src.locators import LOCATORS, Locator, LocatorResolver, absolute
+import pytest
+
+PANEL = '/html/body/div[2]'
+
+TEST_LOCATORS = {
+    'panel':    Locator(By.XPATH, PANEL),
+    'due':      Locator(By.XPATH, './div[1]/span', 'panel'),
+    'cancel':   Locator(By.XPATH, './div[2]/span', 'panel', None, True),
+    'tab':      Locator(By.ID, 'top1'),
+    'by_name':  Locator(By.NAME, 'field', 'panel'),
+}
+
+
+class Panel:
+    # the account panel. [children] maps relative xpaths to elements
+    def __init__(self, children):
+        self.children = children
+        self.stale = False
+        self.lookups = 0
+
+    def find_elements(self, by, value):
+        if self.stale:
+            raise StaleElementReferenceException('panel')
+        self.lookups += 1
+        return [self.children[value]] if value in self.children else []
+
+
+class FakeWaiter:
+    # until_present returns what [page] has for the value, like AdaptiveWait
+    def __init__(self, page):
+        self.page = page
+        self.calls = []
+
+    def until_present(self, key, by, value, optional=False):
+        self.calls.append(value)
+        if value in self.page:
+            return self.page[value]
+        if optional:
+            return None
+        raise TimeoutException(key)
+
+
+def resolver_on(page):
+    waiter = FakeWaiter(page)
+    return LocatorResolver(waiter, TEST_LOCATORS), waiter
+
+
+def test_container_looked_up_once():
+    panel = Panel({'./div[1]/span': 'due element'})
+    resolver, waiter = resolver_on({PANEL: panel, 'top1': 'tab element'})
+    assert resolver.find('due') == 'due element'
+    assert resolver.find('due') == 'due element'
+    assert resolver.find('tab') == 'tab element'
+    assert waiter.calls == [PANEL, 'top1']
+    assert panel.lookups == 2
+    assert resolver.stats() == {'container_hits': 1, 'container_misses': 1, 'stale': 0}
+
+
+def test_reset_forgets_the_container():
+    panel = Panel({'./div[1]/span': 'due element'})
+    resolver, waiter = resolver_on({PANEL: panel})
+    resolver.find('due')
+    resolver.reset()
+    resolver.find('due')
+    assert waiter.calls == [PANEL, PANEL]
+    assert resolver.stats()['container_misses'] == 2
+
+
+def test_stale_container_is_looked_up_again():
+    old_panel = Panel({})
+    resolver, waiter = resolver_on({PANEL: old_panel})
+    resolver.container('panel')
+    old_panel.stale = True
+    new_panel = Panel({'./div[1]/span': 'new due'})
+    waiter.page[PANEL] = new_panel
+    assert resolver.find('due') == 'new due'
+    assert resolver.containers == {'panel': new_panel}
+    assert resolver.stats()['stale'] == 1
+
+
+def test_optional_missing_from_rendered_panel():
+    resolver, waiter = resolver_on({PANEL: Panel({})})
+    assert resolver.find('cancel') is None
+    # the panel was there, so no long wait for the field
+    assert waiter.calls == [PANEL]
+
+
+def test_falls_back_to_absolute_xpath():
+    # the panel is up but the field isn't rendered yet: wait for it by its
+    # full xpath rather than failing on the quick lookup
+    resolver, waiter = resolver_on({PANEL: Panel({}), PANEL + '/div[1]/span': 'due element'})
+    assert resolver.find('due') == 'due element'
+    assert waiter.calls == [PANEL, PANEL + '/div[1]/span']
+    del waiter.page[PANEL + '/div[1]/span']
+    with pytest.raises(TimeoutException):
+        resolver.find('due')
+
+
+def test_missing_non_xpath_child():
+    resolver, _ = resolver_on({PANEL: Panel({})})
+    with pytest.raises(NoSuchElementException):
+        resolver.find('by_name')
+
+
+def test_relative_paths():
+    resolver, _ = resolver_on({})
+    assert resolver.relative_paths(['due', 'cancel']) == ('panel', ['./div[1]/span', './div[2]/span'])
+    with pytest.raises(ValueError):
+        resolver.relative_paths(['due', 'tab'])
+    with pytest.raises(ValueError):
+        resolver.relative_paths(['tab'])
+
+
+def test_absolute_matches_registry():
+    assert absolute('due', TEST_LOCATORS) == PANEL + '/div[1]/span'
+    with pytest.raises(ValueError):
+        absolute('by_name', TEST_LOCATORS)
+    # every field in the real registry rebuilds to an xpath under its panel
+    for name, locator in LOCATORS.items():
+        if locator.parent is not None:
+            assert absolute(name).startswith(LOCATORS[locator.parent].value + '/')
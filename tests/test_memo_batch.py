@@ -0,0 +1,73 @@
+"""
+test_memo_batch.py
+
+Tests for the resumable memo pipeline (src/memo_batch.py) with a stand-in
+session, so no browser is needed.
+"""
+
+from src.memo_batch import (MemoJob, MemoJournal, memo_batch, job_key, batch_journal_path, PENDING,
+                            WRITTEN, DONE, UNCONFIRMED, FAILED)
+import pytest
+
+
+class FakeNav:
+    # memo_account fails for the accounts in [failing]
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.written = []
+
+    def memo_account(self, account, subject, body):
+        if account in self.failing:
+            return False
+        self.written.append(account)
+        return True
+
+
+JOBS = [MemoJob('MWF1', 'Subject', 'Body'), MemoJob('MWF2', 'Subject', 'Body')]
+
+
+def test_writes_every_job(tmp_path):
+    nav = FakeNav(failing=['MWF2'])
+    result = memo_batch(nav, JOBS, 'batch-1', journal_path=str(tmp_path / 'journal.jsonl'))
+    assert [status.status for status in result['statuses']] == [WRITTEN, FAILED]
+    assert nav.written == ['MWF1']
+
+
+def test_pending_job_is_not_written_again(tmp_path):
+    path = str(tmp_path / 'journal.jsonl')
+    # a crash left MWF1 pending: it may or may not have been saved
+    journal = MemoJournal(path)
+    journal.record(job_key('batch-1', JOBS[0]), 'MWF1', PENDING)
+    journal.close()
+
+    nav = FakeNav()
+    result = memo_batch(nav, JOBS, 'batch-1', journal_path=path)
+    assert [status.status for status in result['statuses']] == [UNCONFIRMED, WRITTEN]
+    assert nav.written == ['MWF2']
+    # still pending, so it keeps being reported rather than written
+    assert MemoJournal(path).state[job_key('batch-1', JOBS[0])] == PENDING
+
+
+def test_resume_skips_written_and_retries_failed(tmp_path):
+    path = str(tmp_path / 'journal.jsonl')
+    memo_batch(FakeNav(failing=['MWF2']), JOBS, 'batch-1', journal_path=path)
+    nav = FakeNav()
+    result = memo_batch(nav, JOBS, 'batch-1', journal_path=path)
+    assert [status.status for status in result['statuses']] == [DONE, WRITTEN]
+    assert nav.written == ['MWF2']
+
+
+def test_new_batch_writes_recurring_memo(tmp_path):
+    # the same note on the same account in a later batch is a new memo
+    path = str(tmp_path / 'journal.jsonl')
+    memo_batch(FakeNav(), JOBS, 'batch-1', journal_path=path)
+    nav = FakeNav()
+    result = memo_batch(nav, JOBS, 'batch-2', journal_path=path)
+    assert result['counts'][WRITTEN] == 2
+    assert nav.written == ['MWF1', 'MWF2']
+
+
+def test_batches_get_their_own_journal(tmp_path):
+    assert batch_journal_path('a', str(tmp_path)) != batch_journal_path('b', str(tmp_path))
+    with pytest.raises(ValueError):
+        batch_journal_path('../a', str(tmp_path))
@@ -0,0 +1,75 @@
+"""
+test_report_reader.py
+
+Tests for the contract numbers read_report pulls out of downloaded reports.
+"""
+
+from decimal import Decimal
+from src.report_reader import read_report
+import sys
+import types
+
+XLS_MAGIC = b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'
+
+
+class _Cell:
+    def __init__(self, ctype, value):
+        self.ctype = ctype
+        self.value = value
+
+
+def fake_xlrd(rows):
+    # just enough of xlrd for _xls_rows: every number is a float, like the
+    # real library
+    xlrd = types.ModuleType('xlrd')
+    xlrd.XL_CELL_TEXT, xlrd.XL_CELL_NUMBER, xlrd.XL_CELL_DATE = 1, 2, 3
+
+    def cell(value):
+        if isinstance(value, (int, float)):
+            return _Cell(xlrd.XL_CELL_NUMBER, float(value))
+        return _Cell(xlrd.XL_CELL_TEXT, value)
+
+    sheet = types.SimpleNamespace(nrows=len(rows), row=lambda i: [cell(value) for value in rows[i]])
+    workbook = types.SimpleNamespace(datemode=0, sheet_by_index=lambda i: sheet,
+                                     release_resources=lambda: None)
+    xlrd.open_workbook = lambda path, on_demand=False: workbook
+    return xlrd
+
+
+def test_xls_contract_numbers_are_not_floats(tmp_path, monkeypatch):
+    path = tmp_path / 'report.xls'
+    path.write_bytes(XLS_MAGIC)
+    monkeypatch.setitem(sys.modules, 'xlrd', fake_xlrd([
+        ['Contract No', 'Amount Due'],
+        [100000, 12.5],
+        [100001, 3],
+    ]))
+
+    rows = list(read_report(str(path)))
+    assert [row.contract for row in rows] == ['100000', '100001']
+    assert rows[0].fields['Amount Due'] == Decimal('12.5')
+    assert rows[1].fields['Amount Due'] == Decimal('3')
+
+
+def test_csv_contract_numbers(tmp_path):
+    path = tmp_path / 'report.csv'
+    path.write_text('Collection Report\nContract No,Insured\nMWF100000,A\n,\n100001,B\n')
+    assert [row.contract for row in read_report(str(path))] == ['MWF100000', '100001']
+
+
+def test_title_row_is_not_the_header(tmp_path):
+    path = tmp_path / 'report.csv'
+    path.write_text('Accounts 30 days late,\nContract No.,Insured\nMWF1,A\n')
+    assert [(row.contract, row.fields['Insured']) for row in read_report(str(path))] == [('MWF1', 'A')]
+
+
+def test_no_header_keeps_every_row(tmp_path):
+    # no contract column in the first rows: the first row becomes the header
+    # and none of the rows searched are lost
+    path = tmp_path / 'report.csv'
+    path.write_text('Insured,Amount\n' + ''.join('N%d,%d\n' % (i, i) for i in range(60)))
+    rows = list(read_report(str(path)))
+    assert len(rows) == 60
+    assert [row.fields['Insured'] for row in rows[:2]] == ['N0', 'N1']
+    assert rows[-1].fields['Insured'] == 'N59'
+    assert all(row.contract == '' for row in rows)
@@ -0,0 +1,120 @@
+"""
+test_report_scheduler.py
+
+Tests for the date range chunking and merging in src/report_scheduler.py,
+and for ReportScheduler's handling of sessions, using fake sessions passed in
+through nav_factory.
+"""
+
+from src.download_watcher import DownloadResult
+from src.report_scheduler import ReportScheduler, split_range, merge_reports
+import csv
+import os
+import pytest
+
+
+def test_month_chunks_follow_calendar_months():
+    assert split_range('01/15/2024', '03/10/2024') == [
+        ('01/15/2024', '01/31/2024'),
+        ('02/01/2024', '02/29/2024'),
+        ('03/01/2024', '03/10/2024'),
+    ]
+    assert split_range('12/31/2023', '01/01/2024') == [
+        ('12/31/2023', '12/31/2023'),
+        ('01/01/2024', '01/01/2024'),
+    ]
+
+
+def test_day_chunks():
+    assert split_range('01/01/2024', '01/05/2024', chunk=2) == [
+        ('01/01/2024', '01/02/2024'),
+        ('01/03/2024', '01/04/2024'),
+        ('01/05/2024', '01/05/2024'),
+    ]
+
+
+def test_reversed_range():
+    with pytest.raises(ValueError):
+        split_range('02/01/2024', '01/01/2024')
+
+
+def test_merge_drops_titles_and_repeated_headers(tmp_path):
+    first = tmp_path / 'jan.csv'
+    first.write_text('Check Register\nContract No,Amount\nMWF1,10.00\n')
+    empty = tmp_path / 'feb.csv'
+    empty.write_text('')
+    second = tmp_path / 'mar.csv'
+    second.write_text('Check Register\nContract No,Amount\nMWF2,5.00\n,\nContract No,Amount\nMWF3,1.00\n')
+    output = tmp_path / 'merged.csv'
+
+    assert merge_reports([str(first), str(empty), str(second)], str(output)) == 3
+    with open(output, newline='') as f:
+        assert list(csv.reader(f)) == [
+            ['Contract No', 'Amount'], ['MWF1', '10.00'], ['MWF2', '5.00'], ['MWF3', '1.00']]
+
+
+class FakeNav:
+    def __init__(self, download_dir, logged_in=True):
+        self.download_dir = download_dir
+        self.logged_in = logged_in
+        self.alive = True
+        self.closed = False
+
+    def login(self):
+        return self.logged_in
+
+    def is_alive(self):
+        return self.alive and not self.closed
+
+    def close_driver(self):
+        self.closed = True
+
+    def download_report(self, report, l_date=None, r_date=None):
+        path = os.path.join(self.download_dir, 'report.csv')
+        with open(path, 'w') as f:
+            f.write('Contract No,Amount\nMWF1,' + l_date[:2] + '\n')
+        return DownloadResult(path, os.path.getsize(path), 0.0)
+
+
+def test_failed_login_is_not_used(tmp_path):
+    navs = []
+
+    def factory(download_dir):
+        navs.append(FakeNav(download_dir, logged_in=False))
+        return navs[-1]
+
+    with ReportScheduler('headless', 'user', 'password', sessions=1, output_dir=str(tmp_path),
+                         nav_factory=factory) as scheduler:
+        assert scheduler.submit('Check Register', '01/01/2024', '01/31/2024').result() is None
+    assert navs and all(nav.closed for nav in navs)
+
+
+def test_dead_session_is_not_reused(tmp_path):
+    navs = []
+    used_closed = []
+
+    class Dying(FakeNav):
+        def download_report(self, report, l_date=None, r_date=None):
+            if self.closed:
+                used_closed.append(self)
+            self.alive = False
+            return None
+
+    def factory(download_dir):
+        # the first session dies and its replacement can't be started
+        navs.append(None)
+        if len(navs) == 2:
+            raise RuntimeError('chrome failed to start')
+        navs[-1] = (Dying if len(navs) == 1 else FakeNav)(download_dir)
+        return navs[-1]
+
+    with ReportScheduler('headless', 'user', 'password', sessions=1, output_dir=str(tmp_path),
+                         nav_factory=factory) as scheduler:
+        assert scheduler.submit('Check Register', '01/01/2024', '01/31/2024').result() is None
+        result = scheduler.submit('Check Register', '02/01/2024', '03/31/2024').result()
+    assert used_closed == []
+    assert result is not None
+    assert len(navs) == 3
+    assert all(nav.closed for nav in navs if nav is not None)
+    with open(result.path, newline='') as f:
+        assert list(csv.reader(f)) == [['Contract No', 'Amount'], ['MWF1', '02'], ['MWF1', '03']]
@@ -0,0 +1,192 @@
+"""
+test_session_pool.py
+
+Tests for SessionPool in src/session_pool.py, using fake sessions passed in
+through nav_factory.
+"""
+
+from selenium.common.exceptions import InvalidSessionIdException, TimeoutException
+from src.session_pool import SessionPool
+import threading
+import pytest
+
+
+class FakeNav:
+    def __init__(self, logged_in=True):
+        self.logins = 0
+        self.login_ok = logged_in
+        self.is_logged_in = False
+        self.alive = True
+        self.closed = False
+        self.current_page = None
+
+    def login(self):
+        self.logins += 1
+        self.is_logged_in = self.login_ok
+        return self.login_ok
+
+    def is_alive(self):
+        return self.alive and not self.closed
+
+    def close_driver(self):
+        self.closed = True
+
+    def get_info(self, contract, desired_info, single_pass=False):
+        if contract == 'missing':
+            return TimeoutException('field not found')
+        return {'contract': contract}
+
+
+def recording(navs, **kwargs):
+    # a nav_factory that keeps every session it makes in [navs]
+    lock = threading.Lock()
+
+    def factory():
+        with lock:
+            navs.append(FakeNav(**kwargs))
+            return navs[-1]
+    return factory
+
+
+def pool(factory, size=2, **kwargs):
+    return SessionPool('headless', 'user', 'password', size=size, nav_factory=factory, **kwargs)
+
+
+def test_results_keep_input_order():
+    navs = []
+    contracts = [str(i) for i in range(20)]
+    with pool(recording(navs), size=3) as p:
+        assert p.get_info(contracts, [True]) == [{'contract': c} for c in contracts]
+        stats = p.throughput()
+    assert len(navs) == 3
+    assert sum(s['processed'] for s in stats) == 20
+    assert all(nav.closed for nav in navs)
+
+
+def test_failed_logins_are_not_used():
+    navs = []
+    lock = threading.Lock()
+
+    def factory():
+        with lock:
+            navs.append(FakeNav(logged_in=len(navs) > 0))
+            return navs[-1]
+
+    with pool(factory, size=2) as p:
+        assert len(p.workers) == 1
+        assert p.get_info(['1', '2'], [True]) == [{'contract': '1'}, {'contract': '2'}]
+    # the session that couldn't log in was retried and then closed
+    assert navs[0].logins == 2
+    assert navs[0].closed
+
+
+def test_no_session_starts():
+    with pytest.raises(RuntimeError):
+        pool(lambda: FakeNav(logged_in=False)).start()
+
+
+def test_missing_field_does_not_restart():
+    navs = []
+    with pool(recording(navs), size=1) as p:
+        result = p.get_info(['missing'], [True])
+        assert isinstance(result[0], TimeoutException)
+        assert p.throughput()[0]['restarts'] == 0
+        assert p.throughput()[0]['failures'] == 1
+    assert len(navs) == 1
+    assert navs[0].logins == 1
+
+
+def test_lost_session_is_replaced_and_retried():
+    navs = []
+
+    def lost(nav, contract):
+        if nav is navs[0]:
+            nav.alive = False
+            raise InvalidSessionIdException('gone')
+        return contract
+
+    with pool(recording(navs), size=1) as p:
+        assert p.map(lost, ['1']) == ['1']
+        assert p.throughput()[0]['restarts'] == 1
+    assert len(navs) == 2
+    assert navs[0].closed
+
+
+def test_dropped_login_is_recovered_in_place():
+    navs = []
+    calls = []
+
+    def logged_out(nav, contract):
+        calls.append(contract)
+        if len(calls) == 1:
+            nav.is_logged_in = False
+            return False
+        return contract
+
+    with pool(recording(navs), size=1) as p:
+        assert p.map(logged_out, ['1']) == ['1']
+        assert p.throughput()[0]['restarts'] == 0
+    assert len(navs) == 1
+    assert navs[0].logins == 2
+
+
+def test_other_errors_are_results():
+    navs = []
+
+    def unknown_key(nav, contract):
+        if contract == 'bad':
+            raise ValueError('unknown info key')
+        return contract
+
+    with pool(recording(navs), size=1) as p:
+        result = p.map(unknown_key, ['1', 'bad', '2'])
+        assert result[0] == '1' and result[2] == '2'
+        assert isinstance(result[1], ValueError)
+        assert p.throughput()[0]['failures'] == 1
+        assert p.throughput()[0]['processed'] == 3
+
+
+def test_unreplaceable_worker_leaves_service():
+    navs = []
+    make = recording(navs)
+
+    def factory():
+        # the first two sessions start, no replacement ever does
+        if len(navs) >= 2:
+            raise RuntimeError('chrome failed to start')
+        return make()
+
+    def die_on_first(nav, contract):
+        if nav is navs[0]:
+            nav.alive = False
+            raise InvalidSessionIdException('gone')
+        return contract
+
+    with pool(factory, size=2) as p:
+        contracts = [str(i) for i in range(6)]
+        result = p.map(die_on_first, contracts)
+        assert len(p.workers) == 1
+        assert p.workers[0].nav is navs[1]
+        assert sum(isinstance(r, InvalidSessionIdException) for r in result) == 1
+        # the job the lost session had fails, the other worker does the rest
+        assert sum(not isinstance(r, Exception) for r in result) == 5
+
+
+def test_jobs_fail_when_no_session_is_left():
+    navs = []
+    make = recording(navs)
+
+    def factory():
+        if navs:
+            raise RuntimeError('chrome failed to start')
+        return make()
+
+    def die(nav, contract):
+        nav.alive = False
+        raise InvalidSessionIdException('gone')
+
+    with pool(factory, size=1) as p:
+        result = p.map(die, ['1', '2'])
+        assert isinstance(result[0], InvalidSessionIdException)
+        assert isinstance(result[1], RuntimeError)
+        assert p.workers == []
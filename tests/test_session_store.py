@@ -0,0 +1,87 @@
+"""
+test_session_store.py
+
+Tests for the encrypted cookie store in src/session_store.py.
+"""
+
+from cryptography.fernet import Fernet
+from src import session_store
+from src.session_store import SessionStore, load_key
+import os
+import threading
+
+COOKIES = [{'name': 'JSESSIONID', 'value': 'abc123', 'path': '/insight'}]
+
+
+def store(tmp_path, **kwargs):
+    kwargs.setdefault('key', Fernet.generate_key())
+    return SessionStore(str(tmp_path / 'session.bin'), **kwargs)
+
+
+def test_round_trip(tmp_path):
+    first = store(tmp_path)
+    first.save('tester', COOKIES)
+    assert first.load('tester') == COOKIES
+    assert first.load('someone else') is None
+    # the file holds no plain text cookie
+    assert b'abc123' not in (tmp_path / 'session.bin').read_bytes()
+    assert os.listdir(str(tmp_path)) == ['session.bin']
+    first.clear()
+    assert first.load('tester') is None
+
+
+def test_wrong_key_and_corrupt_file(tmp_path):
+    store(tmp_path).save('tester', COOKIES)
+    assert store(tmp_path).load('tester') is None
+    (tmp_path / 'session.bin').write_bytes(b'not a fernet token')
+    assert store(tmp_path).load('tester') is None
+
+
+def test_expired_session(tmp_path, monkeypatch):
+    key = Fernet.generate_key()
+    store(tmp_path, key=key).save('tester', COOKIES)
+    later = session_store.time.time() + 61
+    monkeypatch.setattr(session_store.time, 'time', lambda: later)
+    assert store(tmp_path, key=key, max_age=60).load('tester') is None
+    assert store(tmp_path, key=key, max_age=120).load('tester') == COOKIES
+
+
+def test_concurrent_saves_leave_one_whole_session(tmp_path):
+    key = Fernet.generate_key()
+
+    def save(n):
+        store(tmp_path, key=key).save('tester', [{'name': 'n', 'value': str(n)}] * 50)
+
+    threads = [threading.Thread(target=save, args=(n,)) for n in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    cookies = store(tmp_path, key=key).load('tester')
+    assert cookies is not None and len(cookies) == 50
+    assert os.listdir(str(tmp_path)) == ['session.bin']
+
+
+def test_key_file_created_once(tmp_path, monkeypatch):
+    monkeypatch.delenv(session_store.SESSION_KEY_ENV, raising=False)
+    path = str(tmp_path / 'session.key')
+    keys = []
+
+    def load():
+        keys.append(load_key(path))
+
+    threads = [threading.Thread(target=load) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(set(keys)) == 1
+    assert keys[0] == open(path, 'rb').read()
+    assert os.listdir(str(tmp_path)) == ['session.key']
+
+
+def test_key_from_environment(tmp_path, monkeypatch):
+    key = Fernet.generate_key()
+    monkeypatch.setenv(session_store.SESSION_KEY_ENV, key.decode('ascii'))
+    assert load_key(str(tmp_path / 'session.key')) == key
+    assert not (tmp_path / 'session.key').exists()
@@ -0,0 +1,115 @@
+"""
+test_shard_runner.py
+
+Tests for the input parsing, ordered output and worker clean up of
+src/shard_runner.py. The end to end run uses the HTTP backend against the
+local mock server.
+"""
+
+from src import shard_runner
+from src.mock_server import MockThirdEyeServer
+from src.shard_runner import ResultWriter, read_contracts, run_sharded
+import csv
+import json
+import multiprocessing
+import os
+import time
+
+
+def test_read_csv_with_header(tmp_path):
+    path = tmp_path / 'contracts.csv'
+    path.write_text('Insured,Contract No\nA,MWF1\nB,\nC, MWF2 \n')
+    assert list(read_contracts(str(path))) == ['MWF1', 'MWF2']
+
+
+def test_read_csv_without_header(tmp_path):
+    path = tmp_path / 'contracts.csv'
+    path.write_text('MWF1,A\nMWF2,B\n')
+    assert list(read_contracts(str(path))) == ['MWF1', 'MWF2']
+
+
+def test_read_jsonl_and_text(tmp_path):
+    jsonl = tmp_path / 'contracts.jsonl'
+    jsonl.write_text('{"contract": "MWF1"}\n\n"MWF2"\n{"contract": ""}\n{"contract": 3}\n')
+    assert list(read_contracts(str(jsonl))) == ['MWF1', 'MWF2', '3']
+    text = tmp_path / 'contracts.txt'
+    text.write_text('MWF1\n\n  MWF2\n')
+    assert list(read_contracts(str(text))) == ['MWF1', 'MWF2']
+
+
+def test_writer_keeps_input_order(tmp_path):
+    path = str(tmp_path / 'results.jsonl')
+    writer = ResultWriter(path, ['due'])
+    writer.add(2, {'contract': 'MWF3'})
+    writer.add(0, {'contract': 'MWF1'})
+    assert writer.pending == {2: {'contract': 'MWF3'}}
+    writer.add(1, {'contract': 'MWF2'})
+    writer.close()
+    with open(path) as f:
+        assert [json.loads(line)['contract'] for line in f] == ['MWF1', 'MWF2', 'MWF3']
+
+
+def test_writer_csv(tmp_path):
+    path = str(tmp_path / 'results.csv')
+    writer = ResultWriter(path, ['insured', 'due'])
+    writer.add(1, {'contract': 'MWF2', 'info': None, 'error': 'contract not found'})
+    writer.add(0, {'contract': 'MWF1', 'info': {'insured': 'A', 'due': '1.00'}, 'error': None})
+    writer.close()
+    with open(path, newline='') as f:
+        assert list(csv.reader(f)) == [['contract', 'insured', 'due', 'error'],
+                                       ['MWF1', 'A', '1.00', ''],
+                                       ['MWF2', '', '', 'contract not found']]
+
+
+def test_run_sharded_merges_in_order(tmp_path):
+    path = str(tmp_path / 'results.jsonl')
+    with MockThirdEyeServer(accounts=8) as server:
+        contracts = server.contracts() + ['MWF999999']
+        summary = run_sharded(contracts, path, fields=['insured'], processes=2, retries=0,
+                              backend='http', username='tester', password='secret', base_url=server.base_url)
+    with open(path) as f:
+        records = [json.loads(line) for line in f]
+    assert [record['contract'] for record in records] == contracts
+    assert all(record['info']['insured'] for record in records[:-1])
+    assert records[-1]['error']
+    assert summary['ok'] == 8
+    assert summary['failed'] == 1
+
+
+class MarkerNav:
+    # writes [path] when its session is closed
+    def __init__(self, path):
+        self.path = path
+
+    def close_driver(self):
+        with open(self.path, 'w') as f:
+            f.write('closed')
+
+
+def _worker(marker, ready, linger):
+    shard_runner._init_worker({}, multiprocessing.get_context('spawn').Value('i', 0))
+    shard_runner._nav = MarkerNav(marker)
+    ready.set()
+    if linger:
+        time.sleep(60)
+
+
+def _run_worker(tmp_path, linger):
+    context = multiprocessing.get_context('spawn')
+    marker = str(tmp_path / 'closed')
+    ready = context.Event()
+    process = context.Process(target=_worker, args=(marker, ready, linger))
+    process.start()
+    assert ready.wait(30)
+    if linger:
+        process.terminate()
+    process.join(30)
+    return os.path.exists(marker)
+
+
+def test_worker_closes_session_on_exit(tmp_path):
+    assert _run_worker(tmp_path, linger=False)
+
+
+def test_worker_closes_session_on_terminate(tmp_path):
+    assert _run_worker(tmp_path, linger=True)
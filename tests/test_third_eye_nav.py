@@ -0,0 +1,109 @@
+"""
+test_third_eye_nav.py
+
+Tests for ThirdEyeNav's search against a fake driver whose pages take a
+moment to replace each other, like a real form submit.
+"""
+
+from selenium.common.exceptions import StaleElementReferenceException
+import src.third_eye_nav as third_eye_nav
+import time
+
+# seconds between clicking search and the new page replacing the old one
+LOAD_DELAY = 0.2
+
+
+class Element:
+    def __init__(self, driver, name):
+        self.driver = driver
+        self.document = driver.document
+        self.name = name
+
+    def _check(self):
+        if self.driver.current() is not self.document:
+            raise StaleElementReferenceException(self.name)
+
+    def is_enabled(self):
+        self._check()
+        return True
+
+    def clear(self):
+        self._check()
+
+    def send_keys(self, text):
+        self._check()
+        self.driver.typed = text
+
+    def click(self):
+        self._check()
+        if self.name == 'quoteSearchContractByAll':
+            self.driver.submit()
+
+    def find_elements(self, by, value):
+        self._check()
+        return [Element(self.driver, value)] if self.document['account'] else []
+
+
+class Driver:
+    # a search page with an account panel for [accounts] on it
+    def __init__(self, accounts):
+        self.accounts = accounts
+        self.document = {'account': None}
+        self.next_document = None
+        self.typed = None
+
+    def current(self):
+        if self.next_document is not None and time.monotonic() >= self.next_document[0]:
+            self.document = self.next_document[1]
+            self.next_document = None
+        return self.document
+
+    def submit(self):
+        found = self.typed if self.typed in self.accounts else None
+        self.next_document = (time.monotonic() + LOAD_DELAY, {'account': found})
+
+    def set_script_timeout(self, seconds):
+        pass
+
+    def quit(self):
+        pass
+
+    def find_element(self, by, value):
+        self.current()
+        return Element(self, value)
+
+    def execute_script(self, script, *args):
+        account = self.current()['account']
+        return {'url': '', 'login_form': False, 'search_box': True, 'account_page': account is not None,
+                'has_account': account is not None and account == args[0], 'report_list': False}
+
+    def execute_async_script(self, script, by, value, timeout):
+        document = self.current()
+        if 'html' in value and document['account'] is None:
+            return None # an account panel xpath on a page without an account
+        return Element(self, value)
+
+
+def nav_on_account(monkeypatch, account):
+    driver = Driver({'100000'})
+    monkeypatch.setattr(third_eye_nav, 'driver_factory', lambda *args, **kwargs: driver)
+    nav = third_eye_nav.ThirdEyeNav('headless', 'user', 'password')
+    driver.document = {'account': account}
+    return nav, driver
+
+
+def test_search_waits_for_the_new_page(monkeypatch):
+    # the old account is still on screen and nothing is cached: the result
+    # must come from the page the search loads, not the one already up
+    nav, driver = nav_on_account(monkeypatch, '100000')
+    assert nav.resolver.containers == {}
+    assert nav.search_account('MWF999999') is False
+    assert driver.document == {'account': None}
+    nav.driver = None
+
+
+def test_search_finds_account(monkeypatch):
+    nav, driver = nav_on_account(monkeypatch, None)
+    assert nav.search_account('100000') is True
+    assert nav.current_account == '100000'
+    nav.driver = None
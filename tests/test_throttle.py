@@ -0,0 +1,109 @@
+"""
+test_throttle.py
+
+Tests for the rate limiter and circuit breaker in src/throttle.py, and for
+ThirdEyeNav reporting an outcome for every request the throttle lets through.
+"""
+
+from selenium.common.exceptions import WebDriverException
+from src.throttle import CircuitBreaker, RateLimiter, Throttle, CLOSED, OPEN, HALF_OPEN
+import time
+
+COOLDOWN = 0.05
+
+
+def tripped_breaker():
+    breaker = CircuitBreaker(window=4, threshold=0.5, min_calls=2, cooldown=COOLDOWN)
+    breaker.record(True)
+    breaker.record(True)
+    assert breaker.state == OPEN
+    return breaker
+
+
+def test_limiters_share_a_state_file(tmp_path):
+    # two workers (one limiter each, as in separate processes) draw from
+    # the same bucket
+    path = str(tmp_path / 'throttle.state')
+    first = RateLimiter(rate=1, burst=2, path=path)
+    second = RateLimiter(rate=1, burst=2, path=path)
+    try:
+        assert first.try_acquire() == 0
+        assert second.try_acquire() == 0
+        assert 0 < first.try_acquire() <= 1
+        assert 0 < second.try_acquire() <= 1
+    finally:
+        first.close()
+        second.close()
+
+    # without a state file each limiter has its own bucket
+    first, second = RateLimiter(rate=1, burst=1), RateLimiter(rate=1, burst=1)
+    assert first.try_acquire() == 0
+    assert second.try_acquire() == 0
+
+
+def test_trial_success_closes():
+    breaker = tripped_breaker()
+    time.sleep(COOLDOWN)
+    assert breaker.wait_time() == 0
+    assert breaker.state == HALF_OPEN
+    # only one trial at a time
+    assert breaker.wait_time() > 0
+    breaker.record(False)
+    assert breaker.state == CLOSED
+    assert breaker.wait_time() == 0
+
+
+def test_trial_timeout_reopens():
+    breaker = tripped_breaker()
+    time.sleep(COOLDOWN)
+    assert breaker.wait_time() == 0
+    breaker.record(True)
+    assert breaker.state == OPEN
+    assert breaker.trips == 2
+
+
+def test_unrecorded_trial_expires():
+    breaker = tripped_breaker()
+    time.sleep(COOLDOWN)
+    assert breaker.wait_time() == 0
+    # the trial request never reports back
+    assert breaker.wait_time() > 0
+    time.sleep(COOLDOWN)
+    assert breaker.wait_time() == 0
+    breaker.record(False)
+    assert breaker.state == CLOSED
+
+
+def test_failed_search_still_records(monkeypatch):
+    # a page load that dies with a browser error during a half open trial
+    # is recorded as a failure, not left waiting for an outcome
+    import src.third_eye_nav as third_eye_nav
+
+    class Driver:
+        def set_script_timeout(self, seconds):
+            pass
+
+        def quit(self):
+            pass
+
+        def get(self, url):
+            raise WebDriverException('connection reset')
+
+        def execute_script(self, script, *args):
+            return {'url': '', 'login_form': False, 'search_box': False, 'account_page': False,
+                    'has_account': False, 'report_list': False}
+
+    monkeypatch.setattr(third_eye_nav, 'driver_factory', lambda *args, **kwargs: Driver())
+    breaker = tripped_breaker()
+    nav = third_eye_nav.ThirdEyeNav('headless', 'user', 'password', throttle=Throttle(breaker=breaker))
+    time.sleep(COOLDOWN)
+
+    assert nav.search_account('MWF100000') is False
+    assert breaker.state == OPEN
+    assert breaker.trips == 2
+    # the next load waits out the cool down, fails its trial and reopens
+    assert nav.navigate_to('Search Page') is False
+    assert breaker.trips == 3
+    time.sleep(COOLDOWN)
+    assert breaker.wait_time() == 0
+    nav.driver = None